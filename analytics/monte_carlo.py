@@ -0,0 +1,171 @@
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from analytics.trade_analytics import get_closed_trades
+
+
+SIMULATION_METHODS = ['bootstrap', 'shuffle']
+DEFAULT_SIMULATIONS = 10000
+DEFAULT_SIMULATION_SECONDS = 5
+DEFAULT_SIMULATION_SEED = 2022
+DEFAULT_SIMULATION_WORKERS = min(4, os.cpu_count() or 1)
+# Cells of the (simulations x trades) matrix one batch works on, keeps a batch's arrays around 8MB each
+BATCH_ELEMENTS = 1000000
+# Cells one core simulates per second, the time budget is turned into a path count with it instead of timing the run
+BUDGET_ELEMENTS_PER_SECOND = 30000000
+# Equity is kept at this many evenly spaced trades per path for the percentile bands
+BAND_POINTS = 100
+BAND_PERCENTILES = [5, 25, 50, 75, 95]
+
+# Set once per pool worker, so the profits are pickled per worker rather than per batch
+worker_trades = None
+
+
+def set_worker_trades(profits, initial_deposit, band_indexes):
+    global worker_trades
+    worker_trades = (profits, initial_deposit, band_indexes)
+
+
+def simulate_worker_batch(batch_size, seed_sequence, method):
+    return simulate_batch(*worker_trades, batch_size, seed_sequence, method)
+
+
+#* One row per simulated path, bootstrap draws trades with replacement, shuffle only reorders them
+def simulate_batch(profits, initial_deposit, band_indexes, batch_size, seed_sequence, method):
+    rng = np.random.default_rng(seed_sequence)
+    if method == 'shuffle':
+        paths = rng.permuted(np.tile(profits, (batch_size, 1)), axis=1)
+    else:
+        paths = profits[rng.integers(0, len(profits), size=(batch_size, len(profits)))]
+    equity = np.cumsum(paths, axis=1, out=paths)
+    equity += initial_deposit
+    running_peak = np.maximum.accumulate(equity, axis=1)
+    np.maximum(running_peak, initial_deposit, out=running_peak)
+    drawdown = running_peak - equity
+    max_drawdowns = drawdown.max(axis=1)
+    np.divide(drawdown, running_peak, out=drawdown, where=running_peak > 0)
+    max_drawdown_percents = drawdown.max(axis=1) * 100
+    return max_drawdowns, max_drawdown_percents, equity[:, -1].copy(), equity[:, band_indexes].astype(np.float32)
+
+
+#* Resamples the order of the closed trades to get the spread of drawdowns and final balances the single historical path hides
+class Monte_Carlo_Simulation():
+    def __init__(self, trades_df, initial_deposit=None, simulations=DEFAULT_SIMULATIONS, seconds=DEFAULT_SIMULATION_SECONDS, method='bootstrap', seed=DEFAULT_SIMULATION_SEED, workers=DEFAULT_SIMULATION_WORKERS):
+        if method not in SIMULATION_METHODS:
+            raise ValueError('Unknown simulation method "' + method + '", expected one of ' + ', '.join(SIMULATION_METHODS))
+        # The historical path and the initial deposit fallback follow the trades in close order
+        closed_trades = get_closed_trades(trades_df)
+        self.profits = closed_trades['Profit'].to_numpy(dtype=np.float64)
+        if initial_deposit is None:
+            initial_deposit = closed_trades['Balance'].iloc[0] - self.profits[0] if len(self.profits) else 0
+        self.initial_deposit = float(initial_deposit)
+        self.simulations = simulations
+        self.seconds = seconds
+        self.method = method
+        self.seed = seed
+        self.workers = workers
+        self.band_indexes = np.unique(np.linspace(0, len(self.profits) - 1, min(len(self.profits), BAND_POINTS)).round().astype(np.int64))
+        self.max_drawdowns = np.zeros(0)
+        self.max_drawdown_percents = np.zeros(0)
+        self.final_balances = np.zeros(0)
+        self.band_equity = np.zeros((0, len(self.band_indexes)), dtype=np.float32)
+        self.elapsed_seconds = 0
+
+
+    def __len__(self):
+        return len(self.final_balances)
+
+
+    #* Paths that fit the time budget at BUDGET_ELEMENTS_PER_SECOND, it depends only on the trade count so reruns and cached charts match
+    def get_simulation_count(self):
+        if not self.seconds or not len(self.profits):
+            return self.simulations
+        return max(1, min(self.simulations, int(self.seconds * BUDGET_ELEMENTS_PER_SECOND) // len(self.profits)))
+
+
+    #* Batches are seeded from one SeedSequence by position, so a run gives the same paths whatever the worker count
+    def get_batches(self):
+        simulation_count = self.get_simulation_count()
+        # Sized from the full simulation count, so a smaller budget keeps a prefix of the full run's paths
+        batch_size = max(1, min(self.simulations, BATCH_ELEMENTS // len(self.profits)))
+        batch_count = math.ceil(simulation_count / batch_size)
+        seed_sequences = np.random.SeedSequence(self.seed).spawn(batch_count)
+        return [(min(batch_size, simulation_count - index * batch_size), seed_sequences[index]) for index in range(batch_count)]
+
+
+    def run(self):
+        if not len(self.profits) or not self.simulations:
+            return self
+        start_time = time.perf_counter()
+        batches = self.get_batches()
+        if self.workers == 0:
+            results = [
+                simulate_batch(self.profits, self.initial_deposit, self.band_indexes, batch_size, seed_sequence, self.method)
+                for batch_size, seed_sequence in batches
+            ]
+        else:
+            results = self.run_batches_in_pool(batches)
+        self.max_drawdowns, self.max_drawdown_percents, self.final_balances, self.band_equity = (
+            np.concatenate([result[field] for result in results]) for field in range(4)
+        )
+        self.elapsed_seconds = time.perf_counter() - start_time
+        return self
+
+
+    #* Keeps two batches per worker in flight, and collects them in submit order
+    def run_batches_in_pool(self, batches):
+        results = []
+        pending = deque()
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=set_worker_trades,
+            initargs=(self.profits, self.initial_deposit, self.band_indexes),
+        ) as executor:
+            for batch_size, seed_sequence in batches:
+                while len(pending) >= self.workers * 2:
+                    results.append(pending.popleft().result())
+                pending.append(executor.submit(simulate_worker_batch, batch_size, seed_sequence, self.method))
+            while pending:
+                results.append(pending.popleft().result())
+        return results
+
+
+    #* Equity percentiles across the paths at each sampled trade, next to the historical path
+    def get_percentile_bands(self, percentiles=BAND_PERCENTILES):
+        trade_numbers = pd.Index(self.band_indexes + 1, name='Trade')
+        bands = pd.DataFrame(index=trade_numbers)
+        if len(self):
+            band_values = np.percentile(self.band_equity, percentiles, axis=0)
+            for percentile, values in zip(percentiles, band_values):
+                bands['P' + str(percentile)] = values
+        bands['Historical'] = (self.initial_deposit + np.cumsum(self.profits))[self.band_indexes]
+        return bands
+
+
+    def get_historical_max_drawdown(self):
+        if not len(self.profits):
+            return 0
+        equity = self.initial_deposit + np.cumsum(self.profits)
+        running_peak = np.maximum(np.maximum.accumulate(equity), self.initial_deposit)
+        return (running_peak - equity).max()
+
+
+    def get_summary(self):
+        if not len(self):
+            return { 'simulations': 0 }
+        return {
+            'simulations': len(self),
+            'seconds': self.elapsed_seconds,
+            'max_drawdown_p50': np.percentile(self.max_drawdowns, 50),
+            'max_drawdown_p95': np.percentile(self.max_drawdowns, 95),
+            'max_drawdown_percent_p95': np.percentile(self.max_drawdown_percents, 95),
+            'final_balance_p5': np.percentile(self.final_balances, 5),
+            'final_balance_p50': np.percentile(self.final_balances, 50),
+            'loss_probability': (self.final_balances < self.initial_deposit).mean() * 100,
+        }
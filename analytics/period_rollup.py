@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+
+
+# Period name -> pandas frequency of the period starts, weeks start on Monday
+PERIOD_FREQUENCIES = {
+    'day': 'D',
+    'week': 'W-MON',
+    'month': 'MS',
+    'quarter': 'QS',
+    'year': 'YS',
+}
+# Profits are in cents, summing them as floats leaves noise past the second decimal
+MONEY_COLUMNS = ['Gross Profit', 'Gross Loss', 'Net Profit']
+
+
+#* Maps datetime64[D] days to the first day of their period, years are kept apart so multi-year tests don't merge
+def get_period_starts(days, period):
+    if period == 'day':
+        return days
+    if period == 'week':
+        # Day 0 (1970-01-01) was a Thursday, so this steps every day back to its Monday
+        return days - (days.astype(np.int64) + 3) % 7
+    if period == 'year':
+        return days.astype('datetime64[Y]').astype('datetime64[D]')
+    months = days.astype('datetime64[M]')
+    if period == 'quarter':
+        month_numbers = months.astype(np.int64)
+        months = (month_numbers - month_numbers % 3).astype('datetime64[M]')
+    return months.astype('datetime64[D]')
+
+
+#* Buckets the ledger by day in one pass, every coarser period is summed from the daily cube and cached
+class Period_Rollup():
+    def __init__(self, trades_df):
+        self.daily = self.build_daily(trades_df)
+        self.periods = {}
+
+
+    def __len__(self):
+        return len(self.daily)
+
+
+    #* One count column per order type plus the closed trade totals, every value is a bincount over day codes
+    def build_daily(self, trades_df):
+        types = pd.Categorical(trades_df['Type'])
+        days = trades_df['Time'].to_numpy().astype('datetime64[D]')
+        day_keys, day_codes = np.unique(days, return_inverse=True)
+        day_count = len(day_keys)
+        type_count = len(types.categories)
+        typed = types.codes >= 0
+        type_counts = np.bincount(
+            day_codes[typed] * type_count + types.codes[typed],
+            minlength=day_count * type_count,
+        ).reshape(day_count, type_count)
+        daily = pd.DataFrame(type_counts, index=pd.DatetimeIndex(day_keys, name='Period'), columns=[str(name) for name in types.categories])
+
+        # Only close rows carry a profit, opens and modifies are counted by type only
+        profits = trades_df['Profit'].to_numpy(dtype=np.float64)
+        closed = ~np.isnan(profits)
+        closed_days = day_codes[closed]
+        closed_profits = profits[closed]
+        wins = closed_profits > 0
+        daily['Trades'] = np.bincount(closed_days, minlength=day_count)
+        daily['Wins'] = np.bincount(closed_days[wins], minlength=day_count)
+        daily['Losses'] = daily['Trades'] - daily['Wins']
+        daily['Gross Profit'] = np.bincount(closed_days, weights=np.where(wins, closed_profits, 0), minlength=day_count)
+        daily['Gross Loss'] = np.bincount(closed_days, weights=np.where(wins, 0, closed_profits), minlength=day_count)
+        daily['Net Profit'] = daily['Gross Profit'] + daily['Gross Loss']
+        daily[MONEY_COLUMNS] = daily[MONEY_COLUMNS].round(2)
+        return daily
+
+
+    #* Every period between the first and last trade gets a row, quiet periods are all zeros
+    def get_period(self, period):
+        if period not in PERIOD_FREQUENCIES:
+            raise ValueError('Unknown period "' + period + '", expected one of ' + ', '.join(PERIOD_FREQUENCIES))
+        if period not in self.periods:
+            starts = get_period_starts(self.daily.index.to_numpy().astype('datetime64[D]'), period)
+            rollup = self.daily.groupby(pd.DatetimeIndex(starts, name='Period')).sum()
+            if len(rollup):
+                full_range = pd.date_range(rollup.index[0], rollup.index[-1], freq=PERIOD_FREQUENCIES[period], name='Period')
+                rollup = rollup.reindex(full_range, fill_value=0)
+            rollup[MONEY_COLUMNS] = rollup[MONEY_COLUMNS].round(2)
+            self.periods[period] = rollup
+        return self.periods[period]
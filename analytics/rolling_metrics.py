@@ -0,0 +1,101 @@
+import numpy as np
+import pandas as pd
+from analytics.trade_analytics import get_closed_trades
+
+
+WINDOW_UNITS = ['trades', 'days']
+DEFAULT_ROLLING_WINDOW = 100
+ROLLING_COLUMNS = ['Time', 'Trades', 'Win Rate', 'Profit Factor', 'Expectancy', 'Drawdown', 'Average Duration (hrs)']
+
+
+#* Prefix sums with a leading zero, the total of any window is then one subtraction
+def get_prefix_sums(values):
+    prefix_sums = np.zeros(len(values) + 1, dtype=values.dtype)
+    np.cumsum(values, out=prefix_sums[1:])
+    return prefix_sums
+
+
+#* Maximum of values[starts[i]:i + 1] for every i, from tables of the maxima over 1, 2, 4, ... values
+def get_window_maxima(values, starts):
+    ends = np.arange(len(values))
+    lengths = ends - starts + 1
+    # Each window is covered by two overlapping runs of the largest power of two that fits in it
+    levels = np.log2(lengths).astype(np.int64)
+    maxima = np.empty(len(values), dtype=values.dtype)
+    level_maxima = values
+    for level in range(levels.max() + 1 if len(values) else 0):
+        if level:
+            span = 1 << (level - 1)
+            level_maxima = np.maximum(level_maxima[:-span], level_maxima[span:])
+        at_level = np.flatnonzero(levels == level)
+        maxima[at_level] = np.maximum(level_maxima[starts[at_level]], level_maxima[at_level - (1 << level) + 1])
+    return maxima
+
+
+#* Win rate, profit factor, expectancy, drawdown and duration over a window sliding along the closed trades, one row per trade
+class Rolling_Metrics():
+    def __init__(self, trades_df, window=DEFAULT_ROLLING_WINDOW, unit='trades'):
+        if unit not in WINDOW_UNITS:
+            raise ValueError('Unknown window unit "' + unit + '", expected one of ' + ', '.join(WINDOW_UNITS))
+        if window < 1:
+            raise ValueError('Rolling window must be at least 1 ' + unit + ', got ' + str(window))
+        # Sorted by close time, both window units slide along the trades in the order they closed
+        closed_trades = get_closed_trades(trades_df)
+        self.window = window
+        self.unit = unit
+        self.times = closed_trades['Time'].to_numpy()
+        # Summed in cents so a window total doesn't pick up float noise from a million trade prefix sum
+        self.profit_cents = np.rint(closed_trades['Profit'].to_numpy(dtype=np.float64) * 100).astype(np.int64)
+        self.balances = closed_trades['Balance'].to_numpy(dtype=np.float64)
+        self.durations = closed_trades['Duration (hrs)'].to_numpy(dtype=np.float64) if 'Duration (hrs)' in closed_trades else np.full(len(closed_trades), np.nan)
+
+
+    def __len__(self):
+        return len(self.profit_cents)
+
+
+    #* First trade of each trade's window, windows that reach back before the first trade are marked incomplete
+    def get_window_starts(self):
+        trade_numbers = np.arange(len(self))
+        if self.unit == 'trades':
+            starts = np.maximum(trade_numbers - self.window + 1, 0)
+            complete = trade_numbers >= self.window - 1
+        else:
+            # Close times are sorted, so each window starts at the first close inside the last N days
+            window_length = np.timedelta64(self.window, 'D')
+            starts = np.searchsorted(self.times, self.times - window_length, side='right')
+            complete = self.times - window_length >= self.times[0] if len(self) else np.zeros(0, dtype=bool)
+        return starts, complete
+
+
+    #* Every metric is a difference of prefix sums, so the cost doesn't grow with the window
+    def compute(self):
+        starts, complete = self.get_window_starts()
+        ends = np.arange(1, len(self) + 1)
+
+        def window_totals(values):
+            prefix_sums = get_prefix_sums(values)
+            return prefix_sums[ends] - prefix_sums[starts]
+
+        trade_counts = ends - starts
+        wins = window_totals((self.profit_cents > 0).astype(np.int64))
+        gross_profit = window_totals(np.where(self.profit_cents > 0, self.profit_cents, 0))
+        gross_loss = -window_totals(np.where(self.profit_cents <= 0, self.profit_cents, 0))
+        net_profit = gross_profit - gross_loss
+        timed = ~np.isnan(self.durations)
+        timed_counts = window_totals(timed.astype(np.int64))
+        duration_totals = window_totals(np.where(timed, self.durations, 0))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rolling_metrics = pd.DataFrame({
+                'Time': self.times,
+                'Trades': trade_counts,
+                'Win Rate': wins / trade_counts * 100,
+                'Profit Factor': np.where(gross_loss > 0, gross_profit / gross_loss, np.inf),
+                'Expectancy': net_profit / trade_counts / 100,
+                # How far the balance sits below the highest balance of the window
+                'Drawdown': get_window_maxima(self.balances, starts) - self.balances,
+                'Average Duration (hrs)': np.where(timed_counts > 0, duration_totals / timed_counts, np.nan),
+            }, index=pd.RangeIndex(1, len(self) + 1, name='Trade'))
+        rolling_metrics.loc[~complete, ROLLING_COLUMNS[1:]] = np.nan
+        return rolling_metrics
@@ -0,0 +1,158 @@
+import numpy as np
+
+
+# (summary key, summary field, metric) pairs checked by compare_to_summary
+SUMMARY_CHECKS = [
+    ('Total net profit', 'number', 'net_profit'),
+    ('Gross profit', 'number', 'gross_profit'),
+    ('Gross loss', 'number', 'gross_loss'),
+    ('Total trades', 'number', 'total_trades'),
+    ('Absolute drawdown', 'number', 'absolute_drawdown'),
+    ('Maximal drawdown', 'number', 'maximal_drawdown'),
+    ('Maximal drawdown', 'percent', 'maximal_drawdown_percent'),
+    ('Relative drawdown', 'percent', 'relative_drawdown_percent'),
+    ('Relative drawdown', 'detail', 'relative_drawdown'),
+    ('Largest profit trade', 'number', 'largest_profit_trade'),
+    ('Largest loss trade', 'number', 'largest_loss_trade'),
+    ('Average profit trade', 'number', 'average_profit_trade'),
+    ('Average loss trade', 'number', 'average_loss_trade'),
+    ('Maximum consecutive wins (profit in money)', 'number', 'max_consecutive_wins'),
+    ('Maximum consecutive wins (profit in money)', 'detail', 'max_consecutive_wins_profit'),
+    ('Maximum consecutive losses (loss in money)', 'number', 'max_consecutive_losses'),
+    ('Maximum consecutive losses (loss in money)', 'detail', 'max_consecutive_losses_loss'),
+    ('Maximal consecutive profit (count of wins)', 'number', 'max_consecutive_profit'),
+    ('Maximal consecutive profit (count of wins)', 'detail', 'max_consecutive_profit_count'),
+    ('Maximal consecutive loss (count of losses)', 'number', 'max_consecutive_loss'),
+    ('Maximal consecutive loss (count of losses)', 'detail', 'max_consecutive_loss_count'),
+    ('Average consecutive wins', 'number', 'average_consecutive_wins'),
+    ('Average consecutive losses', 'number', 'average_consecutive_losses'),
+]
+# Summary values are printed with 2 decimals, percentages and averages get rounded by MT4
+SUMMARY_TOLERANCE = 0.015
+
+
+#* Rows carrying a profit in close time order, drawdowns and streaks depend on the sequence
+def get_closed_trades(trades_df):
+    closed_trades = trades_df[trades_df['Profit'].notna()]
+    # Ledgers exported by older versions list trades by order id, which isn't close order once positions overlap
+    if closed_trades['Time'].is_monotonic_increasing and closed_trades['#'].is_monotonic_increasing:
+        return closed_trades
+    return closed_trades.sort_values(['Time', '#'], kind='stable')
+
+
+#* Recomputes the report's stats from the closed trades of the paired ledger, every metric is one numpy pass
+class Trade_Analytics():
+    def __init__(self, trades_df, initial_deposit=None):
+        closed_trades = get_closed_trades(trades_df)
+        self.profits = closed_trades['Profit'].to_numpy(dtype=np.float64)
+        if initial_deposit is None:
+            initial_deposit = closed_trades['Balance'].iloc[0] - self.profits[0] if len(self.profits) else 0
+        self.initial_deposit = float(initial_deposit)
+        self.metrics = {}
+
+
+    def compute(self):
+        if not len(self.profits):
+            self.metrics = { 'total_trades': 0 }
+            return self.metrics
+        equity = self.initial_deposit + np.cumsum(self.profits)
+        self.metrics = { 'total_trades': len(self.profits), 'final_balance': equity[-1] }
+        self.metrics.update(self.compute_profit_stats())
+        self.metrics.update(self.compute_drawdowns(equity))
+        self.metrics.update(self.compute_streaks())
+        self.metrics.update(self.compute_risk_ratios(equity))
+        return self.metrics
+
+
+    def compute_profit_stats(self):
+        profits = self.profits
+        wins = profits[profits > 0]
+        losses = profits[profits <= 0]
+        gross_profit = wins.sum()
+        gross_loss = losses.sum()
+        return {
+            'net_profit': profits.sum(),
+            'gross_profit': gross_profit,
+            'gross_loss': gross_loss,
+            'profit_factor': gross_profit / -gross_loss if gross_loss else np.inf,
+            'expectancy': profits.mean(),
+            'win_rate': len(wins) / len(profits) * 100,
+            'largest_profit_trade': wins.max() if len(wins) else 0,
+            'largest_loss_trade': losses.min() if len(losses) else 0,
+            'average_profit_trade': wins.mean() if len(wins) else 0,
+            'average_loss_trade': losses.mean() if len(losses) else 0,
+        }
+
+
+    #* Drawdowns of the balance curve, measured from the running peak including the initial deposit
+    def compute_drawdowns(self, equity):
+        running_peak = np.maximum.accumulate(np.concatenate(([self.initial_deposit], equity)))[1:]
+        drawdown = running_peak - equity
+        drawdown_percent = drawdown / running_peak * 100
+        maximal_index = drawdown.argmax()
+        relative_index = drawdown_percent.argmax()
+        return {
+            'absolute_drawdown': max(self.initial_deposit - equity.min(), 0),
+            'maximal_drawdown': drawdown[maximal_index],
+            'maximal_drawdown_percent': drawdown_percent[maximal_index],
+            'relative_drawdown': drawdown[relative_index],
+            'relative_drawdown_percent': drawdown_percent[relative_index],
+        }
+
+
+    #* Run length encodes wins and losses, then reads every streak stat off the run lengths and sums
+    def compute_streaks(self):
+        is_win = self.profits > 0
+        run_starts = np.concatenate(([True], is_win[1:] != is_win[:-1]))
+        run_ids = np.cumsum(run_starts) - 1
+        run_lengths = np.bincount(run_ids)
+        run_sums = np.bincount(run_ids, weights=self.profits)
+        run_is_win = is_win[run_starts]
+        streaks = {}
+        for side, side_runs in (('wins', run_is_win), ('losses', ~run_is_win)):
+            lengths = run_lengths[side_runs]
+            sums = run_sums[side_runs]
+            if not len(lengths):
+                lengths, sums = np.zeros(1, dtype=np.int64), np.zeros(1)
+            longest = lengths.argmax()
+            extreme = sums.argmax() if side == 'wins' else sums.argmin()
+            money_key = 'profit' if side == 'wins' else 'loss'
+            streaks['max_consecutive_' + side] = lengths[longest]
+            streaks['max_consecutive_' + side + '_' + money_key] = sums[longest]
+            streaks['max_consecutive_' + money_key] = sums[extreme]
+            streaks['max_consecutive_' + money_key + '_count'] = lengths[extreme]
+            streaks['average_consecutive_' + side] = round(lengths.mean())
+        return streaks
+
+
+    #* Per trade ratios on returns relative to the balance each trade was opened with, not annualized
+    def compute_risk_ratios(self, equity):
+        opening_balance = equity - self.profits
+        returns = np.divide(self.profits, opening_balance, out=np.zeros_like(self.profits), where=opening_balance != 0)
+        return_std = returns.std()
+        downside = np.minimum(returns, 0)
+        downside_deviation = np.sqrt((downside ** 2).mean())
+        losing_returns = returns[returns < 0]
+        return {
+            'sharpe_ratio': returns.mean() / return_std if return_std else 0,
+            'sortino_ratio': returns.mean() / downside_deviation if downside_deviation else 0,
+            'worst_trade_percent': returns.min() * 100,
+            'average_loss_percent': losing_returns.mean() * 100 if len(losing_returns) else 0,
+        }
+
+
+    #* Lists summary values that disagree with the recomputed ones as (key, reported, computed)
+    def compare_to_summary(self, summary):
+        if not self.metrics:
+            self.compute()
+        mismatches = []
+        for key, field_name, metric in SUMMARY_CHECKS:
+            if key not in summary or metric not in self.metrics:
+                continue
+            reported = getattr(summary[key], field_name)
+            computed = float(self.metrics[metric])
+            if reported is None:
+                continue
+            if abs(reported - computed) > max(SUMMARY_TOLERANCE, abs(reported) * 0.0001):
+                mismatches.append((key, reported, round(computed, 2)))
+        return mismatches
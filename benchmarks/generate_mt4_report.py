@@ -0,0 +1,274 @@
+import argparse
+import datetime
+import heapq
+import os
+import random
+
+
+REPORT_HEADER = '''<html>
+<head>
+<title>Strategy Tester: {system_name}</title>
+<meta name="generator" content="MetaQuotes Software Corp.">
+</head>
+<body topmargin=1 marginheight=1>
+<div align=center>
+<div style="font: 20pt Times New Roman"><b>Strategy Tester Report</b></div>
+<div style="font: 16pt Times New Roman"><b>{system_name}</b></div>
+<div style="font: 10pt Times New Roman"><b>Synthetic Broker Ltd.</b></div><br>
+<table width=820 cellspacing=1 cellpadding=3 border=0>
+<tr align=left><td colspan=2>Symbol</td><td colspan=4>{symbol} (Euro vs US Dollar)</td></tr>
+<tr align=left><td colspan=2>Period</td><td colspan=4>1 Hour (H1)  {first_bar:%Y.%m.%d %H:%M} - {last_bar:%Y.%m.%d %H:%M} ({start:%Y.%m.%d} - {end:%Y.%m.%d})</td></tr>
+<tr align=left><td colspan=2>Model</td><td colspan=4>Every tick (the most precise method based on all available least timeframes)</td></tr>
+<tr align=left><td colspan=2>Parameters</td><td colspan=4>{parameters}</td></tr>
+<tr height=8><td colspan=6></td></tr>
+<tr align=left><td>Bars in test</td><td align=right>{bars}</td><td>Ticks modelled</td><td align=right>{ticks}</td><td>Modelling quality</td><td align=right>90.00%</td></tr>
+<tr align=left><td colspan=2>Mismatched charts errors</td><td align=right>0</td><td colspan=3></td></tr>
+<tr height=8><td colspan=6></td></tr>
+<tr align=left><td colspan=2>Initial deposit</td><td align=right>{initial_deposit:.2f}</td><td colspan=3></td></tr>
+<tr align=left><td>Total net profit</td><td align=right>{net_profit:.2f}</td><td>Gross profit</td><td align=right>{gross_profit:.2f}</td><td>Gross loss</td><td align=right>{gross_loss:.2f}</td></tr>
+<tr align=left><td>Profit factor</td><td align=right>{profit_factor:.2f}</td><td>Expected payoff</td><td align=right>{expected_payoff:.2f}</td><td></td><td align=right></td></tr>
+<tr align=left><td>Absolute drawdown</td><td align=right>{absolute_drawdown:.2f}</td><td>Maximal drawdown</td><td align=right>{maximal_drawdown:.2f} ({maximal_drawdown_percent:.2f}%)</td><td>Relative drawdown</td><td align=right>{relative_drawdown_percent:.2f}% ({relative_drawdown:.2f})</td></tr>
+<tr height=8><td colspan=6></td></tr>
+<tr align=left><td colspan=2>Total trades</td><td align=right>{total_trades}</td><td>Short positions (won %)</td><td align=right>{short_trades} ({short_won_percent:.2f}%)</td><td>Long positions (won %)</td><td align=right>{long_trades} ({long_won_percent:.2f}%)</td></tr>
+<tr align=left><td colspan=3 align=right></td><td>Profit trades (% of total)</td><td align=right>{profit_trades} ({profit_trades_percent:.2f}%)</td><td>Loss trades (% of total)</td><td align=right>{loss_trades} ({loss_trades_percent:.2f}%)</td></tr>
+<tr align=left><td colspan=2 align=right>Largest</td><td>profit trade</td><td align=right>{largest_profit:.2f}</td><td>loss trade</td><td align=right>{largest_loss:.2f}</td></tr>
+<tr align=left><td colspan=2 align=right>Average</td><td>profit trade</td><td align=right>{average_profit:.2f}</td><td>loss trade</td><td align=right>{average_loss:.2f}</td></tr>
+<tr align=left><td colspan=2 align=right>Maximum</td><td>consecutive wins (profit in money)</td><td align=right>{max_wins} ({max_wins_money:.2f})</td><td>consecutive losses (loss in money)</td><td align=right>{max_losses} ({max_losses_money:.2f})</td></tr>
+<tr align=left><td colspan=2 align=right>Maximal</td><td>consecutive profit (count of wins)</td><td align=right>{max_profit_run:.2f} ({max_profit_run_count})</td><td>consecutive loss (count of losses)</td><td align=right>{max_loss_run:.2f} ({max_loss_run_count})</td></tr>
+<tr align=left><td colspan=2 align=right>Average</td><td>consecutive wins</td><td align=right>{average_wins}</td><td>consecutive losses</td><td align=right>{average_losses}</td></tr>
+</table>
+<br>
+<table width=820 cellspacing=1 cellpadding=3 border=0>
+<tr bgcolor="#C0C0C0" align=right><td>#</td><td>Time</td><td>Type</td><td>Order</td><td>Size</td><td>Price</td><td>S / L</td><td>T / P</td><td>Profit</td><td>Balance</td></tr>
+'''
+
+OPEN_ROW = '<tr align=right><td>{row}</td><td class=msdate>{time:%Y.%m.%d %H:%M}</td><td>{type}</td><td>{order}</td><td class=mspt>{size:.2f}</td><td style="mso-number-format:0\\.00000;">{price:.5f}</td><td style="mso-number-format:0\\.00000;" align=right>{stop_loss:.5f}</td><td style="mso-number-format:0\\.00000;" align=right>{take_profit:.5f}</td><td colspan=2></td></tr>\n'
+CLOSE_ROW = '<tr bgcolor="#E0E0E0" align=right><td>{row}</td><td class=msdate>{time:%Y.%m.%d %H:%M}</td><td>{type}</td><td>{order}</td><td class=mspt>{size:.2f}</td><td style="mso-number-format:0\\.00000;">{price:.5f}</td><td style="mso-number-format:0\\.00000;" align=right>{stop_loss:.5f}</td><td style="mso-number-format:0\\.00000;" align=right>{take_profit:.5f}</td><td class=mspt>{profit:.2f}</td><td class=mspt>{balance:.2f}</td></tr>\n'
+REPORT_FOOTER = '</table>\n</div></body></html>\n'
+
+
+#* Tracks the running stats MT4 prints in the summary table while trades are generated
+class Summary_Stats():
+    def __init__(self, initial_deposit):
+        self.initial_deposit = initial_deposit
+        self.balance = initial_deposit
+        self.peak_balance = initial_deposit
+        self.min_balance = initial_deposit
+        self.maximal_drawdown = 0
+        self.maximal_drawdown_percent = 0
+        self.relative_drawdown = 0
+        self.relative_drawdown_percent = 0
+        self.profits = []
+        self.trade_sides = []
+        self.win_runs = []
+        self.loss_runs = []
+        self.current_run = []
+
+
+    def add_trade(self, side, profit):
+        self.balance = round(self.balance + profit, 2)
+        self.profits.append(profit)
+        self.trade_sides.append(side)
+        self.min_balance = min(self.min_balance, self.balance)
+        self.peak_balance = max(self.peak_balance, self.balance)
+        drawdown = self.peak_balance - self.balance
+        drawdown_percent = drawdown / self.peak_balance * 100
+        if drawdown > self.maximal_drawdown:
+            self.maximal_drawdown, self.maximal_drawdown_percent = drawdown, drawdown_percent
+        if drawdown_percent > self.relative_drawdown_percent:
+            self.relative_drawdown, self.relative_drawdown_percent = drawdown, drawdown_percent
+        if self.current_run and (self.current_run[-1] > 0) != (profit > 0):
+            self.finish_run()
+        self.current_run.append(profit)
+
+
+    def finish_run(self):
+        if self.current_run:
+            runs = self.win_runs if self.current_run[0] > 0 else self.loss_runs
+            runs.append(self.current_run)
+            self.current_run = []
+
+
+    def get_summary_values(self):
+        self.finish_run()
+        wins = [profit for profit in self.profits if profit > 0]
+        losses = [profit for profit in self.profits if profit <= 0]
+        short_profits = [profit for profit, side in zip(self.profits, self.trade_sides) if side == 'sell']
+        long_profits = [profit for profit, side in zip(self.profits, self.trade_sides) if side == 'buy']
+        longest_win_run = max(self.win_runs, key=len, default=[0])
+        longest_loss_run = max(self.loss_runs, key=len, default=[0])
+        richest_win_run = max(self.win_runs, key=sum, default=[0])
+        poorest_loss_run = min(self.loss_runs, key=sum, default=[0])
+        gross_profit = sum(wins)
+        gross_loss = sum(losses)
+        return {
+            'initial_deposit': self.initial_deposit,
+            'net_profit': gross_profit + gross_loss,
+            'gross_profit': gross_profit,
+            'gross_loss': gross_loss,
+            'profit_factor': gross_profit / -gross_loss if gross_loss else 0,
+            'expected_payoff': sum(self.profits) / len(self.profits) if self.profits else 0,
+            'absolute_drawdown': self.initial_deposit - self.min_balance,
+            'maximal_drawdown': self.maximal_drawdown,
+            'maximal_drawdown_percent': self.maximal_drawdown_percent,
+            'relative_drawdown': self.relative_drawdown,
+            'relative_drawdown_percent': self.relative_drawdown_percent,
+            'total_trades': len(self.profits),
+            'short_trades': len(short_profits),
+            'short_won_percent': percent_of(sum(1 for profit in short_profits if profit > 0), len(short_profits)),
+            'long_trades': len(long_profits),
+            'long_won_percent': percent_of(sum(1 for profit in long_profits if profit > 0), len(long_profits)),
+            'profit_trades': len(wins),
+            'profit_trades_percent': percent_of(len(wins), len(self.profits)),
+            'loss_trades': len(losses),
+            'loss_trades_percent': percent_of(len(losses), len(self.profits)),
+            'largest_profit': max(wins, default=0),
+            'largest_loss': min(losses, default=0),
+            'average_profit': gross_profit / len(wins) if wins else 0,
+            'average_loss': gross_loss / len(losses) if losses else 0,
+            'max_wins': len(longest_win_run) if self.win_runs else 0,
+            'max_wins_money': sum(longest_win_run),
+            'max_losses': len(longest_loss_run) if self.loss_runs else 0,
+            'max_losses_money': sum(longest_loss_run),
+            'max_profit_run': sum(richest_win_run),
+            'max_profit_run_count': len(richest_win_run) if self.win_runs else 0,
+            'max_loss_run': sum(poorest_loss_run),
+            'max_loss_run_count': len(poorest_loss_run) if self.loss_runs else 0,
+            'average_wins': round(len(wins) / len(self.win_runs)) if self.win_runs else 0,
+            'average_losses': round(len(losses) / len(self.loss_runs)) if self.loss_runs else 0,
+        }
+
+
+def percent_of(count, total):
+    return count / total * 100 if total else 0
+
+
+#* Drops the </td> and </tr> end tags MT4 builds leave implied
+def imply_end_tags(html):
+    return html.replace('</td>', '').replace('</tr>', '')
+
+
+#* Writes a Strategy Tester report with the same structure as MT4's, streamed row by row so 1M trades fit in memory
+# max_open_positions > 1 lets orders overlap so they close out of order id order, the last open_orders orders never close
+class Mt4_Report_Generator():
+    def __init__(self, trade_count, seed=1, system_name='Synthetic Moving Average', symbol='EURUSD', initial_deposit=10000.0, modify_rate=0.15, max_open_positions=1, open_orders=0, implied_tags=False):
+        if max_open_positions < 1:
+            raise ValueError('max_open_positions must be at least 1, got ' + str(max_open_positions))
+        if not 0 <= open_orders <= trade_count:
+            raise ValueError('open_orders must be between 0 and the trade count, got ' + str(open_orders))
+        self.trade_count = trade_count
+        self.random = random.Random(seed)
+        self.system_name = system_name
+        self.symbol = symbol
+        self.initial_deposit = initial_deposit
+        self.modify_rate = modify_rate
+        self.max_open_positions = max_open_positions
+        self.open_orders = open_orders
+        self.implied_tags = implied_tags
+        self.start_time = datetime.datetime(2015, 1, 2)
+        self.row_number = 0
+
+
+    def write_report(self, output_file):
+        trade_rows_file = output_file + '.rows'
+        stats = Summary_Stats(self.initial_deposit)
+        # The summary table comes first in the report but depends on every trade, so rows go to a side file first
+        with open(trade_rows_file, 'w') as rows:
+            last_time = self.write_trade_rows(rows, stats)
+        summary_values = stats.get_summary_values()
+        with open(output_file, 'w') as report, open(trade_rows_file) as rows:
+            report_header = imply_end_tags(REPORT_HEADER) if self.implied_tags else REPORT_HEADER
+            report.write(report_header.format(
+                system_name=self.system_name,
+                symbol=self.symbol,
+                parameters='Lots=0.1; MaximumRisk=0.02; DecreaseFactor=3; MovingPeriod=12; MovingShift=6; ',
+                first_bar=self.start_time,
+                last_bar=last_time,
+                start=self.start_time.date(),
+                end=last_time.date() + datetime.timedelta(days=1),
+                bars=int((last_time - self.start_time).total_seconds() // 3600),
+                ticks=self.trade_count * 1000,
+                **summary_values,
+            ))
+            for row in rows:
+                report.write(row)
+            report.write(REPORT_FOOTER)
+        os.remove(trade_rows_file)
+        return output_file
+
+
+    #* Modify and close rows wait in a heap until the report's clock reaches them, so rows come out in time order like MT4's
+    def write_trade_rows(self, rows, stats):
+        self.row_number = 0
+        pending_rows = []
+        open_positions = 0
+        time = self.start_time
+        price = 1.12
+        for order in range(1, self.trade_count + 1):
+            # With every position slot taken, the next order opens after the earliest close
+            while open_positions >= self.max_open_positions:
+                row_time, row_type = self.write_pending_row(rows, pending_rows, stats)
+                if row_type != 'modify':
+                    open_positions -= 1
+                    time = max(time, row_time)
+            time += datetime.timedelta(minutes=self.random.randint(5, 600))
+            while pending_rows and pending_rows[0][0] <= time:
+                row_time, row_type = self.write_pending_row(rows, pending_rows, stats)
+                if row_type != 'modify':
+                    open_positions -= 1
+            side = self.random.choice(['buy', 'sell'])
+            size = self.random.choice([0.1, 0.2, 0.5, 1.0])
+            price = max(0.5, price + self.random.gauss(0, 0.002))
+            self.write_row(rows, OPEN_ROW, time=time, type=side, order=order, size=size, price=price, stop_loss=0, take_profit=0)
+            row_time = time
+            stop_loss = 0
+            if self.random.random() < self.modify_rate:
+                row_time += datetime.timedelta(minutes=self.random.randint(1, 120))
+                stop_loss = price - 0.005 if side == 'buy' else price + 0.005
+                heapq.heappush(pending_rows, (row_time, self.row_number, dict(time=row_time, type='modify', order=order, size=size, price=price, stop_loss=stop_loss, take_profit=0)))
+            row_time += datetime.timedelta(minutes=self.random.randint(5, 3000))
+            move = self.random.gauss(0.0001, 0.002)
+            if order > self.trade_count - self.open_orders:
+                continue
+            profit = round((move if side == 'buy' else -move) * size * 100000, 2)
+            close_type = 'close at stop' if stop_loss and profit < 0 else 'close'
+            heapq.heappush(pending_rows, (row_time, self.row_number, dict(time=row_time, type=close_type, order=order, size=size, price=price + move, stop_loss=stop_loss, take_profit=0, profit=profit, side=side)))
+            open_positions += 1
+        while pending_rows:
+            time = max(time, self.write_pending_row(rows, pending_rows, stats)[0])
+        return time
+
+
+    #* Closes go into the summary stats as they are written, in the order they closed
+    def write_pending_row(self, rows, pending_rows, stats):
+        row_time, _, fields = heapq.heappop(pending_rows)
+        if fields['type'] == 'modify':
+            self.write_row(rows, OPEN_ROW, **fields)
+        else:
+            stats.add_trade(fields['side'], fields['profit'])
+            self.write_row(rows, CLOSE_ROW, balance=stats.balance, **fields)
+        return row_time, fields['type']
+
+
+    def write_row(self, rows, row_template, **fields):
+        self.row_number += 1
+        row = row_template.format(row=self.row_number, **fields)
+        rows.write(imply_end_tags(row) if self.implied_tags else row)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Write a synthetic MT4 Strategy Tester report')
+    parser.add_argument('trades', type=int, help='Number of trades in the report')
+    parser.add_argument('output_file')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--max-open-positions', type=int, default=1, help='Orders open at once, above 1 orders overlap and close out of order id order')
+    parser.add_argument('--open-orders', type=int, default=0, help='Orders at the end of the report left without a closing row')
+    parser.add_argument('--implied-tags', action='store_true', help='Leave out the </td> and </tr> end tags like some MT4 builds')
+    args = parser.parse_args()
+    Mt4_Report_Generator(
+        args.trades,
+        seed=args.seed,
+        max_open_positions=args.max_open_positions,
+        open_orders=args.open_orders,
+        implied_tags=args.implied_tags,
+    ).write_report(args.output_file)
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from benchmarks.generate_mt4_report import Mt4_Report_Generator
+from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
+from reports.report_plotter import Report_Plotter
+from reports.chart_renderer import warm_export_worker
+
+
+BASELINES_FILE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+DEFAULT_TRADE_COUNTS = [1000, 10000]
+WARM_UP_TRADE_COUNT = 100
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Fresh interpreters timed from launch to exit, the best of STARTUP_RUNS is kept to drop disk cache noise
+STARTUP_COMMANDS = {
+    'cli --help': ['cli.py', '--help'],
+    'import main': ['-c', 'import main'],
+}
+STARTUP_RUNS = 3
+# A stage slower than its baseline by more than this factor is reported as a regression
+DEFAULT_TOLERANCE = 1.5
+# Stages this close to their baseline are within timer noise whatever the ratio
+MIN_REGRESSION_SECONDS = 0.05
+
+
+#* Times (and optionally memory profiles) every pipeline stage on one generated report
+class Stage_Benchmark():
+    def __init__(self, report_file, output_path, trace_memory=False):
+        self.report_file = report_file
+        self.output_path = output_path
+        self.trace_memory = trace_memory
+        self.results = {}
+
+
+    def measure(self, stage, function, *args):
+        if self.trace_memory:
+            tracemalloc.start()
+        start_time = time.perf_counter()
+        result = function(*args)
+        seconds = time.perf_counter() - start_time
+        stage_result = { 'seconds': round(seconds, 4) }
+        if self.trace_memory:
+            stage_result['peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            tracemalloc.stop()
+        self.results[stage] = stage_result
+        return result
+
+
+    def run(self):
+        cleaner = Mt4_Report_Cleaner(self.report_file, self.output_path)
+        self.measure('open_report', cleaner.open_report)
+        summary_list = self.measure('scrape_summary_data', cleaner.scrape_summary_data)
+        self.measure('build_summary_data_output', cleaner.build_summary_data_output, summary_list)
+        trades_list = self.measure('scrape_trade_data', cleaner.scrape_trade_data)
+        self.measure('build_trade_data_output', cleaner.build_trade_data_output, trades_list)
+        self.measure('write_data_to_xls', cleaner.write_data_to_xls)
+
+        plotter = Report_Plotter(
+            self.output_path,
+            summary_df=cleaner.summary_df,
+            trades_df=cleaner.trades_df,
+            summary=cleaner.summary,
+            report_location=cleaner.output_filename[:-5] + '.html',
+            render_workers=0,
+        )
+        self.measure('load_data', plotter.load_data)
+        self.measure('generate_trade_duration_df', plotter.generate_trade_duration_df)
+        self.measure('generate_trade_bins', plotter.generate_trade_bins)
+        self.measure('generate_account_balance_df', plotter.generate_account_balance_df)
+        self.measure('generate_period_rollup', plotter.generate_period_rollup)
+        self.measure('generate_trade_analytics', plotter.generate_trade_analytics)
+        self.measure('generate_monte_carlo', plotter.generate_monte_carlo)
+        self.measure('generate_rolling_metrics', plotter.generate_rolling_metrics)
+        plotter.load_template()
+        chart_figures = {
+            name: self.measure('generate ' + name, plotter.build_chart, name)
+            for name in plotter.chart_registry.get_charts(plotter.template_variables)
+        }
+        chart_images = {
+            name: self.measure('export ' + name, plotter.export_chart_figure, figure)
+            for name, figure in chart_figures.items()
+        }
+        self.measure('template render', self.render_template, plotter, chart_images)
+        return self.results
+
+
+    def render_template(self, plotter, chart_images):
+        return plotter.template.render(**plotter.get_report_text(plotter.template_variables), **plotter.get_chart_sources(chart_images))
+
+
+def measure_startup():
+    startup_results = {}
+    for stage, arguments in STARTUP_COMMANDS.items():
+        timings = []
+        for _ in range(STARTUP_RUNS):
+            start_time = time.perf_counter()
+            subprocess.run([sys.executable] + arguments, cwd=PACKAGE_DIR, check=True, stdout=subprocess.DEVNULL)
+            timings.append(time.perf_counter() - start_time)
+        startup_results[stage] = { 'seconds': round(min(timings), 4) }
+    return startup_results
+
+
+def run_benchmarks(trade_counts, trace_memory=False):
+    results = { 'startup': measure_startup() }
+    # Starting the image exporter and plotly's first figure of each kind are one off costs, keep them out of whichever report size runs first
+    warm_export_worker()
+    with tempfile.TemporaryDirectory() as output_path:
+        warm_up_file = os.path.join(output_path, 'warm_up.htm')
+        Mt4_Report_Generator(WARM_UP_TRADE_COUNT).write_report(warm_up_file)
+        Stage_Benchmark(warm_up_file, output_path).run()
+        for trade_count in trade_counts:
+            report_file = os.path.join(output_path, 'synthetic_' + str(trade_count) + '.htm')
+            Mt4_Report_Generator(trade_count).write_report(report_file)
+            results[str(trade_count)] = Stage_Benchmark(report_file, output_path, trace_memory).run()
+    return results
+
+
+def compare_to_baselines(results, baselines, tolerance=DEFAULT_TOLERANCE):
+    regressions = []
+    for trade_count, stages in results.items():
+        for stage, stage_result in stages.items():
+            baseline = baselines.get(trade_count, {}).get(stage)
+            if not baseline or stage_result['seconds'] - baseline['seconds'] < MIN_REGRESSION_SECONDS:
+                continue
+            if stage_result['seconds'] > baseline['seconds'] * tolerance:
+                regressions.append((trade_count, stage, baseline['seconds'], stage_result['seconds']))
+    return regressions
+
+
+def print_results(results, baselines):
+    for trade_count, stages in results.items():
+        print(trade_count + ' trades' if trade_count.isdigit() else trade_count)
+        for stage, stage_result in stages.items():
+            baseline = baselines.get(trade_count, {}).get(stage)
+            line = '  ' + stage.ljust(40) + str(stage_result['seconds']).rjust(10) + 's'
+            if 'peak_mb' in stage_result:
+                line += str(stage_result['peak_mb']).rjust(10) + 'MB'
+            if baseline:
+                line += '  (baseline ' + str(baseline['seconds']) + 's)'
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark every pipeline stage on synthetic MT4 reports')
+    parser.add_argument('--trades', type=int, nargs='+', default=DEFAULT_TRADE_COUNTS, help='Report sizes to benchmark')
+    parser.add_argument('--memory', action='store_true', help='Record peak memory per stage, makes stages slower')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--update-baselines', action='store_true', help='Store these results as the new baselines')
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(BASELINES_FILE):
+        with open(BASELINES_FILE) as f:
+            baselines = json.load(f)
+    results = run_benchmarks(args.trades, trace_memory=args.memory)
+    print_results(results, baselines)
+
+    # tracemalloc slows every stage down, so memory runs are never compared to or stored as timing baselines
+    if args.memory:
+        return 0
+    if args.update_baselines:
+        baselines.update(results)
+        with open(BASELINES_FILE, 'w') as f:
+            json.dump(baselines, f, indent=4)
+        return 0
+    regressions = compare_to_baselines(results, baselines, args.tolerance)
+    for trade_count, stage, baseline_seconds, seconds in regressions:
+        print('REGRESSION ' + (trade_count + ' trades ' if trade_count.isdigit() else trade_count + ' ') + stage + ': ' + str(seconds) + 's vs baseline ' + str(baseline_seconds) + 's')
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
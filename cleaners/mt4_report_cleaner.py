@@ -1,51 +1,127 @@
 from bs4 import BeautifulSoup as bs
+from bs4.element import NavigableString, Tag
 import pandas as pd
+from cleaners.report_summary import Report_Summary
+from cleaners.mt4_report_parser import Mt4_Report_Parser, Mt4_Report_Parse_Error
+from cleaners.trade_ledger import Trade_Ledger, estimate_trade_rows
+from cleaners.report_writers import OUTPUT_FORMATS, Streaming_Xlsx_Writer, write_csv, write_parquet
+from pipeline.instrumentation import NULL_RECORDER
+
+
+#* Rows of a soup table in one walk, with implied </td> and </tr> tags html.parser nests every following row inside the last cell
+def get_table_rows(table):
+    rows = []
+    cell = None
+    for element in table.descendants:
+        if isinstance(element, Tag):
+            if element.name == 'tr':
+                cell = None
+                rows.append([])
+            elif element.name == 'td' and rows:
+                cell = []
+                rows[-1].append(cell)
+        elif isinstance(element, NavigableString) and cell is not None:
+            cell.append(str(element))
+    return [[''.join(cell).strip() for cell in row] for row in rows]
 
 
 class Mt4_Report_Cleaner():
-    def __init__(self, input_file, output_path):
+    def __init__(self, input_file, output_path, progress_callback=None, recorder=NULL_RECORDER):
         self.input_file = input_file
         self.output_path = output_path
+        self.progress_callback = progress_callback
+        self.recorder = recorder
         self.output_filename = ''
         self.soup = None
+        self.report_rows = None
+        self.system_name = None
+        self.summary_rows = None
+        self.trade_header = None
         self.summary_df = None
+        self.summary = None
         self.trades_df = None
     
 
     def run_cleaner(self):
-        self.open_report()
-        summary_list = self.scrape_summary_data()
-        self.build_summary_data_output(summary_list)
-        trades_list = self.scrape_trade_data()
-        self.build_trade_data_output(trades_list)
+        self.clean_report()
         self.write_data_to_xls()
         return self.output_filename
+
+
+    #* Cleans the report without writing anything so the frames can be handed straight to the plotter
+    def clean_report(self):
+        self.report_progress('parsing')
+        with self.recorder.stage('open_report'):
+            self.open_report()
+        with self.recorder.stage('scrape_summary_data') as stage:
+            summary_list = self.scrape_summary_data()
+            stage.rows = len(summary_list)
+        with self.recorder.stage('build_summary_data_output') as stage:
+            self.build_summary_data_output(summary_list)
+            stage.rows = len(self.summary_df)
+        with self.recorder.stage('scrape_trade_data') as stage:
+            trades_list = self.scrape_trade_data()
+            stage.rows = len(trades_list)
+        self.report_progress('pairing')
+        with self.recorder.stage('build_trade_data_output') as stage:
+            self.build_trade_data_output(trades_list)
+            stage.rows = len(self.trades_df)
+        return self.summary_df, self.trades_df
+
+
+    def report_progress(self, stage):
+        if self.progress_callback:
+            self.progress_callback(stage)
     
 
+    #* Streams the report tables, falling back to a full BeautifulSoup tree for malformed files
     def open_report(self):
-        with open(self.input_file) as file:
-            self.soup = bs(file, 'html.parser')
+        try:
+            self.open_report_stream()
+        except Mt4_Report_Parse_Error:
+            self.open_report_soup()
+        self.build_output_filename()
+
+
+    def build_output_filename(self):
         output_filename = self.input_file.replace('.htm', '.xlsx') 
         slice_index = output_filename.rfind('/')
         self.output_filename = self.output_path + output_filename[slice_index:]
+        return self.output_filename
+    
+
+    #* Reads up to the trade table header, the trade rows are left in the stream until scraped
+    def open_report_stream(self):
+        parser = Mt4_Report_Parser(self.input_file)
+        self.report_rows = parser.iter_rows()
+        self.summary_rows = []
+        for table_index, row in self.report_rows:
+            if table_index == Mt4_Report_Parser.TRADE_TABLE_INDEX:
+                self.trade_header = row
+                break
+            self.summary_rows.append(row)
+        self.system_name = parser.system_name
+
+
+    def open_report_soup(self):
+        self.report_rows = None
+        with open(self.input_file) as file:
+            self.soup = bs(file, 'html.parser')
+        if len(self.soup.find_all('table')) < 2 or len(self.soup.find_all('b')) < 2:
+            raise Mt4_Report_Parse_Error('Expected a summary and trade table in ' + self.input_file)
+        self.system_name = self.soup.find_all('b')[1].text.strip()
     
 
     #* Scrape the trade sumary out of the report webpage
     def scrape_summary_data(self):
-        trade_summary = self.soup.findAll('table')[0]
-        trade_summary_rows = trade_summary.find_all('tr')
-        trade_summary_list = []
-        for tr in trade_summary_rows:
-            td = tr.find_all('td')
-            row = [tr.text for tr in td]
-            trade_summary_list.append(row)
-        return trade_summary_list
+        if self.soup is None:
+            return self.summary_rows
+        return get_table_rows(self.soup.find_all('table')[0])
     
 
     #* Cleans random table row lengths into 1:1 matching key value pairs
     def build_summary_data_output(self, trade_summary_list):
-        system_name = self.soup.findAll('b')[1].text
-        trade_summary_list_final = [['System Name', system_name]]
+        trade_summary_list_final = [['System Name', self.system_name]]
         for row in trade_summary_list:
             clean_row = []
             for item in row:
@@ -71,51 +147,75 @@ class Mt4_Report_Cleaner():
                 trade_summary_list_final.append([new_string1_key, new_string1_value])
                 trade_summary_list_final.append([new_string2_key, clean_row[4]])
         self.summary_df = pd.DataFrame(trade_summary_list_final,columns=['Key', 'Value'])
+        self.summary = Report_Summary(trade_summary_list_final)
 
 
     #* Scrape the trade data out of the report webpage
     def scrape_trade_data(self):
-        tradeData = self.soup.findAll('table')[1]
-        trade_data_rows = tradeData.find_all('tr')
-        trade_data_list = []
-        # Buld a dataframe of the trade data:
-        for tr in trade_data_rows:
-            td = tr.find_all('td')
-            row = [tr.text for tr in td]
-            trade_data_list.append(row)
-        df = pd.DataFrame(trade_data_list[1:],columns=trade_data_list[0])
-        return df
+        if self.soup is None:
+            try:
+                return self.scrape_trade_data_stream()
+            except Mt4_Report_Parse_Error:
+                self.open_report_soup()
+        trade_data_list = get_table_rows(self.soup.find_all('table')[1])
+        ledger = Trade_Ledger(trade_data_list[0], capacity=len(trade_data_list))
+        return ledger.extend(trade_data_list[1:]).to_frame()
+
+
+    #* Typed columns are filled row by row as the parser yields them, no list of string rows is ever built
+    def scrape_trade_data_stream(self):
+        ledger = Trade_Ledger(self.trade_header, capacity=estimate_trade_rows(self.input_file))
+        ledger.extend(row for table_index, row in self.report_rows)
+        self.report_rows = None
+        return ledger.to_frame()
 
 
+    #* Pairs every order's opening row with its closing rows in one grouped pass, the ledger itself stays in report order
     def build_trade_data_output(self, trades_list):
         df = trades_list
-        # Modify DF to get unique orders and their duration
-        df['Time'] = pd.to_datetime(df['Time'])
-        final_trade_data = pd.DataFrame()
-        order_numbers = df['Order'].unique()
-        for order_number in order_numbers:
-            order_number = int(order_number)
-            order_number = order_number - 1
-            order_pair = df.loc[df['Order'] == order_numbers[order_number]]
-            open_time = order_pair.iloc[0]['Time']
-            close_time = order_pair.iloc[1]['Time']
-            duration = close_time - open_time
-            days, seconds = duration.days, duration.seconds
-            hours = days * 24 + seconds // 3600
-            minutes = (seconds % 3600) // 60
-            seconds = seconds % 60
-            duration_in_min = (hours*60)+minutes
-            duration_in_hrs = round( ((minutes/60)+hours), 2)
-            order_pair.insert(2, 'Duration (hrs)', [duration_in_hrs, duration_in_hrs])
-            final_trade_data = pd.concat([final_trade_data, order_pair])
-        self.trades_df = final_trade_data
+        # MT4 lists rows by time, so closes are in close time order even when positions overlap
+        if not df['#'].is_monotonic_increasing:
+            df = df.sort_values('#', kind='stable')
+        df = df.reset_index(drop=True)
+        orders = df['Order']
+        open_time = df['Time'].groupby(orders).transform('first')
+        # Only close rows carry a profit, orders still open at the end of the test get no duration
+        close_time = df['Time'].where(df['Profit'].notna()).groupby(orders).transform('max')
+        duration_in_min = (close_time - open_time) // pd.Timedelta(minutes=1)
+        df.insert(2, 'Duration (hrs)', (duration_in_min / 60).round(2))
+        self.trades_df = df
+
+
+    #* Writes the cleaned data as xlsx, or as a summary and a trades file for csv and parquet
+    def write_data(self, output_format='xlsx'):
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError('Unknown output format "' + output_format + '", expected one of ' + ', '.join(OUTPUT_FORMATS))
+        if output_format == 'xlsx':
+            self.write_data_to_xls()
+            return [self.output_filename]
+        self.report_progress('writing ' + output_format)
+        write_frame = write_csv if output_format == 'csv' else write_parquet
+        output_base = self.output_filename[:-5]
+        with self.recorder.stage('write_data_to_' + output_format) as stage:
+            summary_filename = write_frame(self.summary_df, output_base + '_summary.' + output_format)
+            trades_filename = write_frame(self.trades_df, output_base + '_trades.' + output_format)
+            stage.rows = len(self.trades_df)
+        return [summary_filename, trades_filename]
 
 
     #*  Output the contents of the trade data table in excel format
-    def write_data_to_xls(self):
+    def write_data_to_xls(self, streaming=True):
+        self.report_progress('writing xlsx')
+        if streaming:
+            # Constant memory, and ledgers past Excel's row limit carry on in trade_data_2, trade_data_3, ...
+            with self.recorder.stage('write_data_to_xls') as stage, Streaming_Xlsx_Writer(self.output_filename) as writer:
+                writer.write_frame(self.summary_df, 'summary_data')
+                writer.write_frame(self.trades_df, 'trade_data')
+                stage.rows = len(self.trades_df)
+            return
         #  Create a Pandas Excel writer using XlsxWriter as the engine.
-        with pd.ExcelWriter(self.output_filename, engine='xlsxwriter') as writer:    
+        with self.recorder.stage('write_data_to_xls') as stage, pd.ExcelWriter(self.output_filename, engine='xlsxwriter') as writer:    
             # Write each dataframe to a different worksheet.
             self.summary_df.to_excel(writer, sheet_name='summary_data', index=False)
             self.trades_df.to_excel(writer, sheet_name='trade_data', index=False)
-    
\ No newline at end of file
+            stage.rows = len(self.trades_df)
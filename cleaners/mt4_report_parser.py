@@ -0,0 +1,102 @@
+from html.parser import HTMLParser
+
+
+class Mt4_Report_Parse_Error(Exception):
+    pass
+
+
+#* Event driven parser which only keeps the tags the cleaner needs from an MT4 report
+class Mt4_Report_Parser(HTMLParser):
+    SUMMARY_TABLE_INDEX = 0
+    TRADE_TABLE_INDEX = 1
+    SYSTEM_NAME_TAG_INDEX = 1
+
+    def __init__(self, input_file, chunk_size=1 << 16):
+        HTMLParser.__init__(self, convert_charrefs=True)
+        self.input_file = input_file
+        self.chunk_size = chunk_size
+        self.system_name = None
+        self.table_index = -1
+        self.table_depth = 0
+        self.b_tag_count = 0
+        self.b_tag_text = None
+        self.current_row = None
+        self.current_cell = None
+        self.pending_rows = []
+
+
+    #* Yields (table_index, row) tuples while reading the report a chunk at a time
+    def iter_rows(self):
+        with open(self.input_file) as file:
+            while True:
+                chunk = file.read(self.chunk_size)
+                if not chunk:
+                    break
+                self.feed(chunk)
+                yield from self.drain_rows()
+            self.close()
+            yield from self.drain_rows()
+        if self.table_index < self.TRADE_TABLE_INDEX:
+            raise Mt4_Report_Parse_Error('Expected a summary and trade table in ' + self.input_file)
+        if self.system_name is None:
+            raise Mt4_Report_Parse_Error('Could not find the system name in ' + self.input_file)
+
+
+    def drain_rows(self):
+        rows = self.pending_rows
+        self.pending_rows = []
+        return rows
+
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'table':
+            self.table_depth += 1
+            if self.table_depth == 1:
+                self.table_index += 1
+        elif tag == 'tr' and self.table_depth:
+            self.finish_row()
+            self.current_row = []
+        elif tag == 'td' and self.current_row is not None:
+            self.finish_cell()
+            self.current_cell = []
+        elif tag == 'b':
+            self.b_tag_count += 1
+            if self.b_tag_count == self.SYSTEM_NAME_TAG_INDEX + 1:
+                self.b_tag_text = []
+
+
+    def handle_endtag(self, tag):
+        if tag == 'table' and self.table_depth:
+            self.finish_row()
+            self.table_depth -= 1
+        elif tag == 'tr':
+            self.finish_row()
+        elif tag == 'td':
+            self.finish_cell()
+        elif tag == 'b' and self.b_tag_text is not None:
+            self.system_name = ''.join(self.b_tag_text).strip()
+            self.b_tag_text = None
+
+
+    def handle_data(self, data):
+        if self.current_cell is not None:
+            self.current_cell.append(data)
+        if self.b_tag_text is not None:
+            self.b_tag_text.append(data)
+
+
+    #* A cell left open runs up to the next tag, so the line break before it is stripped along with any padding
+    def finish_cell(self):
+        if self.current_cell is not None:
+            self.current_row.append(''.join(self.current_cell).strip())
+            self.current_cell = None
+
+
+    #* MT4 leaves most </td> and </tr> tags implied, so rows are closed by the next tag
+    def finish_row(self):
+        if self.current_row is None:
+            return
+        self.finish_cell()
+        if self.table_index in (self.SUMMARY_TABLE_INDEX, self.TRADE_TABLE_INDEX):
+            self.pending_rows.append((self.table_index, self.current_row))
+        self.current_row = None
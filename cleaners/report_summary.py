@@ -0,0 +1,112 @@
+import re
+
+
+# Keys the html report reads, reports missing any of them fail validation up front
+REPORT_SUMMARY_KEYS = [
+    'System Name',
+    'Symbol',
+    'Period',
+    'Duration',
+    'Bars in test',
+    'Ticks modelled',
+    'Modelling quality',
+    'Mismatched charts errors',
+    'Gross profit',
+    'Gross loss',
+    'Total net profit',
+    'Absolute drawdown',
+    'Maximal drawdown',
+    'Relative drawdown',
+    'Total trades',
+    'Short positions (won %)',
+    'Long positions (won %)',
+    'Largest profit trade',
+    'Largest loss trade',
+    'Average profit trade',
+    'Average loss trade',
+    'Maximum consecutive wins (profit in money)',
+    'Maximum consecutive losses (loss in money)',
+    'Maximal consecutive profit (count of wins)',
+    'Maximal consecutive loss (count of losses)',
+    'Average consecutive wins',
+    'Average consecutive losses',
+]
+
+NUMBER_PATTERN = re.compile(r'(\()?(-?\d+(?:\.\d+)?)(%)?')
+
+
+class Summary_Validation_Error(ValueError):
+    pass
+
+
+#* One summary value, the numbers in values like "500.00 (4.50%)" are parsed once up front
+class Summary_Field():
+    __slots__ = ('key', 'text', 'number', 'detail', 'percent')
+
+    def __init__(self, key, text):
+        self.key = key
+        self.text = text
+        self.number = None
+        self.detail = None
+        self.percent = None
+        for in_parentheses, number, percent_sign in NUMBER_PATTERN.findall(text):
+            number = float(number)
+            if percent_sign:
+                self.percent = number
+            if in_parentheses:
+                self.detail = number if self.detail is None else self.detail
+            elif self.number is None:
+                self.number = number
+
+
+    def __repr__(self):
+        return 'Summary_Field(' + repr(self.key) + ', ' + repr(self.text) + ')'
+
+
+#* Summary key value pairs indexed by key
+class Report_Summary():
+    __slots__ = ('fields',)
+
+    def __init__(self, key_value_pairs):
+        self.fields = { key: Summary_Field(key, str(value)) for key, value in key_value_pairs }
+
+
+    @classmethod
+    def from_summary_df(cls, summary_df):
+        return cls(zip(summary_df['Key'], summary_df['Value']))
+
+
+    def __contains__(self, key):
+        return key in self.fields
+
+
+    def __getitem__(self, key):
+        try:
+            return self.fields[key]
+        except KeyError:
+            raise Summary_Validation_Error(
+                'Summary is missing "' + key + '", found: ' + ', '.join(self.fields)
+            ) from None
+
+
+    def get_text(self, key):
+        return self[key].text
+
+
+    def get_number(self, key):
+        return self[key].number
+
+
+    def get_percent(self, key):
+        return self[key].percent
+
+
+    #* Lists every missing key at once so reports from other MT4 builds are easy to diagnose
+    def validate(self, required_keys=REPORT_SUMMARY_KEYS):
+        missing_keys = [key for key in required_keys if key not in self.fields]
+        if missing_keys:
+            raise Summary_Validation_Error(
+                'Summary is missing ' + ', '.join('"' + key + '"' for key in missing_keys) +
+                ', found: ' + ', '.join(self.fields)
+            )
+        return self
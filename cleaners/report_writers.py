@@ -0,0 +1,67 @@
+import xlsxwriter
+
+
+OUTPUT_FORMATS = ['xlsx', 'csv', 'parquet']
+EXCEL_MAX_ROWS = 1048576
+WRITE_CHUNK_ROWS = 50000
+
+
+#* Turns a frame slice into plain python rows, NaN and NaT become empty cells
+def get_chunk_rows(df, start, stop):
+    chunk = df.iloc[start:stop].astype(object)
+    return chunk.where(chunk.notna(), None).values.tolist()
+
+
+#* Writes sheets row by row with xlsxwriter's constant memory mode, long sheets continue on numbered sheets
+class Streaming_Xlsx_Writer():
+    def __init__(self, output_filename, max_rows=EXCEL_MAX_ROWS):
+        self.output_filename = output_filename
+        self.max_rows = max_rows
+        self.workbook = None
+
+
+    def __enter__(self):
+        self.workbook = xlsxwriter.Workbook(self.output_filename, {
+            'constant_memory': True,
+            'default_date_format': 'yyyy-mm-dd hh:mm:ss',
+        })
+        self.header_format = self.workbook.add_format({ 'bold': True, 'border': 1, 'align': 'center' })
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.workbook.close()
+        return False
+
+
+    #* Sheets after the first are named trade_data_2, trade_data_3, ... and repeat the header row
+    def write_frame(self, df, sheet_name):
+        header = [str(column) for column in df.columns]
+        rows_per_sheet = self.max_rows - 1
+        sheet_names = []
+        for sheet_start in range(0, max(len(df), 1), rows_per_sheet):
+            sheet_number = sheet_start // rows_per_sheet + 1
+            worksheet_name = sheet_name if sheet_number == 1 else sheet_name + '_' + str(sheet_number)
+            worksheet = self.workbook.add_worksheet(worksheet_name)
+            worksheet.write_row(0, 0, header, self.header_format)
+            sheet_stop = min(sheet_start + rows_per_sheet, len(df))
+            row_number = 1
+            for chunk_start in range(sheet_start, sheet_stop, WRITE_CHUNK_ROWS):
+                for row in get_chunk_rows(df, chunk_start, min(chunk_start + WRITE_CHUNK_ROWS, sheet_stop)):
+                    worksheet.write_row(row_number, 0, row)
+                    row_number += 1
+            sheet_names.append(worksheet_name)
+        return sheet_names
+
+
+def write_csv(df, output_filename):
+    df.to_csv(output_filename, index=False, chunksize=WRITE_CHUNK_ROWS)
+    return output_filename
+
+
+def write_parquet(df, output_filename):
+    try:
+        df.to_parquet(output_filename, index=False)
+    except ImportError as error:
+        raise ImportError('Parquet output needs pyarrow, install it with `pip install pyarrow`') from error
+    return output_filename
@@ -0,0 +1,97 @@
+import os
+import numpy as np
+import pandas as pd
+from cleaners.mt4_report_parser import Mt4_Report_Parse_Error
+
+
+TRADE_VALUE_COLUMNS = ['Size', 'Price', 'S / L', 'T / P', 'Profit', 'Balance']
+TRADE_HEADER = ['#', 'Time', 'Type', 'Order'] + TRADE_VALUE_COLUMNS
+# Known MT4 order types come first so every report gets the same category codes, others are appended as seen
+TRADE_TYPES = ['buy', 'sell', 'buy limit', 'sell limit', 'buy stop', 'sell stop', 'modify', 'close', 'close at stop', 'delete']
+TRADE_TIME_FORMAT = '%Y.%m.%d %H:%M'
+# A trade row takes a little over 200 bytes of report html, so this slightly overestimates the row count
+REPORT_BYTES_PER_ROW = 200
+MIN_CAPACITY = 1024
+
+
+def estimate_trade_rows(input_file):
+    return max(os.path.getsize(input_file) // REPORT_BYTES_PER_ROW, MIN_CAPACITY)
+
+
+#* Collects trade rows straight into preallocated typed arrays while the report is parsed
+class Trade_Ledger():
+    def __init__(self, header, capacity=MIN_CAPACITY):
+        if list(header) != TRADE_HEADER:
+            raise Mt4_Report_Parse_Error('Unexpected trade table header ' + str(header))
+        self.row_count = 0
+        self.type_codes = { name: code for code, name in enumerate(TRADE_TYPES) }
+        self.type_names = list(TRADE_TYPES)
+        self.allocate(max(capacity, 1))
+
+
+    def allocate(self, capacity):
+        self.capacity = capacity
+        self.row_numbers = np.empty(capacity, dtype=np.int64)
+        self.times = np.empty(capacity, dtype='U16')
+        self.types = np.empty(capacity, dtype=np.int16)
+        self.orders = np.empty(capacity, dtype=np.int64)
+        self.values = np.full((capacity, len(TRADE_VALUE_COLUMNS)), np.nan)
+
+
+    #* Doubles the arrays when the size estimate was too low
+    def grow(self):
+        row_numbers, times, types, orders, values = self.row_numbers, self.times, self.types, self.orders, self.values
+        self.allocate(self.capacity * 2)
+        self.row_numbers[:self.row_count] = row_numbers
+        self.times[:self.row_count] = times
+        self.types[:self.row_count] = types
+        self.orders[:self.row_count] = orders
+        self.values[:self.row_count] = values
+
+
+    #* Open and modify rows stop before Profit and Balance, missing and blank cells are left as NaN
+    def append(self, row):
+        if len(row) > len(TRADE_HEADER):
+            raise Mt4_Report_Parse_Error('Malformed trade row ' + str(row) + ', expected at most ' + str(len(TRADE_HEADER)) + ' cells')
+        if self.row_count == self.capacity:
+            self.grow()
+        index = self.row_count
+        row = [cell.strip() for cell in row]
+        try:
+            self.row_numbers[index] = int(row[0])
+            self.times[index] = row[1]
+            self.orders[index] = int(row[3])
+            values = [float(cell) if cell else np.nan for cell in row[4:]]
+        except (ValueError, IndexError) as error:
+            raise Mt4_Report_Parse_Error('Malformed trade row ' + str(row)) from error
+        self.values[index, :len(values)] = values
+        type_name = row[2]
+        type_code = self.type_codes.get(type_name)
+        if type_code is None:
+            type_code = self.type_codes[type_name] = len(self.type_names)
+            self.type_names.append(type_name)
+        self.types[index] = type_code
+        self.row_count += 1
+
+
+    def extend(self, rows):
+        for row in rows:
+            self.append(row)
+        return self
+
+
+    def __len__(self):
+        return self.row_count
+
+
+    def to_frame(self):
+        row_count = self.row_count
+        columns = {
+            '#': self.row_numbers[:row_count],
+            'Time': pd.to_datetime(self.times[:row_count], format=TRADE_TIME_FORMAT),
+            'Type': pd.Categorical.from_codes(self.types[:row_count], categories=self.type_names),
+            'Order': self.orders[:row_count],
+        }
+        for position, column in enumerate(TRADE_VALUE_COLUMNS):
+            columns[column] = self.values[:row_count, position]
+        return pd.DataFrame(columns)
@@ -0,0 +1,308 @@
+import argparse
+import sys
+
+
+## Headless entry point for running the analyzer without the GUI
+
+
+#* The process_report options batch and watch share
+def get_report_options(args):
+    from analytics.monte_carlo import DEFAULT_SIMULATION_SECONDS, DEFAULT_SIMULATIONS
+    from analytics.rolling_metrics import DEFAULT_ROLLING_WINDOW
+    return {
+        'data_format': args.format,
+        'cache_dir': None if args.no_cache else args.cache_dir,
+        'trace_dir': args.trace_dir,
+        'trace_memory': args.trace_memory,
+        'template_file': args.template,
+        'simulations': DEFAULT_SIMULATIONS if args.simulations is None else args.simulations,
+        'simulation_seconds': DEFAULT_SIMULATION_SECONDS if args.simulation_seconds is None else args.simulation_seconds,
+        'rolling_window': DEFAULT_ROLLING_WINDOW if args.rolling_window is None else args.rolling_window,
+        'rolling_window_unit': args.rolling_unit,
+        'store_file': args.store,
+        'image_format': args.image_format,
+        'image_quality': args.image_quality,
+        'asset_mode': 'external' if args.external_assets else 'inline',
+    }
+
+
+def print_result(result):
+    print('[' + result['status'] + '] ' + result['input_file'] + ' (' + str(result['seconds']) + 's) ' + result['error'])
+
+
+def run_batch(args):
+    from pipeline.batch_runner import Batch_Runner
+
+    runner = Batch_Runner(args.inputs, args.output, mode=args.mode, workers=args.workers, **get_report_options(args))
+    if not runner.input_files:
+        print('No input reports found')
+        return 1
+    runner.run(on_result=print_result)
+    failures = runner.get_failures()
+    print(
+        str(len(runner.results) - len(failures)) + ' succeeded, ' + str(len(failures)) + ' failed in ' +
+        str(round(runner.elapsed_seconds, 1)) + 's (' + str(round(runner.get_reports_per_minute(), 1)) + ' reports/min)'
+    )
+    return 1 if failures else 0
+
+
+def run_watch(args):
+    from pipeline.watch_folder import DEFAULT_POLL_SECONDS, DEFAULT_SETTLE_SECONDS, Folder_Watcher
+
+    # Reports journalled under their own name are only counted, a restart would otherwise list the whole folder
+    def print_skipped(input_file, entry):
+        if entry is None:
+            print('[skipped] ' + input_file + ' (same content already queued)')
+        elif entry['input_file'] != input_file:
+            print('[skipped] ' + input_file + ' (same content as ' + entry['input_file'] + ', ' + entry['status'] + ')')
+
+    watcher = Folder_Watcher(
+        args.folder,
+        args.output,
+        mode=args.mode,
+        workers=args.workers,
+        journal_file=args.journal,
+        poll_seconds=DEFAULT_POLL_SECONDS if args.poll_seconds is None else args.poll_seconds,
+        settle_seconds=DEFAULT_SETTLE_SECONDS if args.settle_seconds is None else args.settle_seconds,
+        retry_failed=args.retry_failed,
+        **get_report_options(args),
+    )
+    print('Watching ' + args.folder + ', ' + str(len(watcher.journal)) + ' reports already in ' + watcher.journal.journal_file)
+    # Ctrl-C stops watching, reports already running are finished first
+    watcher.run(on_result=print_result, on_skipped=print_skipped, until_idle=args.once)
+    failures = [result for result in watcher.results if result['status'] != 'ok']
+    print(str(len(watcher.results) - len(failures)) + ' processed, ' + str(len(failures)) + ' failed, ' + str(watcher.skipped) + ' skipped')
+    return 1 if failures else 0
+
+
+def run_cache(args):
+    from pipeline.report_cache import Report_Cache
+    report_cache = Report_Cache(args.cache_dir)
+    if args.action == 'clear':
+        report_cache.clear()
+        print('Cleared ' + args.cache_dir)
+    elif args.action == 'invalidate':
+        for input_file in args.files:
+            print(('Invalidated ' if report_cache.invalidate(input_file) else 'Not cached ') + input_file)
+    else:
+        print(str(len(report_cache.get_entries())) + ' entries, ' + str(round(report_cache.get_size() / 1024 / 1024, 1)) + ' MB in ' + args.cache_dir)
+    return 0
+
+
+def run_store(args):
+    from pipeline.run_store import Run_Store
+    with Run_Store(args.store) as store:
+        if args.store_action == 'ingest':
+            from pipeline.batch_runner import find_input_files
+
+            def print_ingested(input_file, run_id, error):
+                print(('[failed] ' + input_file + ' ' + repr(error)) if error else ('[run ' + str(run_id) + '] ' + input_file))
+
+            input_files = find_input_files(args.inputs, 'data')
+            run_ids = store.ingest_reports(input_files, workers=args.workers, on_ingested=print_ingested)
+            return 1 if None in run_ids.values() else 0
+        if args.store_action == 'top':
+            runs = store.get_top_runs(
+                args.by,
+                args.limit,
+                ascending=args.ascending,
+                max_drawdown_percent=args.max_drawdown,
+                min_trades=args.min_trades,
+                system_name=args.system,
+                symbol=args.symbol,
+                period=args.period,
+                parameters=dict(args.param),
+            )
+            print_runs(runs, ['run_id', 'system_name', 'symbol', 'period', 'net_profit', 'profit_factor', 'maximal_drawdown_percent', 'total_trades', 'parameters'])
+        elif args.store_action == 'compare':
+            from reports.run_comparison import Run_Comparison
+            print('Wrote ' + Run_Comparison(store, args.run_ids, args.output).generate_report())
+        elif args.store_action == 'remove':
+            for run_id in args.run_ids:
+                print(('Removed run ' if store.remove_run(run_id) else 'No run ') + str(run_id))
+        else:
+            info = store.get_info()
+            print(
+                str(info['runs']) + ' runs of ' + str(info['systems']) + ' systems on ' + str(info['symbols']) + ' symbols, ' +
+                str(info['trades']) + ' ledger rows, ' + str(round(info['bytes'] / 1024 / 1024, 1)) + ' MB in ' + args.store
+            )
+    return 0
+
+
+def print_runs(runs, columns):
+    rows = [columns] + [[format(run[column], '.2f') if isinstance(run[column], float) else str(run[column]) for column in columns] for run in runs]
+    widths = [max(len(row[index]) for row in rows) for index in range(len(columns))]
+    for row in rows:
+        print('  '.join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def run_serve(args):
+    from pipeline.report_service import Report_Service, serve
+
+    def print_ready(http_server):
+        host, port = http_server.server_address[:2]
+        print('Serving on http://' + host + ':' + str(port) + ' with ' + str(args.workers) + ' warm workers, POST reports to /report, metrics at /metrics')
+
+    report_service = Report_Service(
+        workers=args.workers,
+        max_queued=args.max_queued,
+        request_timeout=args.timeout,
+        template_file=args.template,
+        cache_dir=None if args.no_cache else args.cache_dir,
+        max_upload_bytes=args.max_upload_mb * 1024 * 1024,
+    )
+    try:
+        serve(report_service, args.host, args.port, on_ready=print_ready)
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+#* Quality the chart encoders accept, rejected while parsing so a bad value doesn't fail every report in a batch
+def get_image_quality(value):
+    from reports.chart_assets import IMAGE_QUALITY_SUPPORTED
+    quality = int(value)
+    if not 1 <= quality <= 100:
+        raise argparse.ArgumentTypeError('image quality must be between 1 and 100, got ' + value)
+    if not IMAGE_QUALITY_SUPPORTED:
+        raise argparse.ArgumentTypeError('re-encoding charts needs Pillow, install it with pip install pillow or leave out --image-quality')
+    return quality
+
+
+#* --param NAME=VALUE as a (name, value) pair, a missing = is a usage error rather than a crash in the query
+def get_parameter_filter(value):
+    name, separator, parameter_value = value.partition('=')
+    if not separator or not name:
+        raise argparse.ArgumentTypeError('expected NAME=VALUE, e.g. Lots=0.1, got ' + value)
+    return name, parameter_value
+
+
+#* Report options batch and watch share, read back by get_report_options
+def add_report_arguments(parser):
+    from pipeline.report_cache import DEFAULT_CACHE_DIR
+    from pipeline.run_store import DEFAULT_STORE_FILE
+    from reports.report_templates import DEFAULT_TEMPLATE_FILE
+
+    parser.add_argument(
+        '--format',
+        choices=['xlsx', 'csv', 'parquet'],
+        default='xlsx',
+        help='Data file format, csv and parquet write separate _summary and _trades files',
+    )
+    parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR, help='Cache of cleaned frames and rendered charts')
+    parser.add_argument('--no-cache', action='store_true', help='Always re-parse reports and re-render charts')
+    parser.add_argument('--trace-dir', default=None, help='Write per stage timings (.stages.jsonl) and a Chrome/Perfetto trace (.trace.json) per report')
+    parser.add_argument('--trace-memory', action='store_true', help='Also record peak memory per stage, slows the run down')
+    parser.add_argument(
+        '--template',
+        default=DEFAULT_TEMPLATE_FILE,
+        help='Report template, only the charts and stats it references are built (e.g. reports/summary_template.html)',
+    )
+    # Defaults live with the simulation, importing it here would load numpy just to print --help
+    parser.add_argument('--simulations', type=int, default=None, help='Monte Carlo resamples of the trade sequence per report, defaults to 10000')
+    parser.add_argument('--simulation-seconds', type=float, default=None, help='Time budget of the Monte Carlo resampling per report, sized from the trade count so results are reproducible, 0 for none, defaults to 5')
+    parser.add_argument('--rolling-window', type=int, default=None, help='Window of the rolling metrics chart, in --rolling-unit, defaults to 100')
+    parser.add_argument('--rolling-unit', choices=['trades', 'days'], default='trades', help='Whether --rolling-window counts closed trades or calendar days')
+    parser.add_argument('--image-format', choices=['jpeg', 'png', 'webp'], default='jpeg', help='Chart image format')
+    parser.add_argument('--image-quality', type=get_image_quality, default=None, help='Re-encode charts at this quality (1-100), needs pillow')
+    parser.add_argument(
+        '--external-assets',
+        action='store_true',
+        help='Write charts as content hashed files in an assets folder next to the reports instead of inlining them, reports in one folder share identical charts',
+    )
+    parser.add_argument(
+        '--store',
+        nargs='?',
+        const=DEFAULT_STORE_FILE,
+        default=None,
+        help='Also add every report to the run store (' + DEFAULT_STORE_FILE + ' unless a file is given)',
+    )
+
+
+def build_parser():
+    from pipeline.report_cache import DEFAULT_CACHE_DIR
+    from pipeline.report_service import DEFAULT_MAX_QUEUED, DEFAULT_REQUEST_TIMEOUT, DEFAULT_SERVICE_PORT, DEFAULT_SERVICE_WORKERS
+    from pipeline.run_store import DEFAULT_STORE_FILE, RUN_METRICS
+    from reports.report_templates import DEFAULT_TEMPLATE_FILE
+
+    parser = argparse.ArgumentParser(description='MT4 Backtest Report Analyzer')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    batch_parser = subparsers.add_parser('batch', help='Process every report in a directory or glob across cores')
+    batch_parser.add_argument('inputs', nargs='+', help='Report directories or glob patterns')
+    batch_parser.add_argument('-o', '--output', required=True, help='Directory the xlsx and html files are written to')
+    batch_parser.add_argument(
+        '--mode',
+        choices=['full', 'data', 'report'],
+        default='full',
+        help='full: mt4 report to data file and html, data: mt4 report to data file only, report: xlsx to html only',
+    )
+    batch_parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to the cpu count')
+    add_report_arguments(batch_parser)
+    batch_parser.set_defaults(func=run_batch)
+
+    watch_parser = subparsers.add_parser('watch', help='Process reports as they are written into a folder, e.g. during an optimization run')
+    watch_parser.add_argument('folder', help='Folder MT4 writes the reports to')
+    watch_parser.add_argument('-o', '--output', required=True, help='Directory the xlsx and html files are written to')
+    watch_parser.add_argument('--mode', choices=['full', 'data', 'report'], default='full', help='As for batch')
+    watch_parser.add_argument('--workers', type=int, default=None, help='Worker processes, defaults to the cpu count')
+    watch_parser.add_argument('--journal', default=None, help='Record of the processed reports, restarts skip what it lists (defaults to watch_journal.jsonl in the output directory)')
+    # Defaults live with the watcher, which imports the whole pipeline
+    watch_parser.add_argument('--poll-seconds', type=float, default=None, help='How often the folder is scanned, defaults to 2')
+    watch_parser.add_argument('--settle-seconds', type=float, default=None, help='How long a report must go unmodified before it is picked up, defaults to 5')
+    watch_parser.add_argument('--retry-failed', action='store_true', help='Process reports the journal lists as failed again')
+    watch_parser.add_argument('--once', action='store_true', help='Exit once every report in the folder has been handled')
+    add_report_arguments(watch_parser)
+    watch_parser.set_defaults(func=run_watch)
+
+    serve_parser = subparsers.add_parser('serve', help='Serve html reports over HTTP from a pool of warm workers')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_SERVICE_PORT)
+    serve_parser.add_argument('--workers', type=int, default=DEFAULT_SERVICE_WORKERS, help='Warm worker processes')
+    serve_parser.add_argument('--max-queued', type=int, default=DEFAULT_MAX_QUEUED, help='Requests allowed to wait for a worker before answering 503')
+    serve_parser.add_argument('--timeout', type=float, default=DEFAULT_REQUEST_TIMEOUT, help='Seconds before a request is answered 504')
+    serve_parser.add_argument('--max-upload-mb', type=int, default=100)
+    serve_parser.add_argument('--template', default=DEFAULT_TEMPLATE_FILE)
+    serve_parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    serve_parser.add_argument('--no-cache', action='store_true')
+    serve_parser.set_defaults(func=run_serve)
+
+    cache_parser = subparsers.add_parser('cache', help='Inspect, invalidate or clear the report cache')
+    cache_parser.add_argument('action', choices=['info', 'invalidate', 'clear'])
+    cache_parser.add_argument('files', nargs='*', help='Reports to invalidate')
+    cache_parser.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR)
+    cache_parser.set_defaults(func=run_cache)
+
+    store_parser = subparsers.add_parser('store', help='Query and compare the runs in the run store')
+    store_parser.add_argument('--store', default=DEFAULT_STORE_FILE, help='Run store file')
+    store_parser.set_defaults(func=run_store)
+    store_subparsers = store_parser.add_subparsers(dest='store_action', required=True)
+    ingest_parser = store_subparsers.add_parser('ingest', help='Add MT4 reports to the store, reports already in it are skipped')
+    ingest_parser.add_argument('inputs', nargs='+', help='Report directories or glob patterns')
+    ingest_parser.add_argument('--workers', type=int, default=None, help='Parser processes, defaults to the cpu count')
+    top_parser = store_subparsers.add_parser('top', help='List the best runs by a metric')
+    top_parser.add_argument('--by', choices=RUN_METRICS, default='profit_factor', help='Metric to sort on')
+    top_parser.add_argument('--limit', type=int, default=20)
+    top_parser.add_argument('--ascending', action='store_true', help='Lowest first')
+    top_parser.add_argument('--max-drawdown', type=float, default=None, help='Only runs with a maximal drawdown under this percent')
+    top_parser.add_argument('--min-trades', type=int, default=None)
+    top_parser.add_argument('--system', default=None)
+    top_parser.add_argument('--symbol', default=None, help='Symbol code, e.g. EURUSD')
+    top_parser.add_argument('--period', default=None, help='Period code, e.g. H1')
+    top_parser.add_argument('--param', action='append', type=get_parameter_filter, default=[], help='Only runs with this input, e.g. --param Lots=0.1')
+    compare_parser = store_subparsers.add_parser('compare', help='Write an html report comparing runs')
+    compare_parser.add_argument('run_ids', nargs='+', type=int)
+    compare_parser.add_argument('-o', '--output', default='run_comparison.html')
+    remove_parser = store_subparsers.add_parser('remove', help='Remove runs from the store')
+    remove_parser.add_argument('run_ids', nargs='+', type=int)
+    store_subparsers.add_parser('info', help='Count the runs in the store')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+# Puts the repository root on sys.path, so tests import cleaners, reports and pipeline like the apps do
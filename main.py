@@ -1,28 +1,50 @@
+import queue
+import threading
 import tkinter as tk
 from tkinter import ttk
 from tkinter import Label
 from tkinter import filedialog
 import tkinter.font as font
-from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
-from reports.report_plotter import Report_Plotter
 
 ## Converts MT4 HTML report to Excel with better data analysis then converts the xls to a Custom HTML Report 
-# TODO - Allow conversion of mt4 report to xls only
-# TODO - Allow conversion of xls to custom report only
+# data only and report only conversions are available from cli.py batch --mode
+
+# Where each stage lands on a report's share of the progress bar, charts fill the gap up to 'writing report'
+STAGE_PROGRESS = {
+    'parsing': 0,
+    'pairing': 15,
+    'loading data': 25,
+    'building frames': 25,
+    'building charts': 30,
+    'writing report': 95,
+    'done': 100,
+}
+
+
+def preload_pipeline():
+    import pipeline.report_pipeline # noqa: F401
 
 
 class App(tk.Frame):
     def __init__(self, parent):
         tk.Frame.__init__(self, parent)
-        self.chosen_input_path = ''
+        self.chosen_input_paths = []
         self.chosen_output_path = ''
+        self.report_queue = []
+        self.progress_queue = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker_thread = None
+        self.polling = False
         self.init_build_app_options()
+        # pandas, plotly and friends load in the background once the window is up, so neither startup nor the first run waits on them
+        self.after(200, lambda: threading.Thread(target=preload_pipeline, daemon=True).start())
     
 
     def init_build_app_options(self):
         self.init_mt4_file_select()
         self.init_analysis_output_folder_select()
         self.init_run_button()
+        self.init_progress()
 
 
     #* Renders Browse Mt4 Report Selection
@@ -35,8 +57,11 @@ class App(tk.Frame):
         output_path_label.grid(row = 2, column = 1, pady=(40, 10))
 
         def getFilePath():
-            self.chosen_input_path = filedialog.askopenfilename()
-            output_path_text.config(text = 'MT4 Report Location: '+ self.chosen_input_path)
+            self.chosen_input_paths = list(filedialog.askopenfilenames())
+            if len(self.chosen_input_paths) == 1:
+                output_path_text.config(text = 'MT4 Report Location: '+ self.chosen_input_paths[0])
+            else:
+                output_path_text.config(text = 'MT4 Report Location: '+ str(len(self.chosen_input_paths)) + ' reports selected')
 
         folder_btn = ttk.Button(root, text="Browse Files",command=getFilePath)
         folder_btn.grid(row = 3, column = 1, pady=(5, 5))
@@ -73,14 +98,113 @@ class App(tk.Frame):
         download_btn_font = font.Font(family='Helvetica', size=18, weight='bold')
         download_button['font'] = download_btn_font
         download_button.grid(row = 8, column = 1, pady=(30, 5))
+        cancel_button = ttk.Button(root, text="Cancel", command=self.cancel_analyzer)
+        cancel_button.grid(row = 9, column = 1, pady=(5, 5))
+
+
+    #* Renders Progress Bar and Status
+    def init_progress(self):
+        self.progress_bar = ttk.Progressbar(root, orient='horizontal', length=500, mode='determinate')
+        self.progress_bar.grid(row = 10, column = 1, pady=(20, 5))
+        self.status_text = Label(root, text='')
+        self.status_text.grid(row = 11, column = 1, pady=(5, 5))
 
     
+    #* Queues the selected reports, they run one after another on a worker thread so the window stays responsive
     def run_analyzer(self):
-        system_paths = { 'input_file': self.chosen_input_path, 'output_path': self.chosen_output_path }
-        xls_location = Mt4_Report_Cleaner(**system_paths).run_cleaner()
-        system_paths['xls_location'] = xls_location
-        del system_paths['input_file']
-        Report_Plotter(**system_paths).generate_report()
+        self.report_queue.extend(self.chosen_input_paths)
+        if self.cancel_event.is_set():
+            # A cancelled worker still winding down keeps its own event, the reports queued now get a fresh one
+            self.cancel_event = threading.Event()
+        if self.worker_thread is not None and self.worker_thread.is_alive():
+            self.status_text.config(text=str(len(self.report_queue)) + ' reports waiting')
+            return
+        self.start_worker()
+
+
+    def start_worker(self):
+        self.worker_thread = threading.Thread(target=self.process_report_queue, args=(self.cancel_event,), daemon=True)
+        self.worker_thread.start()
+        self.schedule_poll()
+
+
+    #* Only one poll loop is ever scheduled, a worker started while it runs is picked up by the same loop
+    def schedule_poll(self):
+        if not self.polling:
+            self.polling = True
+            self.after(100, self.poll_progress_queue)
+
+
+    def cancel_analyzer(self):
+        self.report_queue.clear()
+        self.cancel_event.set()
+
+
+    #* Runs on the worker thread, it only talks to the GUI through progress_queue
+    def process_report_queue(self, cancel_event):
+        from pipeline.report_pipeline import Report_Pipeline, Pipeline_Cancelled
+        from pipeline.report_cache import Report_Cache
+        report_cache = Report_Cache()
+        while self.report_queue and not cancel_event.is_set():
+            input_file = self.report_queue.pop(0)
+
+            def progress_callback(stage, current=None, total=None):
+                self.progress_queue.put(('progress', input_file, stage, current, total))
+
+            try:
+                Report_Pipeline(
+                    input_file,
+                    self.chosen_output_path,
+                    report_cache=report_cache,
+                    progress_callback=progress_callback,
+                    cancel_event=cancel_event,
+                ).run()
+                self.progress_queue.put(('done', input_file, None, None, None))
+            except Pipeline_Cancelled:
+                self.progress_queue.put(('cancelled', input_file, None, None, None))
+            except Exception as error:
+                self.progress_queue.put(('failed', input_file, repr(error), None, None))
+        self.progress_queue.put(('finished', None, None, None, None))
+
+
+    def poll_progress_queue(self):
+        self.polling = False
+        # Checked before draining, a worker seen as exited has already queued everything it had to say
+        worker_alive = self.worker_thread.is_alive()
+        while True:
+            try:
+                event, input_file, stage, current, total = self.progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if event == 'finished':
+                # Run may have started another worker since this one exited, so what happens next is settled once the queue is drained
+                continue
+            report_name = input_file[input_file.rfind('/')+1:]
+            if event == 'progress':
+                self.progress_bar['value'] = self.get_stage_progress(stage, current, total)
+                status = report_name + ': ' + stage
+                if total:
+                    status += ' (' + str(current) + '/' + str(total) + ')'
+                waiting_count = len(self.report_queue)
+                if waiting_count:
+                    status += ' - ' + str(waiting_count) + ' reports waiting'
+                self.status_text.config(text=status)
+            elif event == 'failed':
+                self.status_text.config(text=report_name + ' failed: ' + stage)
+            else:
+                self.status_text.config(text=report_name + ' ' + event)
+        if worker_alive:
+            self.schedule_poll()
+        elif self.report_queue:
+            # Reports queued while the worker was wrapping up still need a run, they are already in report_queue
+            self.start_worker()
+
+
+    def get_stage_progress(self, stage, current, total):
+        if stage.startswith('chart ') and total:
+            chart_range = STAGE_PROGRESS['writing report'] - STAGE_PROGRESS['building charts']
+            return STAGE_PROGRESS['building charts'] + chart_range * current / total
+        return STAGE_PROGRESS.get(stage, self.progress_bar['value'])
 
 
 
@@ -0,0 +1,169 @@
+import csv
+import glob
+import os
+import time
+import traceback
+from pipeline.report_pipeline import Report_Pipeline
+from pipeline.report_cache import Report_Cache
+from pipeline.run_store import Run_Store
+from pipeline.process_pool import Worker_Crashed_Error, map_surviving_crashes
+from pipeline.instrumentation import NULL_RECORDER, Stage_Recorder
+from reports.report_plotter import Report_Plotter
+from reports.report_templates import DEFAULT_TEMPLATE_FILE
+from analytics.monte_carlo import DEFAULT_SIMULATION_SECONDS, DEFAULT_SIMULATIONS
+from analytics.rolling_metrics import DEFAULT_ROLLING_WINDOW
+
+
+BATCH_MODES = ['full', 'data', 'report']
+BATCH_SUMMARY_FILENAME = 'batch_summary.csv'
+
+
+#* Runs one report in a batch worker, failures are returned instead of raised so the batch carries on
+def process_report(input_file, output_path, mode, data_format='xlsx', cache_dir=None, trace_dir=None, trace_memory=False, template_file=DEFAULT_TEMPLATE_FILE, simulations=DEFAULT_SIMULATIONS, simulation_seconds=DEFAULT_SIMULATION_SECONDS, rolling_window=DEFAULT_ROLLING_WINDOW, rolling_window_unit='trades', store_file=None, image_format='jpeg', image_quality=None, asset_mode='inline'):
+    start_time = time.perf_counter()
+    result = { 'input_file': input_file, 'status': 'ok', 'seconds': 0, 'outputs': '', 'error': '' }
+    recorder = Stage_Recorder(trace_memory=trace_memory) if trace_dir else NULL_RECORDER
+    run_store = None
+    try:
+        report_cache = Report_Cache(cache_dir) if cache_dir else None
+        if mode == 'report':
+            report_name = os.path.splitext(os.path.basename(input_file))[0] + '.html'
+            report_location = os.path.join(output_path, report_name)
+            # Batch workers already run in parallel, so each one exports its charts in process
+            Report_Plotter(
+                output_path,
+                xls_location=input_file,
+                report_location=report_location,
+                render_workers=0,
+                report_cache=report_cache,
+                recorder=recorder,
+                template_file=template_file,
+                simulations=simulations,
+                simulation_seconds=simulation_seconds,
+                rolling_window=rolling_window,
+                rolling_window_unit=rolling_window_unit,
+                image_format=image_format,
+                image_quality=image_quality,
+                asset_mode=asset_mode,
+            ).generate_report()
+            outputs = { 'report': report_location }
+        else:
+            # xlsx files are already cleaned, only MT4 reports go into the run store
+            run_store = Run_Store(store_file) if store_file else None
+            outputs = Report_Pipeline(
+                input_file,
+                output_path,
+                write_report=(mode == 'full'),
+                data_format=data_format,
+                render_workers=0,
+                report_cache=report_cache,
+                recorder=recorder,
+                template_file=template_file,
+                simulations=simulations,
+                simulation_seconds=simulation_seconds,
+                rolling_window=rolling_window,
+                rolling_window_unit=rolling_window_unit,
+                image_format=image_format,
+                image_quality=image_quality,
+                asset_mode=asset_mode,
+                run_store=run_store,
+            ).run()
+        result['outputs'] = ' '.join(outputs.values())
+    except Exception as error:
+        result['status'] = 'failed'
+        result['error'] = repr(error)
+        result['traceback'] = traceback.format_exc()
+    finally:
+        if run_store is not None:
+            run_store.close()
+    result['seconds'] = round(time.perf_counter() - start_time, 3)
+    if trace_dir:
+        write_traces(recorder, input_file, trace_dir)
+    return result
+
+
+def write_traces(recorder, input_file, trace_dir):
+    os.makedirs(trace_dir, exist_ok=True)
+    trace_name = os.path.join(trace_dir, os.path.splitext(os.path.basename(input_file))[0])
+    recorder.write_json_lines(trace_name + '.stages.jsonl')
+    recorder.write_chrome_trace(trace_name + '.trace.json')
+
+
+#* Expands directories and glob patterns into the report files a mode works on
+def find_input_files(inputs, mode):
+    extension = '.xlsx' if mode == 'report' else '.htm'
+    input_files = []
+    for input_path in inputs:
+        if os.path.isdir(input_path):
+            matches = glob.glob(os.path.join(input_path, '*' + extension))
+        else:
+            matches = glob.glob(input_path)
+        input_files.extend(path for path in sorted(matches) if path.endswith(extension))
+    return list(dict.fromkeys(input_files))
+
+
+class Batch_Runner():
+    def __init__(self, inputs, output_path, mode='full', data_format='xlsx', workers=None, cache_dir=None, trace_dir=None, trace_memory=False, template_file=DEFAULT_TEMPLATE_FILE, simulations=DEFAULT_SIMULATIONS, simulation_seconds=DEFAULT_SIMULATION_SECONDS, rolling_window=DEFAULT_ROLLING_WINDOW, rolling_window_unit='trades', store_file=None, image_format='jpeg', image_quality=None, asset_mode='inline'):
+        self.input_files = find_input_files(inputs, mode)
+        self.output_path = output_path
+        self.mode = mode
+        self.data_format = data_format
+        self.cache_dir = cache_dir
+        self.trace_dir = trace_dir
+        self.trace_memory = trace_memory
+        self.template_file = template_file
+        self.simulations = simulations
+        self.simulation_seconds = simulation_seconds
+        self.rolling_window = rolling_window
+        self.rolling_window_unit = rolling_window_unit
+        self.store_file = store_file
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.asset_mode = asset_mode
+        self.workers = workers or os.cpu_count() or 1
+        self.results = []
+        self.elapsed_seconds = 0
+
+
+    def run(self, on_result=None):
+        os.makedirs(self.output_path, exist_ok=True)
+        start_time = time.perf_counter()
+        report_args = (self.output_path, self.mode, self.data_format, self.cache_dir, self.trace_dir, self.trace_memory, self.template_file, self.simulations, self.simulation_seconds, self.rolling_window, self.rolling_window_unit, self.store_file, self.image_format, self.image_quality, self.asset_mode)
+        try:
+            map_surviving_crashes(process_report, self.input_files, report_args, self.workers, lambda input_file, future: self.add_result(input_file, future, on_result))
+        finally:
+            self.elapsed_seconds = time.perf_counter() - start_time
+            self.write_summary()
+        return self.results
+
+
+    #* process_report returns its own failures, only a report that kills its worker needs a result made up here
+    def add_result(self, input_file, future, on_result):
+        try:
+            result = future.result()
+        except Worker_Crashed_Error as error:
+            result = { 'input_file': input_file, 'status': 'failed', 'seconds': 0, 'outputs': '', 'error': str(error) }
+        self.results.append(result)
+        if on_result:
+            on_result(result)
+
+
+    def get_failures(self):
+        return [result for result in self.results if result['status'] != 'ok']
+
+
+    def get_reports_per_minute(self):
+        if not self.elapsed_seconds:
+            return 0
+        return len(self.results) / self.elapsed_seconds * 60
+
+
+    #* Writes one row per report so failed files can be found and re-run
+    def write_summary(self):
+        summary_location = os.path.join(self.output_path, BATCH_SUMMARY_FILENAME)
+        fieldnames = ['input_file', 'status', 'seconds', 'outputs', 'error']
+        with open(summary_location, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(sorted(self.results, key=lambda result: result['input_file']))
+        return summary_location
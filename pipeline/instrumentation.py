@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError: # Windows has no resource module, stages just go without max_rss_mb there
+    resource = None
+
+
+# ru_maxrss is reported in bytes on macOS and kilobytes everywhere else
+MAX_RSS_DIVISOR = 1024 * 1024 if sys.platform == 'darwin' else 1024
+
+
+#* One timed stage, used as a context manager and given a row count by the code it wraps
+class Recorded_Stage():
+    __slots__ = ('recorder', 'name', 'rows', 'start_time', 'start_cpu', 'parent', 'child_peak')
+
+    def __init__(self, recorder, name):
+        self.recorder = recorder
+        self.name = name
+        self.rows = None
+        self.parent = None
+        self.child_peak = 0
+
+
+    def __enter__(self):
+        self.recorder.enter_stage(self)
+        self.start_cpu = time.thread_time()
+        self.start_time = time.perf_counter()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        wall_seconds = time.perf_counter() - self.start_time
+        cpu_seconds = time.thread_time() - self.start_cpu
+        self.recorder.exit_stage(self, wall_seconds, cpu_seconds, exc_type)
+        return False
+
+
+#* Records wall time, cpu time, memory and row counts of pipeline stages, then exports them
+class Stage_Recorder():
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.records = []
+        self.origin = time.perf_counter()
+        self.origin_epoch = time.time()
+        self.lock = threading.Lock()
+        self.thread_stages = threading.local()
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+    def stage(self, name):
+        return Recorded_Stage(self, name)
+
+
+    def get_elapsed_seconds(self):
+        return time.perf_counter() - self.origin
+
+
+    def enter_stage(self, stage):
+        stage.parent = getattr(self.thread_stages, 'current', None)
+        self.thread_stages.current = stage
+        if self.trace_memory:
+            # Peaks are tracked per stage by resetting, so a finished stage hands its peak up to its parent
+            if stage.parent is not None:
+                stage.parent.child_peak = max(stage.parent.child_peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+
+
+    def exit_stage(self, stage, wall_seconds, cpu_seconds, exc_type):
+        self.thread_stages.current = stage.parent
+        record = {
+            'name': stage.name,
+            'start_seconds': round(stage.start_time - self.origin, 6),
+            'wall_seconds': round(wall_seconds, 6),
+            'cpu_seconds': round(cpu_seconds, 6),
+            'rows': stage.rows,
+            'thread': threading.current_thread().name,
+            'depth': self.get_depth(stage),
+        }
+        if resource is not None:
+            record['max_rss_mb'] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / MAX_RSS_DIVISOR, 2)
+        if exc_type is not None:
+            record['error'] = exc_type.__name__
+        if self.trace_memory:
+            peak = max(tracemalloc.get_traced_memory()[1], stage.child_peak)
+            record['peak_mb'] = round(peak / 1024 / 1024, 2)
+            if stage.parent is not None:
+                stage.parent.child_peak = max(stage.parent.child_peak, peak)
+        with self.lock:
+            self.records.append(record)
+
+
+    def get_depth(self, stage):
+        depth = 0
+        while stage.parent is not None:
+            stage = stage.parent
+            depth += 1
+        return depth
+
+
+    #* For stages timed somewhere else, e.g. chart exports measured inside render workers
+    def add_record(self, name, wall_seconds, start_seconds=None, **fields):
+        if start_seconds is None:
+            start_seconds = time.perf_counter() - self.origin - wall_seconds
+        current_stage = getattr(self.thread_stages, 'current', None)
+        record = {
+            'name': name,
+            'start_seconds': round(start_seconds, 6),
+            'wall_seconds': round(wall_seconds, 6),
+            'thread': threading.current_thread().name,
+            'depth': self.get_depth(current_stage) + 1 if current_stage is not None else 0,
+        }
+        record.update(fields)
+        with self.lock:
+            self.records.append(record)
+
+
+    def write_json_lines(self, output_file):
+        with open(output_file, 'w') as f:
+            for record in sorted(self.records, key=lambda record: record['start_seconds']):
+                f.write(json.dumps(record) + '\n')
+        return output_file
+
+
+    #* Complete ("X") events in the Chrome trace format, which chrome://tracing and Perfetto both open
+    def write_chrome_trace(self, output_file):
+        thread_ids = {}
+        trace_events = []
+        for record in self.records:
+            thread_id = thread_ids.setdefault(record['thread'], len(thread_ids) + 1)
+            trace_events.append({
+                'name': record['name'],
+                'ph': 'X',
+                'ts': round((self.origin_epoch + record['start_seconds']) * 1000000),
+                'dur': round(record['wall_seconds'] * 1000000),
+                'pid': os.getpid(),
+                'tid': thread_id,
+                'args': { key: value for key, value in record.items() if key not in ('name', 'start_seconds', 'wall_seconds', 'thread') },
+            })
+        for thread_name, thread_id in thread_ids.items():
+            trace_events.append({ 'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': thread_id, 'args': { 'name': thread_name } })
+        with open(output_file, 'w') as f:
+            json.dump({ 'traceEvents': trace_events, 'displayTimeUnit': 'ms' }, f)
+        return output_file
+
+
+class Null_Stage():
+    __slots__ = ('rows',)
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+#* Stand-in used when instrumentation is off, every stage is the same do-nothing object
+class Null_Recorder():
+    null_stage = Null_Stage()
+
+    def stage(self, name):
+        return self.null_stage
+
+
+    def add_record(self, name, wall_seconds, start_seconds=None, **fields):
+        pass
+
+
+    def get_elapsed_seconds(self):
+        return 0
+
+
+NULL_RECORDER = Null_Recorder()
@@ -0,0 +1,62 @@
+from collections import deque
+from concurrent.futures import ALL_COMPLETED, FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+
+# Tasks handed to the pool ahead of the workers, so a dead worker only leaves this many files to rerun
+QUEUED_TASKS_PER_WORKER = 2
+
+
+class Worker_Crashed_Error(Exception):
+    pass
+
+
+#* Runs function(item, *args) for every item across a pool, on_done(item, future) gets each finished future in completion order
+# A worker that dies breaks the pool and every task in flight with it. Those tasks are rerun one at a time on a
+# fresh pool, so only the item that kills a worker again ends with a Worker_Crashed_Error and the rest still finish
+def map_surviving_crashes(function, items, args, workers, on_done):
+    suspect_items = run_until_broken(function, items, args, workers, on_done)
+    for item in suspect_items:
+        if run_until_broken(function, [item], args, 1, on_done):
+            crashed_future = Future()
+            crashed_future.set_exception(Worker_Crashed_Error('A worker process died on ' + str(item) + ' (out of memory or a crash in native code)'))
+            on_done(item, crashed_future)
+
+
+#* Returns the items that were in flight when a worker died, everything else has been handed to on_done
+def run_until_broken(function, items, args, workers, on_done):
+    pending_items = deque(items)
+    suspect_items = []
+    while pending_items:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = {}
+            broken = False
+            while (pending_items or in_flight) and not broken:
+                while pending_items and len(in_flight) < workers * QUEUED_TASKS_PER_WORKER:
+                    item = pending_items.popleft()
+                    try:
+                        in_flight[executor.submit(function, item, *args)] = item
+                    except BrokenProcessPool:
+                        # The pool broke since the last wait, the item goes to the fresh pool the next pass starts
+                        pending_items.appendleft(item)
+                        broken = True
+                        break
+                # Once the pool is broken every task still in flight fails with it, bar those that finished just before
+                done_futures, _ = wait(in_flight, return_when=ALL_COMPLETED if broken else FIRST_COMPLETED)
+                broken = hand_over(done_futures, in_flight, suspect_items, on_done) or broken
+                if broken:
+                    hand_over(wait(in_flight).done, in_flight, suspect_items, on_done)
+    return suspect_items
+
+
+#* Finished futures go to on_done and the ones a dead worker took down to suspect_items, returns whether there were any of those
+def hand_over(done_futures, in_flight, suspect_items, on_done):
+    broken = False
+    for future in done_futures:
+        item = in_flight.pop(future)
+        if isinstance(future.exception(), BrokenProcessPool):
+            suspect_items.append(item)
+            broken = True
+        else:
+            on_done(item, future)
+    return broken
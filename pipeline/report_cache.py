@@ -0,0 +1,169 @@
+import hashlib
+import json
+import os
+import shutil
+from importlib.util import find_spec
+
+
+# Bump whenever cleaning or chart output changes so stale entries stop matching
+PIPELINE_VERSION = '2'
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'mt4-backtest-analyzer')
+DEFAULT_MAX_CACHE_BYTES = 1024 * 1024 * 1024
+
+# Only looked up, importing pyarrow (and pandas) is left to the first cached frame so the cli starts fast
+FRAME_FORMAT = 'parquet' if find_spec('pyarrow') is not None else 'pickle'
+
+
+def get_file_hash(input_file, salt=''):
+    file_hash = hashlib.sha256(salt.encode())
+    with open(input_file, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            file_hash.update(chunk)
+    return file_hash.hexdigest()
+
+
+#* Content addressed store of cleaned frames and rendered charts with size based LRU eviction
+class Report_Cache():
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.frames_dir = os.path.join(cache_dir, 'frames')
+        self.charts_dir = os.path.join(cache_dir, 'charts')
+        os.makedirs(self.frames_dir, exist_ok=True)
+        os.makedirs(self.charts_dir, exist_ok=True)
+
+
+    #* Keyed on the report's bytes, so renamed or copied reports still hit
+    def get_report_key(self, input_file):
+        return get_file_hash(input_file, PIPELINE_VERSION)
+
+
+    #* Keyed on the report's content and the options it is drawn with, so a hit needs neither the figure nor the frames behind it
+    def get_chart_key(self, report_key, chart_name, render_options):
+        chart_spec = PIPELINE_VERSION + report_key + chart_name + repr(sorted(render_options.items()))
+        return hashlib.sha256(chart_spec.encode()).hexdigest()
+
+
+    def get_frames(self, report_key):
+        entry_dir = os.path.join(self.frames_dir, report_key)
+        if not os.path.isdir(entry_dir):
+            return None
+        os.utime(entry_dir)
+        return self.read_frame(entry_dir, 'summary'), self.read_frame(entry_dir, 'trades')
+
+
+    def put_frames(self, report_key, summary_df, trades_df):
+        entry_dir = os.path.join(self.frames_dir, report_key)
+        temp_dir = entry_dir + '.' + str(os.getpid()) + '.tmp'
+        os.makedirs(temp_dir, exist_ok=True)
+        self.write_frame(temp_dir, 'summary', summary_df)
+        self.write_frame(temp_dir, 'trades', trades_df)
+        try:
+            os.rename(temp_dir, entry_dir)
+        except OSError: # Another process cached the same report first
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        self.evict()
+
+
+    def read_frame(self, entry_dir, name):
+        import pandas as pd
+        if FRAME_FORMAT == 'parquet':
+            return pd.read_parquet(os.path.join(entry_dir, name + '.parquet'))
+        return pd.read_pickle(os.path.join(entry_dir, name + '.pkl'))
+
+
+    def write_frame(self, entry_dir, name, df):
+        if FRAME_FORMAT == 'parquet':
+            df.to_parquet(os.path.join(entry_dir, name + '.parquet'), index=False)
+        else:
+            df.to_pickle(os.path.join(entry_dir, name + '.pkl'))
+
+
+    #* Charts and stats live in one folder per report, so invalidating a report drops them with its frames
+    def get_chart_location(self, report_key, chart_key, extension):
+        return os.path.join(self.charts_dir, report_key, chart_key + extension)
+
+
+    def get_chart(self, report_key, chart_key):
+        return self.read_entry(self.get_chart_location(report_key, chart_key, '.img'))
+
+
+    def put_chart(self, report_key, chart_key, chart_image):
+        self.write_entry(self.get_chart_location(report_key, chart_key, '.img'), chart_image)
+
+
+    #* Report stats computed from the frames, kept next to the charts so a cached report needs no frames at all
+    def get_text(self, report_key, text_key):
+        text = self.read_entry(self.get_chart_location(report_key, text_key, '.json'))
+        return None if text is None else json.loads(text)
+
+
+    def put_text(self, report_key, text_key, text):
+        self.write_entry(self.get_chart_location(report_key, text_key, '.json'), json.dumps(text).encode())
+
+
+    #* A hit marks the report's folder as used, eviction works on whole folders like it does for frames
+    def read_entry(self, location):
+        if not os.path.isfile(location):
+            return None
+        os.utime(os.path.dirname(location))
+        with open(location, 'rb') as f:
+            return f.read()
+
+
+    def write_entry(self, location, data):
+        os.makedirs(os.path.dirname(location), exist_ok=True)
+        temp_location = location + '.' + str(os.getpid()) + '.tmp'
+        with open(temp_location, 'wb') as f:
+            f.write(data)
+        os.replace(temp_location, location)
+
+
+    #* Drops a report's cached frames, charts and stats, e.g. after fixing a cleaner bug without bumping PIPELINE_VERSION
+    def invalidate(self, input_file):
+        report_key = self.get_report_key(input_file)
+        invalidated = False
+        for entry_dir in (os.path.join(self.frames_dir, report_key), os.path.join(self.charts_dir, report_key)):
+            if os.path.isdir(entry_dir):
+                shutil.rmtree(entry_dir, ignore_errors=True)
+                invalidated = True
+        return invalidated
+
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+        os.makedirs(self.frames_dir, exist_ok=True)
+        os.makedirs(self.charts_dir, exist_ok=True)
+
+
+    def get_entries(self):
+        entries = []
+        for entries_dir in (self.frames_dir, self.charts_dir):
+            for entry in os.scandir(entries_dir):
+                if entry.is_dir() and not entry.name.endswith('.tmp'):
+                    size = sum(file.stat().st_size for file in os.scandir(entry.path))
+                    entries.append((entry.stat().st_mtime, size, entry.path))
+        for entry in os.scandir(self.charts_dir):
+            # Charts cached loose by older versions never match again, counting them lets eviction clear them out
+            if entry.is_file() and entry.name.endswith(('.img', '.json', '.b64')):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+
+    def get_size(self):
+        return sum(size for _, size, _ in self.get_entries())
+
+
+    #* Removes the least recently used entries until the cache fits in max_bytes
+    def evict(self):
+        entries = sorted(self.get_entries())
+        cache_size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if cache_size <= self.max_bytes:
+                break
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+            cache_size -= size
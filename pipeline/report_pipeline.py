@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor
+from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
+from cleaners.report_summary import Report_Summary
+from reports.report_plotter import Report_Plotter
+from reports.report_templates import DEFAULT_TEMPLATE_FILE
+from reports.chart_renderer import DEFAULT_RENDER_WORKERS
+from analytics.monte_carlo import DEFAULT_SIMULATION_SECONDS, DEFAULT_SIMULATIONS
+from analytics.rolling_metrics import DEFAULT_ROLLING_WINDOW
+from pipeline.instrumentation import NULL_RECORDER
+
+
+class Pipeline_Cancelled(Exception):
+    pass
+
+
+#* Runs the cleaner and hands its frames to the plotter in memory, the data export runs alongside the report
+class Report_Pipeline():
+    def __init__(self, input_file, output_path, write_data=True, write_report=True, data_format='xlsx', render_workers=DEFAULT_RENDER_WORKERS, report_cache=None, progress_callback=None, cancel_event=None, recorder=NULL_RECORDER, template_file=DEFAULT_TEMPLATE_FILE, simulations=DEFAULT_SIMULATIONS, simulation_seconds=DEFAULT_SIMULATION_SECONDS, rolling_window=DEFAULT_ROLLING_WINDOW, rolling_window_unit='trades', run_store=None, image_format='jpeg', image_quality=None, asset_mode='inline'):
+        self.input_file = input_file
+        self.output_path = output_path
+        self.write_data = write_data
+        self.data_format = data_format
+        self.write_report = write_report
+        self.render_workers = render_workers
+        self.report_cache = report_cache
+        self.progress_callback = progress_callback
+        self.cancel_event = cancel_event
+        self.recorder = recorder
+        self.template_file = template_file
+        self.simulations = simulations
+        self.simulation_seconds = simulation_seconds
+        self.rolling_window = rolling_window
+        self.rolling_window_unit = rolling_window_unit
+        self.run_store = run_store
+        self.run_id = None
+        self.report_key = None
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.asset_mode = asset_mode
+        self.outputs = {}
+
+
+    def run(self):
+        with self.recorder.stage('pipeline'):
+            return self.run_stages()
+
+
+    def run_stages(self):
+        cleaner = Mt4_Report_Cleaner(self.input_file, self.output_path, progress_callback=self.report_progress, recorder=self.recorder)
+        with self.recorder.stage('clean_report'):
+            summary_df, trades_df = self.clean_report(cleaner)
+        if self.run_store is not None:
+            with self.recorder.stage('store_run'):
+                self.run_id = self.run_store.add_run(self.input_file, summary_df, trades_df, summary=cleaner.summary)
+        report_location = cleaner.output_filename[:-5] + '.html'
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            data_future = executor.submit(cleaner.write_data, self.data_format) if self.write_data else None
+            if self.write_report:
+                Report_Plotter(
+                    self.output_path,
+                    summary_df=summary_df,
+                    trades_df=trades_df,
+                    summary=cleaner.summary,
+                    report_location=report_location,
+                    render_workers=self.render_workers,
+                    report_cache=self.report_cache,
+                    report_key=self.report_key,
+                    progress_callback=self.report_progress,
+                    recorder=self.recorder,
+                    template_file=self.template_file,
+                    simulations=self.simulations,
+                    simulation_seconds=self.simulation_seconds,
+                    rolling_window=self.rolling_window,
+                    rolling_window_unit=self.rolling_window_unit,
+                    image_format=self.image_format,
+                    image_quality=self.image_quality,
+                    asset_mode=self.asset_mode,
+                ).generate_report()
+                self.outputs['report'] = report_location
+            if data_future is not None:
+                self.outputs[self.data_format] = ' '.join(data_future.result())
+        self.report_progress('done')
+        return self.outputs
+
+
+    #* Every stage checks in here, so a cancel request stops the run before the next stage starts
+    def report_progress(self, stage, current=None, total=None):
+        if self.cancel_event is not None and self.cancel_event.is_set():
+            raise Pipeline_Cancelled(self.input_file)
+        if self.progress_callback:
+            self.progress_callback(stage, current, total)
+
+
+    #* Reuses the cleaned frames of a report whose content was already processed
+    def clean_report(self, cleaner):
+        if self.report_cache is None:
+            return cleaner.clean_report()
+        self.report_key = self.report_cache.get_report_key(self.input_file)
+        cached_frames = self.report_cache.get_frames(self.report_key)
+        if cached_frames is None:
+            cleaner.clean_report()
+            self.report_cache.put_frames(self.report_key, cleaner.summary_df, cleaner.trades_df)
+        else:
+            cleaner.build_output_filename()
+            cleaner.summary_df, cleaner.trades_df = cached_frames
+            cleaner.summary = Report_Summary.from_summary_df(cleaner.summary_df)
+        return cleaner.summary_df, cleaner.trades_df
@@ -0,0 +1,329 @@
+import json
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as Future_Timeout_Error
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from cleaners.mt4_report_parser import Mt4_Report_Parse_Error
+from cleaners.report_summary import Summary_Validation_Error
+from pipeline.report_cache import Report_Cache
+from reports.report_templates import DEFAULT_TEMPLATE_FILE, get_compiled_template
+
+
+DEFAULT_SERVICE_PORT = 8765
+DEFAULT_SERVICE_WORKERS = min(4, os.cpu_count() or 1)
+# Requests waiting for a worker on top of the ones being rendered, past that the service answers 503
+DEFAULT_MAX_QUEUED = 8
+DEFAULT_REQUEST_TIMEOUT = 120
+DEFAULT_MAX_UPLOAD_BYTES = 100 * 1024 * 1024
+LATENCY_WINDOW = 1000
+PERCENTILES = [50, 90, 95, 99]
+# A 50 trade generated report shipped next to the service, so warming a worker doesn't need the benchmarks
+WARM_UP_REPORT_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'warm_up_report.htm')
+
+
+class Service_Busy(Exception):
+    pass
+
+
+#* Runs a tiny report end to end, so imports, the compiled template, plotly and the image exporter are all warm
+def warm_service_worker(template_file):
+    from pipeline.report_pipeline import Report_Pipeline
+    get_compiled_template(template_file)
+    warm_up_dir = tempfile.mkdtemp(prefix='mt4-service-warm-up-')
+    try:
+        Report_Pipeline(WARM_UP_REPORT_FILE, warm_up_dir, write_data=False, render_workers=0, template_file=template_file).run()
+    finally:
+        shutil.rmtree(warm_up_dir, ignore_errors=True)
+
+
+#* Worker side of a request, charts are exported in process because the service pool already runs in parallel
+def render_report(input_file, template_file, cache_dir=None):
+    from pipeline.report_pipeline import Report_Pipeline
+    report_cache = Report_Cache(cache_dir) if cache_dir else None
+    try:
+        outputs = Report_Pipeline(
+            input_file,
+            os.path.dirname(input_file),
+            write_data=False,
+            render_workers=0,
+            report_cache=report_cache,
+            template_file=template_file,
+        ).run()
+    except (Mt4_Report_Parse_Error, Summary_Validation_Error) as error:
+        # The message goes back to the client, which only knows the name it uploaded the report under
+        raise type(error)(str(error).replace(input_file, os.path.basename(input_file))) from None
+    with open(outputs['report']) as f:
+        return f.read()
+
+
+#* Nearest rank percentile, the window is small enough that sorting on every read is fine
+def get_percentile(sorted_values, percentile):
+    if not sorted_values:
+        return None
+    rank = max(int(round(percentile / 100 * len(sorted_values) + 0.5)) - 1, 0)
+    return round(sorted_values[min(rank, len(sorted_values) - 1)], 4)
+
+
+#* Request counts by status and the latency of the last LATENCY_WINDOW rendered reports
+class Service_Metrics():
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.start_time = time.time()
+        self.status_counts = {}
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.active_jobs = 0
+
+
+    def record(self, status, seconds):
+        with self.lock:
+            self.status_counts[str(status)] = self.status_counts.get(str(status), 0) + 1
+            if status == 200:
+                self.latencies.append(seconds)
+
+
+    def job_started(self):
+        with self.lock:
+            self.active_jobs += 1
+
+
+    def job_finished(self):
+        with self.lock:
+            self.active_jobs -= 1
+
+
+    def get_snapshot(self, workers, max_queued):
+        with self.lock:
+            latencies = sorted(self.latencies)
+            status_counts = dict(self.status_counts)
+            active_jobs = self.active_jobs
+        return {
+            'uptime_seconds': round(time.time() - self.start_time, 1),
+            'workers': workers,
+            'max_queued': max_queued,
+            'active_jobs': active_jobs,
+            'queued_jobs': max(active_jobs - workers, 0),
+            'requests': sum(status_counts.values()),
+            'responses_by_status': status_counts,
+            'latency_seconds': {
+                'window': len(latencies),
+                'mean': round(sum(latencies) / len(latencies), 4) if latencies else None,
+                'max': round(latencies[-1], 4) if latencies else None,
+                **{ 'p' + str(percentile): get_percentile(latencies, percentile) for percentile in PERCENTILES },
+            },
+        }
+
+
+#* Keeps a pool of warm report workers behind a bounded number of job slots
+class Report_Service():
+    def __init__(self, workers=DEFAULT_SERVICE_WORKERS, max_queued=DEFAULT_MAX_QUEUED, request_timeout=DEFAULT_REQUEST_TIMEOUT, template_file=DEFAULT_TEMPLATE_FILE, cache_dir=None, max_upload_bytes=DEFAULT_MAX_UPLOAD_BYTES):
+        self.workers = workers
+        self.max_queued = max_queued
+        self.request_timeout = request_timeout
+        self.template_file = template_file
+        self.cache_dir = cache_dir
+        self.max_upload_bytes = max_upload_bytes
+        self.job_slots = threading.BoundedSemaphore(workers + max_queued)
+        self.metrics = Service_Metrics()
+        self.executor = None
+        self.executor_lock = threading.Lock()
+        self.work_dir = None
+
+
+    def start(self):
+        if self.executor is not None:
+            return
+        if self.work_dir is None:
+            self.work_dir = tempfile.mkdtemp(prefix='mt4-service-')
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=warm_service_worker,
+            initargs=(self.template_file,),
+        )
+        # Workers are spawned on demand, so submit one task per worker to boot them all up front
+        warm_futures = [self.executor.submit(time.sleep, 0.1) for _ in range(self.workers)]
+        for future in warm_futures:
+            future.result()
+
+
+    #* A crashed worker breaks the whole pool, so it is replaced with a freshly warmed one
+    def restart(self, broken_executor):
+        with self.executor_lock:
+            # Every request on the broken pool fails at once, only the first one restarts it
+            if self.executor is not broken_executor:
+                return
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
+            self.start()
+
+
+    #* Frees the slot of a request that timed out, a job still queued is cancelled and a running one can only be stopped by killing the pool
+    def abandon(self, future, executor):
+        if future.cancel():
+            return
+        with self.executor_lock:
+            if self.executor is not executor or future.done():
+                return
+            # shutdown leaves a hung render running, so the workers are terminated and the pool reports itself broken
+            for process in list((executor._processes or {}).values()):
+                process.terminate()
+        self.restart(executor)
+
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+        if self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+
+    #* Raises Service_Busy when every slot is taken, a slot is freed once its worker is done or the request is abandoned
+    def submit_report(self, report_bytes, report_name):
+        if not self.job_slots.acquire(blocking=False):
+            raise Service_Busy()
+        job_dir = None
+        self.metrics.job_started()
+        try:
+            job_dir = tempfile.mkdtemp(dir=self.work_dir)
+            input_file = os.path.join(job_dir, report_name)
+            with open(input_file, 'wb') as f:
+                f.write(report_bytes)
+            # Waits out a restart in progress instead of submitting to the pool being replaced
+            with self.executor_lock:
+                executor = self.executor
+            try:
+                future = executor.submit(render_report, input_file, self.template_file, self.cache_dir)
+            except BrokenProcessPool:
+                # A worker died since the last request, nothing can be submitted until the pool is replaced
+                self.restart(executor)
+                raise
+        except BaseException:
+            self.finish_job(job_dir)
+            raise
+        future.add_done_callback(lambda future: self.finish_job(job_dir))
+        return future
+
+
+    def finish_job(self, job_dir):
+        if job_dir is not None:
+            shutil.rmtree(job_dir, ignore_errors=True)
+        self.metrics.job_finished()
+        self.job_slots.release()
+
+
+    def get_metrics(self):
+        return self.metrics.get_snapshot(self.workers, self.max_queued)
+
+
+#* Upload names only pick the output file name, anything but a bare .htm name falls back to report.htm
+def get_report_name(query):
+    report_name = os.path.basename(query.get('name', ['report.htm'])[0])
+    if not report_name.endswith('.htm') or report_name.startswith('.'):
+        return 'report.htm'
+    return report_name
+
+
+class Report_Request_Handler(BaseHTTPRequestHandler):
+    server_version = 'MT4ReportService/1.0'
+
+    def do_GET(self):
+        report_service = self.server.report_service
+        path = urlparse(self.path).path
+        if path == '/metrics':
+            self.send_json(200, report_service.get_metrics())
+        elif path == '/health':
+            self.send_json(200, { 'status': 'ok', 'workers': report_service.workers })
+        else:
+            self.send_json(404, { 'error': 'Unknown path ' + path })
+
+
+    #* POST /report?name=<file>.htm with the raw MT4 report as the body returns the html report
+    def do_POST(self):
+        report_service = self.server.report_service
+        url = urlparse(self.path)
+        if url.path != '/report':
+            self.send_json(404, { 'error': 'Unknown path ' + url.path })
+            return
+        start_time = time.perf_counter()
+        status, body, content_type, headers = self.handle_report(report_service, get_report_name(parse_qs(url.query)))
+        report_service.metrics.record(status, time.perf_counter() - start_time)
+        self.send_body(status, body, content_type, headers)
+
+
+    #* Returns (status, body, content type, extra headers) so every outcome is recorded in the metrics the same way
+    def handle_report(self, report_service, report_name):
+        content_length = int(self.headers.get('Content-Length') or 0)
+        if content_length <= 0:
+            return self.get_error(411, 'POST the MT4 report as the request body with a Content-Length')
+        if content_length > report_service.max_upload_bytes:
+            return self.get_error(413, 'Reports are limited to ' + str(report_service.max_upload_bytes) + ' bytes')
+        report_bytes = self.rfile.read(content_length)
+        executor = report_service.executor
+        try:
+            future = report_service.submit_report(report_bytes, report_name)
+        except Service_Busy:
+            return self.get_error(503, 'All workers are busy and the queue is full, retry shortly', { 'Retry-After': '1' })
+        except BrokenProcessPool:
+            return self.get_error(503, 'A report worker crashed, the pool was restarted, retry shortly', { 'Retry-After': '1' })
+        try:
+            report_html = future.result(timeout=report_service.request_timeout)
+        except Future_Timeout_Error:
+            report_service.abandon(future, executor)
+            return self.get_error(504, 'Report took longer than ' + str(report_service.request_timeout) + 's')
+        except (Mt4_Report_Parse_Error, Summary_Validation_Error) as error:
+            return self.get_error(422, 'Not a readable MT4 report: ' + str(error))
+        except BrokenProcessPool:
+            report_service.restart(executor)
+            return self.get_error(500, 'A report worker crashed, the pool was restarted')
+        except Exception as error:
+            return self.get_error(500, repr(error))
+        return 200, report_html.encode('utf-8'), 'text/html; charset=utf-8', {}
+
+
+    def get_error(self, status, message, headers=None):
+        return status, json.dumps({ 'error': message }).encode('utf-8'), 'application/json', headers or {}
+
+
+    def send_json(self, status, payload):
+        self.send_body(status, json.dumps(payload, indent=2).encode('utf-8'), 'application/json', {})
+
+
+    def send_body(self, status, body, content_type, headers):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class Report_Http_Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, report_service):
+        ThreadingHTTPServer.__init__(self, server_address, Report_Request_Handler)
+        self.report_service = report_service
+
+
+#* Warms the workers before accepting connections, so the first request is as fast as any other
+def serve(report_service, host='127.0.0.1', port=DEFAULT_SERVICE_PORT, on_ready=None):
+    report_service.start()
+    http_server = Report_Http_Server((host, port), report_service)
+    if on_ready:
+        on_ready(http_server)
+    try:
+        http_server.serve_forever()
+    finally:
+        http_server.server_close()
+        report_service.shutdown()
@@ -0,0 +1,352 @@
+import os
+import sqlite3
+import time
+from pipeline.report_cache import get_file_hash
+
+
+DEFAULT_STORE_FILE = os.path.join(os.path.expanduser('~'), '.local', 'share', 'mt4-backtest-analyzer', 'runs.sqlite')
+# Bump with every schema change, stores of another version are refused and have to be moved aside and ingested again
+STORE_SCHEMA_VERSION = 2
+# Batch workers write to the same store, each waits this long for the others' transactions
+STORE_TIMEOUT_SECONDS = 60
+
+# Per run stats recomputed from the ledger, only these columns can be sorted and filtered on
+RUN_METRICS = [
+    'total_trades',
+    'net_profit',
+    'gross_profit',
+    'gross_loss',
+    'profit_factor',
+    'expectancy',
+    'win_rate',
+    'final_balance',
+    'maximal_drawdown',
+    'maximal_drawdown_percent',
+    'relative_drawdown_percent',
+    'sharpe_ratio',
+    'sortino_ratio',
+]
+RUN_COLUMNS = ['run_id', 'system_name', 'symbol', 'period', 'parameters', 'model', 'duration', 'initial_deposit', 'source_file'] + RUN_METRICS
+# Ledger columns -> store columns, times are kept as unix seconds
+TRADE_COLUMNS = {
+    '#': 'row_number',
+    'Time': 'time',
+    'Duration (hrs)': 'duration_hours',
+    'Type': 'type',
+    'Order': 'order_number',
+    'Size': 'size',
+    'Price': 'price',
+    'S / L': 'stop_loss',
+    'T / P': 'take_profit',
+    'Profit': 'profit',
+    'Balance': 'balance',
+}
+TRADE_COLUMN_TYPES = { 'row_number': 'INTEGER', 'time': 'INTEGER', 'type': 'TEXT', 'order_number': 'INTEGER' }
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    report_key TEXT NOT NULL UNIQUE,
+    source_file TEXT,
+    ingested_at REAL,
+    system_name TEXT,
+    symbol TEXT,
+    period TEXT,
+    parameters TEXT,
+    model TEXT,
+    duration TEXT,
+    initial_deposit REAL,
+    ''' + ',\n    '.join(metric + (' INTEGER' if metric == 'total_trades' else ' REAL') for metric in RUN_METRICS) + '''
+);
+CREATE INDEX IF NOT EXISTS runs_by_test ON runs (system_name, symbol, period, parameters);
+CREATE INDEX IF NOT EXISTS runs_by_profit_factor ON runs (profit_factor);
+CREATE INDEX IF NOT EXISTS runs_by_net_profit ON runs (net_profit);
+CREATE INDEX IF NOT EXISTS runs_by_drawdown ON runs (maximal_drawdown_percent);
+CREATE TABLE IF NOT EXISTS parameters (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    value TEXT,
+    number REAL
+);
+CREATE INDEX IF NOT EXISTS parameters_by_value ON parameters (name, value);
+CREATE INDEX IF NOT EXISTS parameters_by_number ON parameters (name, number);
+CREATE INDEX IF NOT EXISTS parameters_by_run ON parameters (run_id);
+CREATE TABLE IF NOT EXISTS summary (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    key TEXT NOT NULL,
+    text TEXT,
+    number REAL,
+    detail REAL,
+    percent REAL
+);
+CREATE INDEX IF NOT EXISTS summary_by_run ON summary (run_id);
+CREATE TABLE IF NOT EXISTS trades (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    sequence INTEGER NOT NULL,
+    ''' + ',\n    '.join(column + ' ' + TRADE_COLUMN_TYPES.get(column, 'REAL') for column in TRADE_COLUMNS.values()) + '''
+);
+CREATE INDEX IF NOT EXISTS trades_by_run ON trades (run_id, sequence);
+'''
+
+
+#* "Lots=0.1; MaximumRisk=0.02; " -> [('Lots', '0.1'), ('MaximumRisk', '0.02')], sorted so the same inputs always match
+def parse_parameters(parameters_text):
+    parameters = []
+    for pair in parameters_text.split(';'):
+        name, _, value = pair.partition('=')
+        if name.strip():
+            parameters.append((name.strip(), value.strip()))
+    return sorted(parameters)
+
+
+def format_parameters(parameters):
+    return '; '.join(name + '=' + value for name, value in parameters)
+
+
+def get_parameter_number(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+#* "EURUSD (Euro vs US Dollar)" -> "EURUSD", "1 Hour (H1) 2019.01.02 00:00 - ..." -> "H1"
+def get_symbol_code(symbol_text):
+    return symbol_text.split(' ')[0]
+
+
+def get_period_code(period_text):
+    if '(' in period_text and ')' in period_text:
+        return period_text[period_text.find('(') + 1:period_text.find(')')]
+    return period_text.strip()
+
+
+def clean_report_frames(input_file):
+    from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
+    return Mt4_Report_Cleaner(input_file, os.path.dirname(input_file)).clean_report()
+
+
+#* Embedded store of every processed report's summary, stats and paired ledger, keyed on the report's content
+class Run_Store():
+    def __init__(self, store_file=DEFAULT_STORE_FILE):
+        self.store_file = store_file
+        if os.path.dirname(store_file):
+            os.makedirs(os.path.dirname(store_file), exist_ok=True)
+        self.connection = sqlite3.connect(store_file, timeout=STORE_TIMEOUT_SECONDS)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        # Readers never block the writer, and a batch of ingests doesn't fsync on every commit
+        self.connection.execute('PRAGMA journal_mode = WAL')
+        self.connection.execute('PRAGMA synchronous = NORMAL')
+        self.create_schema()
+
+
+    def create_schema(self):
+        schema_version = self.connection.execute('PRAGMA user_version').fetchone()[0]
+        if schema_version not in (0, STORE_SCHEMA_VERSION):
+            raise sqlite3.DatabaseError(
+                self.store_file + ' has schema version ' + str(schema_version) + ', expected ' + str(STORE_SCHEMA_VERSION) + ', move it aside to start a new store'
+            )
+        with self.connection:
+            self.connection.executescript(SCHEMA)
+            self.connection.execute('PRAGMA user_version = ' + str(STORE_SCHEMA_VERSION))
+
+
+    def close(self):
+        self.connection.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+    def __len__(self):
+        return self.connection.execute('SELECT COUNT(*) FROM runs').fetchone()[0]
+
+
+    def get_run_id(self, report_key):
+        row = self.connection.execute('SELECT run_id FROM runs WHERE report_key = ?', (report_key,)).fetchone()
+        return None if row is None else row['run_id']
+
+
+    #* Reports already in the store are only hashed, the rest are parsed across workers and written by this process alone
+    def ingest_reports(self, input_files, workers=None, on_ingested=None):
+        from pipeline.process_pool import map_surviving_crashes
+        run_ids = {}
+        new_reports = {}
+        for input_file in input_files:
+            report_key = get_file_hash(input_file)
+            run_ids[input_file] = self.get_run_id(report_key)
+            if run_ids[input_file] is None:
+                new_reports[input_file] = report_key
+            elif on_ingested:
+                on_ingested(input_file, run_ids[input_file], None)
+        if not new_reports:
+            return run_ids
+        def add_ingested_run(input_file, future):
+            try:
+                summary_df, trades_df = future.result()
+                run_ids[input_file] = self.add_run(input_file, summary_df, trades_df, report_key=new_reports[input_file])
+                error = None
+            except Exception as ingest_error: # One broken report, or one that kills its worker, doesn't stop the others
+                error = ingest_error
+            if on_ingested:
+                on_ingested(input_file, run_ids[input_file], error)
+        map_surviving_crashes(clean_report_frames, list(new_reports), (), workers or os.cpu_count() or 1, add_ingested_run)
+        return run_ids
+
+
+    #* Stores the frames the cleaner produced in one transaction, the ledger goes in with a single executemany
+    def add_run(self, input_file, summary_df, trades_df, summary=None, report_key=None):
+        from analytics.trade_analytics import Trade_Analytics
+        from cleaners.report_summary import Report_Summary
+        report_key = report_key or get_file_hash(input_file)
+        run_id = self.get_run_id(report_key)
+        if run_id is not None:
+            return run_id
+        summary = summary or Report_Summary.from_summary_df(summary_df)
+        initial_deposit = summary.get_number('Initial deposit') if 'Initial deposit' in summary else None
+        trade_analytics = Trade_Analytics(trades_df, initial_deposit)
+        metrics = trade_analytics.compute()
+        parameters = parse_parameters(summary.get_text('Parameters')) if 'Parameters' in summary else []
+        run = {
+            'report_key': report_key,
+            'source_file': os.path.abspath(input_file),
+            'ingested_at': time.time(),
+            'system_name': summary.get_text('System Name') if 'System Name' in summary else None,
+            'symbol': get_symbol_code(summary.get_text('Symbol')) if 'Symbol' in summary else None,
+            'period': get_period_code(summary.get_text('Period')) if 'Period' in summary else None,
+            'parameters': format_parameters(parameters),
+            'model': summary.get_text('Model') if 'Model' in summary else None,
+            'duration': summary.get_text('Duration') if 'Duration' in summary else None,
+            'initial_deposit': trade_analytics.initial_deposit,
+            **{ metric: float(metrics[metric]) if metric in metrics else None for metric in RUN_METRICS },
+        }
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (' + ', '.join(run) + ') VALUES (' + ', '.join('?' * len(run)) + ')',
+                list(run.values()),
+            )
+            run_id = cursor.lastrowid
+            self.connection.executemany(
+                'INSERT INTO parameters (run_id, name, value, number) VALUES (?, ?, ?, ?)',
+                [(run_id, name, value, get_parameter_number(value)) for name, value in parameters],
+            )
+            self.connection.executemany(
+                'INSERT INTO summary (run_id, key, text, number, detail, percent) VALUES (?, ?, ?, ?, ?, ?)',
+                [(run_id, field.key, field.text, field.number, field.detail, field.percent) for field in summary.fields.values()],
+            )
+            self.connection.executemany(
+                'INSERT INTO trades (run_id, sequence, ' + ', '.join(TRADE_COLUMNS.values()) + ') VALUES (?, ?' + ', ?' * len(TRADE_COLUMNS) + ')',
+                self.get_trade_rows(run_id, trades_df),
+            )
+        return run_id
+
+
+    #* Whole columns are converted to python values up front, NaN profits of open rows are stored as NULL by sqlite
+    def get_trade_rows(self, run_id, trades_df):
+        # Rows are stored in time order, ties in report order, so closes read back in the order they happened
+        if not (trades_df['Time'].is_monotonic_increasing and trades_df['#'].is_monotonic_increasing):
+            trades_df = trades_df.sort_values(['Time', '#'], kind='stable')
+        columns = [list(range(len(trades_df)))]
+        for column in TRADE_COLUMNS:
+            if column == 'Time':
+                columns.append(trades_df[column].to_numpy().astype('datetime64[s]').astype('int64').tolist())
+            elif column == 'Type':
+                columns.append(trades_df[column].astype(str).tolist())
+            else:
+                columns.append(trades_df[column].tolist())
+        return zip([run_id] * len(trades_df), *columns)
+
+
+    def remove_run(self, run_id):
+        with self.connection:
+            return self.connection.execute('DELETE FROM runs WHERE run_id = ?', (run_id,)).rowcount > 0
+
+
+    #* e.g. get_top_runs('profit_factor', 20, max_drawdown_percent=20, parameters={'Lots': '0.1'})
+    def get_top_runs(self, order_by='profit_factor', limit=20, ascending=False, max_drawdown_percent=None, min_trades=None, system_name=None, symbol=None, period=None, parameters=None):
+        if order_by not in RUN_METRICS:
+            raise ValueError('Unknown run metric "' + order_by + '", expected one of ' + ', '.join(RUN_METRICS))
+        conditions = []
+        values = []
+        for column, value in (('system_name', system_name), ('symbol', symbol), ('period', period)):
+            if value is not None:
+                conditions.append(column + ' = ?')
+                values.append(value)
+        if max_drawdown_percent is not None:
+            conditions.append('maximal_drawdown_percent <= ?')
+            values.append(max_drawdown_percent)
+        if min_trades is not None:
+            conditions.append('total_trades >= ?')
+            values.append(min_trades)
+        for name, value in (parameters or {}).items():
+            conditions.append('run_id IN (SELECT run_id FROM parameters WHERE name = ? AND value = ?)')
+            values.extend([name, str(value)])
+        # Infinite values go after the finite ones and blanks last, a profit factor of inf only says the run had no losing trades
+        query = (
+            'SELECT ' + ', '.join(RUN_COLUMNS) + ' FROM runs' +
+            (' WHERE ' + ' AND '.join(conditions) if conditions else '') +
+            ' ORDER BY ' + order_by + ' IS NULL, abs(' + order_by + ') = 9e999, ' + order_by + (' ASC' if ascending else ' DESC') + ', run_id LIMIT ?'
+        )
+        return [dict(row) for row in self.connection.execute(query, values + [limit])]
+
+
+    def get_runs(self, run_ids):
+        rows = self.connection.execute(
+            'SELECT ' + ', '.join(RUN_COLUMNS) + ' FROM runs WHERE run_id IN (' + ', '.join('?' * len(run_ids)) + ')',
+            list(run_ids),
+        )
+        runs = { row['run_id']: dict(row) for row in rows }
+        return [runs[run_id] for run_id in run_ids if run_id in runs]
+
+
+    def get_summary(self, run_id):
+        from cleaners.report_summary import Report_Summary
+        rows = self.connection.execute('SELECT key, text FROM summary WHERE run_id = ? ORDER BY rowid', (run_id,))
+        return Report_Summary([(row['key'], row['text']) for row in rows])
+
+
+    #* The paired ledger in time order, read back without touching the report
+    def get_trades(self, run_id):
+        import pandas as pd
+        from cleaners.trade_ledger import TRADE_TYPES
+        trades_df = pd.read_sql_query(
+            'SELECT ' + ', '.join(TRADE_COLUMNS.values()) + ' FROM trades WHERE run_id = ? ORDER BY sequence',
+            self.connection,
+            params=(run_id,),
+        )
+        trades_df.columns = list(TRADE_COLUMNS)
+        trades_df['Time'] = pd.to_datetime(trades_df['Time'], unit='s').astype('datetime64[us]')
+        trades_df['Type'] = pd.Categorical(trades_df['Type'], categories=TRADE_TYPES + sorted(set(trades_df['Type']) - set(TRADE_TYPES)))
+        for column in ['#', 'Order']:
+            trades_df[column] = trades_df[column].astype('int64')
+        return trades_df
+
+
+    #* Balance after every closed trade in close order, the curve the comparison report overlays
+    def get_balance_curve(self, run_id):
+        import numpy as np
+        rows = self.connection.execute(
+            'SELECT balance FROM trades WHERE run_id = ? AND profit IS NOT NULL ORDER BY sequence',
+            (run_id,),
+        ).fetchall()
+        return np.array([row[0] for row in rows], dtype=np.float64)
+
+
+    def get_info(self):
+        counts = self.connection.execute(
+            'SELECT COUNT(*), COUNT(DISTINCT system_name), COUNT(DISTINCT symbol) FROM runs'
+        ).fetchone()
+        trade_count = self.connection.execute('SELECT COUNT(*) FROM trades').fetchone()[0]
+        return {
+            'runs': counts[0],
+            'systems': counts[1],
+            'symbols': counts[2],
+            'trades': trade_count,
+            'bytes': os.path.getsize(self.store_file),
+        }
@@ -0,0 +1,236 @@
+import json
+import os
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+from pipeline.batch_runner import BATCH_MODES, find_input_files, process_report
+from pipeline.report_cache import get_file_hash
+
+
+DEFAULT_POLL_SECONDS = 2
+# MT4 writes a report in several goes, it is only picked up once its size and modified time hold still this long
+DEFAULT_SETTLE_SECONDS = 5
+JOURNAL_FILENAME = 'watch_journal.jsonl'
+
+
+#* Ctrl-C reaches the whole process group, only the watcher itself acts on it
+def ignore_interrupts():
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def get_file_signature(input_file):
+    file_stat = os.stat(input_file)
+    return file_stat.st_size, file_stat.st_mtime_ns
+
+
+#* Append only JSON lines record of every processed report, keyed on the report's content hash
+class Watch_Journal():
+    def __init__(self, journal_file):
+        self.journal_file = journal_file
+        self.entries = {}
+        self.signatures = {}
+        self.needs_newline = False
+        self.load()
+
+
+    def __len__(self):
+        return len(self.entries)
+
+
+    #* A crash mid append leaves a cut off last line, it is skipped and the next entry starts on a fresh line
+    def load(self):
+        if not os.path.isfile(self.journal_file):
+            return
+        with open(self.journal_file) as f:
+            for line in f:
+                self.needs_newline = not line.endswith('\n')
+                try:
+                    self.add_entry(json.loads(line))
+                except ValueError:
+                    continue
+
+
+    def add_entry(self, entry):
+        self.entries[entry['content_hash']] = entry
+        self.signatures[entry['input_file']] = (entry['size'], entry['mtime_ns'], entry['content_hash'])
+
+
+    def get_entry(self, content_hash):
+        return self.entries.get(content_hash)
+
+
+    #* Hash journalled for a file that hasn't changed since, so a restart doesn't re-read every report in the folder
+    def get_known_hash(self, input_file, signature):
+        size, mtime_ns, content_hash = self.signatures.get(input_file, (None, None, None))
+        return content_hash if (size, mtime_ns) == signature else None
+
+
+    def append(self, entry):
+        os.makedirs(os.path.dirname(os.path.abspath(self.journal_file)), exist_ok=True)
+        with open(self.journal_file, 'a') as f:
+            f.write(('\n' if self.needs_newline else '') + json.dumps(entry) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.needs_newline = False
+        self.add_entry(entry)
+
+
+#* Polls a folder for new or changed reports and runs them through the batch pipeline as they settle
+class Folder_Watcher():
+    def __init__(self, watch_dir, output_path, mode='full', workers=None, journal_file=None, poll_seconds=DEFAULT_POLL_SECONDS, settle_seconds=DEFAULT_SETTLE_SECONDS, retry_failed=False, **report_options):
+        if mode not in BATCH_MODES:
+            raise ValueError('Unknown watch mode "' + mode + '", expected one of ' + ', '.join(BATCH_MODES))
+        if not os.path.isdir(watch_dir):
+            raise ValueError('Watch folder ' + watch_dir + ' does not exist')
+        self.watch_dir = watch_dir
+        self.output_path = output_path
+        self.mode = mode
+        self.workers = workers or os.cpu_count() or 1
+        self.journal = Watch_Journal(journal_file or os.path.join(output_path, JOURNAL_FILENAME))
+        self.poll_seconds = poll_seconds
+        self.settle_seconds = settle_seconds
+        self.retry_failed = retry_failed
+        # Passed on to process_report, e.g. data_format, cache_dir, template_file, store_file
+        self.report_options = report_options
+        self.changing = {}
+        self.handled = {}
+        self.executor = None
+        self.in_flight = {}
+        self.results = []
+        self.skipped = 0
+
+
+    #* Runs until stop_event is set or Ctrl-C, or with until_idle once every report in the folder has been handled
+    def run(self, on_result=None, on_skipped=None, stop_event=None, until_idle=False):
+        os.makedirs(self.output_path, exist_ok=True)
+        self.executor = self.start_executor()
+        try:
+            try:
+                while stop_event is None or not stop_event.is_set():
+                    self.poll(on_skipped)
+                    if until_idle and not self.in_flight and not self.changing:
+                        break
+                    self.collect_results(on_result, stop_event)
+            except KeyboardInterrupt:
+                pass
+            # Reports already running are finished and journalled, anything not yet queued waits for the next start
+            while self.in_flight:
+                self.collect_results(on_result)
+        finally:
+            self.executor.shutdown()
+        return self.results
+
+
+    def start_executor(self):
+        return ProcessPoolExecutor(max_workers=self.workers, initializer=ignore_interrupts)
+
+
+    #* Queues settled reports, at most two per worker are in flight so a burst of new files doesn't pile up in the pool
+    def poll(self, on_skipped=None):
+        running_files = set(input_file for input_file, _, _ in self.in_flight.values())
+        for input_file, signature in self.get_settled_files():
+            if len(self.in_flight) >= self.workers * 2:
+                break
+            if input_file in running_files:
+                # Rewritten while its last version is running, it waits so the two don't write the same outputs at once
+                continue
+            try:
+                content_hash = self.journal.get_known_hash(input_file, signature) or get_file_hash(input_file)
+            except OSError:
+                continue
+            del self.changing[input_file]
+            self.handled[input_file] = signature
+            if self.is_processed(content_hash):
+                self.skipped += 1
+                if on_skipped:
+                    on_skipped(input_file, self.journal.get_entry(content_hash))
+                continue
+            try:
+                future = self.executor.submit(process_report, input_file, self.output_path, self.mode, **self.report_options)
+            except BrokenProcessPool:
+                # A worker died since the last collect, the report is picked up again once collect_results has replaced the pool
+                del self.handled[input_file]
+                break
+            self.in_flight[future] = (input_file, signature, content_hash)
+
+
+    #* Reports seen unchanged on two polls in a row and not modified for settle_seconds, that changed since they were last handled
+    def get_settled_files(self):
+        now = time.monotonic()
+        settled_files = []
+        input_files = find_input_files([self.watch_dir], self.mode)
+        # Reports deleted from the folder are forgotten, if they come back they are handled like new ones
+        for gone_file in set(self.changing).union(self.handled).difference(input_files):
+            self.changing.pop(gone_file, None)
+            self.handled.pop(gone_file, None)
+        for input_file in input_files:
+            try:
+                signature = get_file_signature(input_file)
+            except OSError:
+                continue
+            if self.handled.get(input_file) == signature:
+                continue
+            last_signature, unchanged_since = self.changing.get(input_file, (None, now))
+            if signature != last_signature:
+                self.changing[input_file] = (signature, now)
+                continue
+            # Reports already in the folder at start up were last modified long ago, they settle on the second poll
+            settled_seconds = max(now - unchanged_since, time.time() - signature[1] / 1e9)
+            if settled_seconds < self.settle_seconds:
+                continue
+            if not signature[0]:
+                # Left alone until something is written to it
+                del self.changing[input_file]
+                self.handled[input_file] = signature
+                continue
+            settled_files.append((input_file, signature))
+        return settled_files
+
+
+    #* Copies and renames of a processed report have the same content hash, so they are skipped too
+    def is_processed(self, content_hash):
+        if any(queued_hash == content_hash for _, _, queued_hash in self.in_flight.values()):
+            return True
+        entry = self.journal.get_entry(content_hash)
+        return entry is not None and (entry['status'] == 'ok' or not self.retry_failed)
+
+
+    #* Waits up to poll_seconds for a running report to finish, each result is journalled as soon as it is in
+    def collect_results(self, on_result=None, stop_event=None):
+        if not self.in_flight:
+            if stop_event is not None:
+                stop_event.wait(self.poll_seconds)
+            else:
+                time.sleep(self.poll_seconds)
+            return
+        done, _ = wait(self.in_flight, timeout=self.poll_seconds, return_when=FIRST_COMPLETED)
+        broken = any(isinstance(future.exception(), BrokenProcessPool) for future in done)
+        if broken:
+            # A dead worker takes every report in flight down with it, they are all journalled as failed
+            done = list(self.in_flight)
+        for future in done:
+            input_file, signature, content_hash = self.in_flight.pop(future)
+            if not future.done() or isinstance(future.exception(), BrokenProcessPool):
+                result = { 'input_file': input_file, 'status': 'failed', 'seconds': 0, 'outputs': '', 'error': 'A worker process died while this report was running (out of memory or a crash in native code)' }
+            else:
+                result = future.result()
+            self.journal.append({
+                'content_hash': content_hash,
+                'input_file': input_file,
+                'size': signature[0],
+                'mtime_ns': signature[1],
+                'status': result['status'],
+                'seconds': result['seconds'],
+                'outputs': result['outputs'],
+                'error': result['error'],
+                'processed_at': datetime.now().isoformat(timespec='seconds'),
+            })
+            self.results.append(result)
+            if on_result:
+                on_result(result)
+        if broken:
+            # Like Report_Service.restart, the broken pool is swapped for a fresh one and watching carries on
+            self.executor.shutdown(wait=False)
+            self.executor = self.start_executor()
@@ -0,0 +1,64 @@
+import numpy as np
+
+
+DEFAULT_SCATTER_POINT_BUDGET = 2000
+
+
+def get_bin_centers(edges):
+    return (edges[:-1] + edges[1:]) / 2
+
+
+#* Bins the duration/profit pairs once with numpy, the density charts are drawn from these grids
+class Trade_Bins():
+    def __init__(self, trades_duration_dataset, x='Duration (hrs)', y='Profit'):
+        dataset = trades_duration_dataset[[x, y]].dropna()
+        self.x_name = x
+        self.y_name = y
+        self.x = dataset[x].to_numpy(dtype=np.float64)
+        self.y = dataset[y].to_numpy(dtype=np.float64)
+        self.index = dataset.index
+        self.histograms = {}
+
+
+    def __len__(self):
+        return len(self.x)
+
+
+    def get_range(self, values):
+        if not len(values):
+            return (0.0, 1.0)
+        low, high = values.min(), values.max()
+        return (low, high) if high > low else (low - 0.5, high + 0.5)
+
+
+    #* Returns (counts, edges) of the durations, cached per bin count
+    def get_histogram(self, nbins):
+        key = ('x', nbins)
+        if key not in self.histograms:
+            self.histograms[key] = np.histogram(self.x, bins=nbins, range=self.get_range(self.x))
+        return self.histograms[key]
+
+
+    #* Returns (counts[x, y], x_edges, y_edges), cached per grid size
+    def get_histogram_2d(self, nbinsx, nbinsy):
+        key = ('xy', nbinsx, nbinsy)
+        if key not in self.histograms:
+            self.histograms[key] = np.histogram2d(
+                self.x,
+                self.y,
+                bins=(nbinsx, nbinsy),
+                range=(self.get_range(self.x), self.get_range(self.y)),
+            )
+        return self.histograms[key]
+
+
+    #* Samples the scatter points down to point_budget, the extreme trades on both axes are always kept
+    def get_scatter_sample(self, point_budget=DEFAULT_SCATTER_POINT_BUDGET):
+        point_count = len(self.x)
+        if point_count <= point_budget:
+            return { self.x_name: self.x, self.y_name: self.y }
+        extremes = np.unique([self.x.argmin(), self.x.argmax(), self.y.argmin(), self.y.argmax()])
+        # A budget below the extremes' count still gets the extremes, and nothing else
+        sample = np.random.default_rng(0).choice(point_count, size=max(point_budget - len(extremes), 0), replace=False)
+        selected = np.union1d(sample, extremes)
+        return { self.x_name: self.x[selected], self.y_name: self.y[selected] }
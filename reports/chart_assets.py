@@ -0,0 +1,56 @@
+import hashlib
+import io
+import os
+from base64 import b64encode
+from importlib.util import find_spec
+
+
+IMAGE_FORMATS = ['jpeg', 'png', 'webp']
+ASSET_MODES = ['inline', 'external']
+DEFAULT_ASSET_DIR = 'assets'
+# The image exporter has no quality setting, re-encoding at a given quality needs Pillow and is skipped without it
+IMAGE_QUALITY_SUPPORTED = find_spec('PIL') is not None
+
+
+#* Re-encodes an exported chart at the given quality, png is lossless so only its compression effort changes
+def compress_image(image_bytes, image_format, quality=None):
+    if quality is None or not IMAGE_QUALITY_SUPPORTED:
+        return image_bytes
+    from PIL import Image
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        output = io.BytesIO()
+        if image_format == 'png':
+            image.save(output, format='PNG', optimize=True)
+        else:
+            image.convert('RGB').save(output, format=image_format.upper(), quality=quality)
+    return output.getvalue()
+
+
+def get_data_uri(image_bytes, image_format):
+    return 'data:image/' + image_format + ';base64,' + b64encode(image_bytes).decode('utf-8')
+
+
+#* Writes chart images next to the reports under their content hash, reports in one folder share identical charts
+class Chart_Asset_Writer():
+    def __init__(self, report_location, asset_dir=DEFAULT_ASSET_DIR):
+        self.report_dir = os.path.dirname(os.path.abspath(report_location))
+        self.asset_dir = asset_dir
+        self.written = 0
+        self.reused = 0
+
+
+    #* Returns the src the report links the image with, relative to the report so the folder can be moved
+    def write(self, image_bytes, image_format):
+        asset_name = hashlib.sha256(image_bytes).hexdigest()[:32] + '.' + image_format
+        asset_location = os.path.join(self.report_dir, self.asset_dir, asset_name)
+        if os.path.isfile(asset_location):
+            self.reused += 1
+        else:
+            os.makedirs(os.path.dirname(asset_location), exist_ok=True)
+            temp_location = asset_location + '.' + str(os.getpid()) + '.tmp'
+            with open(temp_location, 'wb') as f:
+                f.write(image_bytes)
+            # Batch workers may write the same chart at once, either copy is the same bytes
+            os.replace(temp_location, asset_location)
+            self.written += 1
+        return self.asset_dir + '/' + asset_name
@@ -0,0 +1,129 @@
+from jinja2 import meta
+
+
+#* A frame derived from the ledger, builder is the Report_Plotter method that sets the attribute of the same name
+class Frame_Spec():
+    __slots__ = ('name', 'builder', 'frames')
+
+    def __init__(self, name, builder, frames=()):
+        self.name = name
+        self.builder = builder
+        self.frames = list(frames)
+
+
+#* A chart the template can embed, builder is the Report_Plotter method that returns its figure
+class Chart_Spec():
+    __slots__ = ('name', 'builder', 'frames')
+
+    def __init__(self, name, builder, frames=()):
+        self.name = name
+        self.builder = builder
+        self.frames = list(frames)
+
+
+FRAME_SPECS = [
+    Frame_Spec('trades_duration_dataset', 'generate_trade_duration_df'),
+    Frame_Spec('trade_bins', 'generate_trade_bins', ['trades_duration_dataset']),
+    Frame_Spec('account_balance_df', 'generate_account_balance_df'),
+    Frame_Spec('period_rollup', 'generate_period_rollup'),
+    Frame_Spec('trade_metrics', 'generate_trade_analytics'),
+    Frame_Spec('summary_mismatches', 'generate_trade_analytics'),
+    Frame_Spec('monte_carlo', 'generate_monte_carlo'),
+    Frame_Spec('rolling_metrics_df', 'generate_rolling_metrics'),
+]
+CHART_SPECS = [
+    Chart_Spec('account_balance_fig_jpeg', 'build_account_balance_chart', ['account_balance_df']),
+    Chart_Spec('monthly_profit_fig_jpeg', 'build_monthly_profit_chart', ['period_rollup']),
+    Chart_Spec('monthly_trades_fig_jpeg', 'build_monthly_trades_chart', ['period_rollup']),
+    Chart_Spec('quarterly_profit_fig_jpeg', 'build_quarterly_profit_chart', ['period_rollup']),
+    Chart_Spec('yearly_profit_fig_jpeg', 'build_yearly_profit_chart', ['period_rollup']),
+    Chart_Spec('fig1_jpeg', 'build_duration_scatter_chart', ['trade_bins']),
+    Chart_Spec('fig2_jpeg', 'build_duration_heatmap_chart', ['trade_bins']),
+    Chart_Spec('fig4_jpeg', 'build_duration_contour_chart', ['trade_bins']),
+    Chart_Spec('fig6_jpeg', 'build_duration_histogram_chart', ['trade_bins']),
+    Chart_Spec('density_contour_fig_jpeg', 'build_density_contour_chart', ['trades_duration_dataset']),
+    Chart_Spec('monte_carlo_bands_fig_jpeg', 'build_monte_carlo_bands_chart', ['monte_carlo']),
+    Chart_Spec('monte_carlo_drawdown_fig_jpeg', 'build_monte_carlo_drawdown_chart', ['monte_carlo']),
+    Chart_Spec('rolling_metrics_fig_jpeg', 'build_rolling_metrics_chart', ['rolling_metrics_df']),
+]
+# Report text computed from the ledger, everything else is read straight off the MT4 summary
+TEXT_FRAMES = {
+    'win_rate': ['trade_metrics'],
+    'profit_factor': ['trade_metrics'],
+    'expectancy': ['trade_metrics'],
+    'sharpe_ratio': ['trade_metrics'],
+    'sortino_ratio': ['trade_metrics'],
+    'worst_trade_percent': ['trade_metrics'],
+    'summary_check': ['summary_mismatches'],
+    'monte_carlo_simulations': ['monte_carlo'],
+    'monte_carlo_drawdown_p50': ['monte_carlo'],
+    'monte_carlo_drawdown_p95': ['monte_carlo'],
+    'monte_carlo_final_balance_p5': ['monte_carlo'],
+    'monte_carlo_loss_probability': ['monte_carlo'],
+}
+
+
+#* Lists the variables a template and the templates it includes or extends reference
+def get_template_variables(template_env, template_name):
+    variables = set()
+    pending = [template_name]
+    seen = set()
+    while pending:
+        name = pending.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        source = template_env.loader.get_source(template_env, name)[0]
+        parsed = template_env.parse(source)
+        variables |= meta.find_undeclared_variables(parsed)
+        pending.extend(reference for reference in meta.find_referenced_templates(parsed) if reference is not None)
+    return variables
+
+
+#* Works out which charts and frames a set of template variables needs, so nothing unused gets built
+class Chart_Registry():
+    def __init__(self, frame_specs=FRAME_SPECS, chart_specs=CHART_SPECS, text_frames=TEXT_FRAMES):
+        self.frame_specs = { spec.name: spec for spec in frame_specs }
+        self.chart_specs = { spec.name: spec for spec in chart_specs }
+        self.text_frames = dict(text_frames)
+
+
+    def get_chart_spec(self, chart_name):
+        return self.chart_specs[chart_name]
+
+
+    #* None means every variable, e.g. when the caller renders without a template
+    def get_charts(self, variables=None):
+        return [name for name in self.chart_specs if variables is None or name in variables]
+
+
+    #* Frames the variables need, ordered so each frame comes after the frames it is built from
+    def get_frames(self, variables=None):
+        ordered_frames = []
+
+        def add_frame(frame_name):
+            if frame_name in ordered_frames:
+                return
+            for dependency in self.frame_specs[frame_name].frames:
+                add_frame(dependency)
+            ordered_frames.append(frame_name)
+
+        for chart_name in self.get_charts(variables):
+            for frame_name in self.chart_specs[chart_name].frames:
+                add_frame(frame_name)
+        for text_name, frame_names in self.text_frames.items():
+            if variables is None or text_name in variables:
+                for frame_name in frame_names:
+                    add_frame(frame_name)
+        return ordered_frames
+
+
+    #* Builder methods in run order, frames sharing a builder only run it once
+    def get_frame_builders(self, variables=None):
+        builders = {}
+        for frame_name in self.get_frames(variables):
+            builders.setdefault(self.frame_specs[frame_name].builder, frame_name)
+        return builders
+
+
+CHART_REGISTRY = Chart_Registry()
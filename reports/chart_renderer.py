@@ -0,0 +1,85 @@
+import atexit
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import plotly.io as pio
+
+
+DEFAULT_RENDER_WORKERS = min(4, os.cpu_count() or 1)
+
+
+#* The first export of a process starts the image exporter, pay for it once when the worker boots
+def warm_export_worker():
+    pio.to_image({'data': [], 'layout': {}}, format='jpeg', width=10, height=10)
+
+
+def export_figure(figure_dict, image_format, width):
+    start_time = time.perf_counter()
+    figure_bytes = pio.to_image(figure_dict, format=image_format, width=width)
+    return figure_bytes, time.perf_counter() - start_time
+
+
+#* Exports plotly figures on a pool of long lived workers that keep their image exporter running
+class Chart_Renderer():
+    def __init__(self, workers=DEFAULT_RENDER_WORKERS, image_format='jpeg', width=700):
+        self.workers = workers
+        self.image_format = image_format
+        self.width = width
+        self.executor = None
+        self.timings = {}
+
+
+    def start(self):
+        if self.executor is not None:
+            return
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=warm_export_worker,
+        )
+        # Workers are spawned on demand, so submit one task per worker to boot them all up front
+        warm_futures = [self.executor.submit(time.sleep, 0.1) for _ in range(self.workers)]
+        for future in warm_futures:
+            future.result()
+
+
+    #* Takes {name: figure} and returns {name: image bytes}, recording each chart's export time
+    def render(self, figures, on_chart_rendered=None, image_format=None):
+        self.start()
+        start_time = time.perf_counter()
+        futures = {
+            self.executor.submit(export_figure, figure.to_dict(), image_format or self.image_format, self.width): name
+            for name, figure in figures.items()
+        }
+        images = {}
+        self.timings = {}
+        for future in as_completed(futures):
+            name = futures[future]
+            images[name], self.timings[name] = future.result()
+            if on_chart_rendered:
+                on_chart_rendered(name, len(images), len(figures))
+        self.timings['total'] = time.perf_counter() - start_time
+        return images
+
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+
+
+shared_renderers = {}
+
+
+#* Reports rendered in the same process share one warm pool per worker count
+def get_shared_chart_renderer(workers=DEFAULT_RENDER_WORKERS):
+    if workers not in shared_renderers:
+        shared_renderers[workers] = Chart_Renderer(workers=workers)
+    return shared_renderers[workers]
+
+
+@atexit.register
+def shutdown_shared_chart_renderers():
+    for renderer in shared_renderers.values():
+        renderer.shutdown()
@@ -0,0 +1,48 @@
+import numpy as np
+
+
+DEFAULT_POINT_BUDGET = 2000
+
+
+#* Largest-triangle-three-buckets, returns the positions of the points that keep the line's shape
+def largest_triangle_three_buckets(y, point_budget):
+    y = np.asarray(y, dtype=np.float64)
+    point_count = len(y)
+    if point_budget >= point_count or point_budget < 3:
+        return np.arange(point_count)
+    x = np.arange(point_count, dtype=np.float64)
+    # First and last points are always kept, the rest is split into point_budget - 2 buckets
+    bucket_edges = np.linspace(1, point_count - 1, point_budget - 1).astype(np.int64)
+    selected = np.empty(point_budget, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = point_count - 1
+    previous = 0
+    for bucket in range(point_budget - 2):
+        start, stop = bucket_edges[bucket], bucket_edges[bucket + 1]
+        next_start, next_stop = stop, bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else point_count
+        next_x = x[next_start:next_stop].mean()
+        next_y = y[next_start:next_stop].mean()
+        # Twice the triangle area between the previous pick, each candidate and the next bucket's average
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:stop] - y[previous]) -
+            (x[previous] - x[start:stop]) * (next_y - y[previous])
+        )
+        previous = start + areas.argmax()
+        selected[bucket + 1] = previous
+    return selected
+
+
+#* The peak and trough of the largest drawdown plus the curve's extremes are always kept exactly
+def get_drawdown_extremes(y):
+    y = np.asarray(y, dtype=np.float64)
+    running_peak = np.maximum.accumulate(y)
+    trough = (running_peak - y).argmax()
+    peak = y[:trough + 1].argmax()
+    return np.array([peak, trough, y.argmin(), y.argmax()])
+
+
+def downsample_line(y, point_budget=DEFAULT_POINT_BUDGET):
+    if len(y) <= point_budget:
+        return np.arange(len(y))
+    selected = largest_triangle_three_buckets(y, point_budget)
+    return np.union1d(selected, get_drawdown_extremes(y))
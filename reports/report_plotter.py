@@ -1,38 +1,173 @@
+import warnings
+import numpy as np
 import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
-import jinja2
-from base64 import b64encode
-import calendar
+from plotly.subplots import make_subplots
 from operator import itemgetter
+from cleaners.report_summary import Report_Summary
+from analytics.trade_analytics import Trade_Analytics
+from analytics.period_rollup import Period_Rollup
+from analytics.monte_carlo import DEFAULT_SIMULATION_SECONDS, DEFAULT_SIMULATION_SEED, DEFAULT_SIMULATIONS, Monte_Carlo_Simulation
+from analytics.rolling_metrics import DEFAULT_ROLLING_WINDOW, Rolling_Metrics
+from reports.binning import DEFAULT_SCATTER_POINT_BUDGET, Trade_Bins, get_bin_centers
+from reports.downsampling import DEFAULT_POINT_BUDGET, downsample_line
+from reports.chart_renderer import DEFAULT_RENDER_WORKERS, get_shared_chart_renderer
+from reports.chart_registry import CHART_REGISTRY
+from reports.chart_assets import ASSET_MODES, IMAGE_FORMATS, IMAGE_QUALITY_SUPPORTED, Chart_Asset_Writer, compress_image, get_data_uri
+from reports.report_templates import DEFAULT_TEMPLATE_FILE, get_compiled_template
+from pipeline.instrumentation import NULL_RECORDER
+
+
+MAX_LABELLED_BARS = 60
 
 
 class Report_Plotter():
-    def __init__(self, output_path, xls_location):
+    def __init__(self, output_path, xls_location=None, summary_df=None, trades_df=None, summary=None, report_location=None, render_workers=DEFAULT_RENDER_WORKERS, chart_renderer=None, report_cache=None, report_key=None, progress_callback=None, recorder=NULL_RECORDER, line_point_budget=DEFAULT_POINT_BUDGET, scatter_point_budget=DEFAULT_SCATTER_POINT_BUDGET, template_file=DEFAULT_TEMPLATE_FILE, chart_registry=CHART_REGISTRY, simulations=DEFAULT_SIMULATIONS, simulation_seconds=DEFAULT_SIMULATION_SECONDS, simulation_seed=DEFAULT_SIMULATION_SEED, simulation_workers=None, rolling_window=DEFAULT_ROLLING_WINDOW, rolling_window_unit='trades', image_format='jpeg', image_quality=None, asset_mode='inline'):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError('Unknown image format "' + image_format + '", expected one of ' + ', '.join(IMAGE_FORMATS))
+        if asset_mode not in ASSET_MODES:
+            raise ValueError('Unknown asset mode "' + asset_mode + '", expected one of ' + ', '.join(ASSET_MODES))
+        if image_quality is not None and not 1 <= image_quality <= 100:
+            raise ValueError('Image quality must be between 1 and 100, got ' + str(image_quality))
+        if image_quality is not None and not IMAGE_QUALITY_SUPPORTED:
+            # Left out of the chart keys too, the charts are cached as the exporter wrote them
+            warnings.warn('Image quality ' + str(image_quality) + ' is ignored, re-encoding charts needs Pillow')
+            image_quality = None
         self.output_path = output_path
         self.xls_location = xls_location
-        self.trades_data_df = None
-        self.summary_data_df = None
+        self.report_location = report_location or xls_location[:-5] + '.html'
+        self.trades_data_df = trades_df
+        self.summary_data_df = summary_df
+        self.summary = summary
         self.trades_duration_dataset = None
+        self.trade_bins = None
         self.account_balance_df = None
-        self.monthly_trades_df = None
-        self.monthly_order_types_df = None
-        self.monthly_profits_df = None
+        self.period_rollup = None
+        self.trade_metrics = None
+        self.summary_mismatches = None
+        self.monte_carlo = None
+        self.rolling_metrics_df = None
+        self.render_workers = render_workers
+        self.chart_renderer = chart_renderer
+        self.report_cache = report_cache
+        # Content hash of the report the frames came from, xlsx inputs are hashed when it isn't given
+        self.report_key = report_key
+        self.progress_callback = progress_callback
+        self.recorder = recorder
+        self.line_point_budget = line_point_budget
+        self.scatter_point_budget = scatter_point_budget
+        self.template_file = template_file
+        self.chart_registry = chart_registry
+        self.simulations = simulations
+        self.simulation_seconds = simulation_seconds
+        self.simulation_seed = simulation_seed
+        # Callers that render in process (batch workers, the report service) simulate in process too
+        self.simulation_workers = render_workers if simulation_workers is None else simulation_workers
+        self.rolling_window = rolling_window
+        self.rolling_window_unit = rolling_window_unit
+        self.image_format = image_format
+        self.image_quality = image_quality
+        self.asset_mode = asset_mode
+        self.chart_assets = None
+        self.template = None
+        self.template_variables = None
+        self.chart_timings = {}
+        self.cached_report_key = None
+        self.chart_keys = {}
+        self.cached_images = {}
+        self.text_key = None
+        self.cached_text = None
 
 
     def generate_report(self):
-        self.load_data()
-        self.generate_trade_duration_df()
-        self.generate_account_balance_df()
-        self.generate_monthly_trades_df()
-        self.generate_monthly_profits_df()
-        self.build_html_report()
+        self.report_progress('loading data')
+        with self.recorder.stage('load_data') as stage:
+            self.load_data()
+            stage.rows = len(self.trades_data_df)
+        self.load_template()
+        with self.recorder.stage('load_cached_outputs') as stage:
+            self.load_cached_outputs()
+            stage.rows = len(self.cached_images)
+        self.report_progress('building frames')
+        self.generate_frames(self.get_pending_variables())
+        with self.recorder.stage('build_html_report'):
+            self.build_html_report()
     
 
-    #* Load data from excel into dataframes
+    def report_progress(self, stage, current=None, total=None):
+        if self.progress_callback:
+            self.progress_callback(stage, current, total)
+
+
+    #* Load data from excel into dataframes unless the cleaner handed them over directly
     def load_data(self):
-        self.trades_data_df = pd.read_excel(self.xls_location, sheet_name='trade_data')  
-        self.summary_data_df = pd.read_excel(self.xls_location, sheet_name='summary_data')  
+        if self.trades_data_df is None or self.summary_data_df is None:
+            sheets = pd.read_excel(self.xls_location, sheet_name=None)
+            self.summary_data_df = sheets['summary_data']
+            # Ledgers longer than one Excel sheet continue on trade_data_2, trade_data_3, ...
+            trade_sheets = [sheets[name] for name in sheets if name == 'trade_data' or name.startswith('trade_data_')]
+            self.trades_data_df = pd.concat(trade_sheets, ignore_index=True)
+        if self.summary is None:
+            self.summary = Report_Summary.from_summary_df(self.summary_data_df)
+        self.summary.validate()
+
+
+    #* Charts and stats already in the report cache, a full hit goes straight to the template without building any frame
+    def load_cached_outputs(self):
+        if self.report_cache is None:
+            return
+        report_key = self.report_key or (self.report_cache.get_report_key(self.xls_location) if self.xls_location else None)
+        if report_key is None:
+            return
+        self.cached_report_key = report_key
+        render_options = self.get_render_options()
+        for chart_name in self.chart_registry.get_charts(self.template_variables):
+            self.chart_keys[chart_name] = self.report_cache.get_chart_key(report_key, chart_name, render_options)
+            chart_image = self.report_cache.get_chart(report_key, self.chart_keys[chart_name])
+            if chart_image is not None:
+                self.cached_images[chart_name] = chart_image
+        text_names = self.get_text_names(self.template_variables)
+        self.text_key = self.report_cache.get_chart_key(report_key, 'report text ' + ','.join(text_names), render_options)
+        self.cached_text = self.report_cache.get_text(report_key, self.text_key)
+
+
+    #* Every option that changes a chart or a stat, cached outputs drawn with other options don't match
+    def get_render_options(self):
+        return {
+            'image_format': self.image_format,
+            'image_quality': self.image_quality,
+            'line_point_budget': self.line_point_budget,
+            'scatter_point_budget': self.scatter_point_budget,
+            'simulations': self.simulations,
+            'simulation_seconds': self.simulation_seconds,
+            'simulation_seed': self.simulation_seed,
+            'rolling_window': self.rolling_window,
+            'rolling_window_unit': self.rolling_window_unit,
+        }
+
+
+    #* Charts and text the report still needs, frames only cached outputs depend on are left out
+    def get_pending_variables(self):
+        pending_variables = set(self.chart_registry.get_charts(self.template_variables)).difference(self.cached_images)
+        if self.cached_text is None:
+            pending_variables.update(self.get_text_names(self.template_variables))
+        return pending_variables
+
+
+    #* Runs only the frame builders the given template variables depend on, None builds every frame
+    def generate_frames(self, variables=None):
+        for builder, frame_name in self.chart_registry.get_frame_builders(variables).items():
+            with self.recorder.stage(builder) as stage:
+                getattr(self, builder)()
+                stage.rows = self.get_frame_rows(frame_name)
+
+
+    def get_frame_rows(self, frame_name):
+        frame = getattr(self, frame_name)
+        if frame_name == 'trade_metrics':
+            return frame['total_trades']
+        return len(frame)
 
 
     def generate_trade_duration_df(self):
@@ -41,149 +176,345 @@ class Report_Plotter():
         self.trades_duration_dataset = duration_dataset[duration_dataset['Profit'].notna()]
 
 
+    def generate_trade_bins(self):
+        self.trade_bins = Trade_Bins(self.trades_duration_dataset)
+
+
     def generate_account_balance_df(self):
         account_balance_dataset = self.trades_data_df.filter(['Profit', 'Balance'], axis=1)
         self.account_balance_df = account_balance_dataset[account_balance_dataset['Profit'].notna()]
 
 
-    #* Builds the data to count order types by months
-    def generate_monthly_trades_df(self):
-        monthly_trades_dataset = self.trades_data_df.filter(['Time','Type','Profit'], axis=1)
-        monthly_trades_dataset['Month'] = pd.DatetimeIndex(monthly_trades_dataset['Time']).month
-        monthly_trades_dataset['Month'] = monthly_trades_dataset['Month'].apply(lambda x: calendar.month_abbr[x])
-        self.monthly_trades_df = monthly_trades_dataset
-        count_series = monthly_trades_dataset.groupby(['Month', 'Type',]).size().reset_index()
-        count_series = count_series.pivot_table(0, ['Month'], 'Type').fillna(0)
-        cats = ['Jan', 'Feb', 'Mar', 'Apr','May','Jun', 'Jul', 'Aug','Sep', 'Oct', 'Nov', 'Dec']
-        count_series.index = pd.CategoricalIndex(count_series.index, categories=cats, ordered=True)
-        self.monthly_order_types_df = count_series.sort_index()
-
-
-    #* Builds the data to evalutate Net Profit by months
-    def generate_monthly_profits_df(self):
-        profit_series = self.monthly_trades_df.groupby(['Month', 'Profit',]).size().reset_index()
-        profit_series['Total'] = profit_series.groupby(['Month'])['Profit'].transform('sum')
-        profit_series = profit_series.drop_duplicates(subset=['Month']).reset_index(drop=True)
-        cats = ['Jan', 'Feb', 'Mar', 'Apr','May','Jun', 'Jul', 'Aug','Sep', 'Oct', 'Nov', 'Dec']
-        profit_series.set_index('Month', inplace=True)
-        profit_series.index = pd.CategoricalIndex(profit_series.index, categories=cats, ordered=True)
-        profit_series = profit_series.sort_index()
-        self.monthly_profits_df = profit_series
+    #* Buckets the ledger by day, week, month, quarter and year for every period chart
+    def generate_period_rollup(self):
+        self.period_rollup = Period_Rollup(self.trades_data_df)
 
     
+    #* Recomputes the stats from the ledger and checks them against the MT4 summary
+    def generate_trade_analytics(self):
+        initial_deposit = self.summary.get_number('Initial deposit') if 'Initial deposit' in self.summary else None
+        trade_analytics = Trade_Analytics(self.trades_data_df, initial_deposit)
+        self.trade_metrics = trade_analytics.compute()
+        self.summary_mismatches = trade_analytics.compare_to_summary(self.summary)
+
+
+    #* Resamples the closed trades within the simulation and time budget, the seed keeps the charts reproducible
+    def generate_monte_carlo(self):
+        initial_deposit = self.summary.get_number('Initial deposit') if 'Initial deposit' in self.summary else None
+        self.monte_carlo = Monte_Carlo_Simulation(
+            self.trades_data_df,
+            initial_deposit,
+            simulations=self.simulations,
+            seconds=self.simulation_seconds,
+            seed=self.simulation_seed,
+            workers=self.simulation_workers,
+        ).run()
+
+
+    #* Win rate, profit factor, expectancy, drawdown and duration over the last rolling_window trades or days, next to the ledger
+    def generate_rolling_metrics(self):
+        self.rolling_metrics_df = Rolling_Metrics(self.trades_data_df, self.rolling_window, self.rolling_window_unit).compute()
+
+
+    #* The variables the template references decide which charts and frames get built
+    def load_template(self):
+        if self.template is None:
+            self.template, self.template_variables = get_compiled_template(self.template_file)
+        return self.template
+
+
     def build_html_report(self): # Obtain Template
-        templateLoader = jinja2.FileSystemLoader(searchpath="./")
-        templateEnv = jinja2.Environment(loader=templateLoader)
-        TEMPLATE_FILE = "/reports/template.html"
-        template = templateEnv.get_template(TEMPLATE_FILE)
-        self.inject_html_data(template)
+        self.inject_html_data(self.load_template())
 
     
     #* Inject Data into HTML Template
     def inject_html_data(self, template): # Populate Template
-        output_html= template.render(
-            #! Report Text:
-            system_name = self.get_system_name(),
-            symbol = self.get_equity(),
-            period = self.get_period(),
-            duration = self.get_duration(),
-            bars = self.get_bars(),
-            ticks_modeled = self.get_ticks_modeled(),
-            modelling_quality = self.get_modeling_quality(),
-            mismatched_charts_errors = self.get_mismatched_chart_errors(),
-            gross_profit = self.get_gross_profit(),
-            gross_loss = self.get_gross_loss(),
-            net_profit = self.get_net_profit(),
-            absolute_drawdown = self.get_absolute_drawdown(),
-            maximal_drawdown = self.get_max_drawdown(),
-            relative_drawdown = self.get_relative_drawdown(),
-            total_trades = self.get_total_positions_count(),
-            short_positions = self.get_short_postions_count(),
-            long_positions = self.get_long_postions_count(),
-            largest_profit_trade = self.get_largest_profitable_trade(),
-            largest_loss_trade = self.get_largest_unprofitable_trade(),
-            average_profit_trade = self.get_average_profit_per_trade() ,
-            average_loss_trade = self.get_average_loss_per_trade(),
-            max_consecutive_wins = self.get_max_consecutive_wins(),
-            max_consecutive_losses = self.get_max_consecutive_losses() ,
-            max_consecutive_profit = self.get_max_consecutive_profit_amt(),
-            max_consecutive_loss = self.get_max_consecutive_loss_amt(),
-            average_consecutive_wins = self.get_avg_consecutive_win_count(),
-            average_consecutive_losses = self.get_avg_consecutive_loss_count(),
-            #! Report Charts:
-            account_balance_fig_jpeg = self.generate_line_chart({
-                'data' : self.account_balance_df,
-                'title' : 'Net Account Balance',
-                'y' : 'Balance',
-                'labels' : {"index":"Trade"},
-            }),
-            monthly_profit_fig_jpeg = self.generate_bar_chart({
-                'data' : self.monthly_profits_df,
-                'title' : 'Total Net Profit by Month',
-                'x' : self.monthly_profits_df.index,
-                'y' : self.monthly_profits_df['Total'],
-                'labels' : {"Total":"Profit in $"},
-                'legend' : {'title_text':'Order Type'}
-            }),
-            monthly_trades_fig_jpeg = self.generate_bar_chart({
-                'data' : self.monthly_order_types_df,
-                'title' : 'Order Type Count by Month',
-                'x' : self.monthly_order_types_df.index,
-                'y' : ['buy', 'sell', 'close', 'close at stop'],
-                'labels' : {"value":"Count"},
-                'legend' : {'title_text':'Order Type'}
-            }),
-            fig1_jpeg = self.generate_scatter_plot({
-                'data' : self.trades_duration_dataset,
-                'x' : 'Duration (hrs)',
-                'y' : 'Profit',
-                'width' : 600,
-                'height' : 600
-            }),
-            fig2_jpeg = self.generate_heatmap({
-                'data' : self.trades_duration_dataset,
-                'x' : 'Duration (hrs)',
-                'y' : 'Profit',
-                'nbinsx' : 50,
-                'nbinsy' : 20
-            }),
-            fig4_jpeg = self.generate_2d_histogram_contour({
-                'x' : self.trades_duration_dataset['Duration (hrs)'],
-                'y' : self.trades_duration_dataset['Profit'],
-            }),
-            # fig6_jpeg = self.generate_density_contour({
-            #     'data' : self.trades_duration_dataset,
-            #     'x' : self.trades_duration_dataset['Duration (hrs)'],
-            #     'y' : self.trades_duration_dataset['Profit'],
-            # }),
-            fig6_jpeg = self.generate_histogram({
-                'data' : self.trades_duration_dataset,
-                'x' : 'Duration (hrs)',
-                'nbins' : 20,
-            }),
-        ) 
-
-        with open(self.xls_location[:-5] + '.html', "w") as f:
-            f.write(output_html)
-
-
-    def convert_chart_figure_to_jpeg(self, figure):
-        figure_bytes = figure.to_image(format="jpeg", width=700)
-        figure_jpeg = b64encode(figure_bytes).decode("utf-8")
-        return figure_jpeg
+        self.report_progress('building charts')
+        with self.recorder.stage('build_chart_figures') as stage:
+            chart_figures = self.build_chart_figures(self.get_pending_variables())
+            stage.rows = len(chart_figures)
+        with self.recorder.stage('render_chart_figures') as stage:
+            chart_images = self.render_chart_figures(chart_figures)
+            stage.rows = len(chart_images)
+        chart_sources = self.get_chart_sources(chart_images)
+        report_text = self.cached_text
+        if report_text is None:
+            report_text = self.get_report_text(self.template_variables)
+            if self.text_key is not None:
+                self.report_cache.put_text(self.cached_report_key, self.text_key, report_text)
+        self.report_progress('writing report')
+        # Streamed into the file chunk by chunk, the finished report is never held as one string
+        with self.recorder.stage('template render'), open(self.report_location, "w") as f:
+            template.stream(**report_text, **chart_sources).dump(f)
+
+
+    #* Images go inline as data URIs, or into content hashed files next to the report that every report in the folder shares
+    def get_chart_sources(self, chart_images):
+        if self.asset_mode == 'inline':
+            return { name: get_data_uri(image, self.image_format) for name, image in chart_images.items() }
+        with self.recorder.stage('write_chart_assets') as stage:
+            self.chart_assets = Chart_Asset_Writer(self.report_location)
+            chart_sources = { name: self.chart_assets.write(image, self.image_format) for name, image in chart_images.items() }
+            stage.rows = self.chart_assets.written
+        return chart_sources
+
+
+    #* Only the text the template references is looked up, None returns all of it
+    def get_report_text(self, variables=None):
+        text_getters = self.get_text_getters()
+        return { name: text_getters[name]() for name in self.get_text_names(variables) }
+
+
+    def get_text_names(self, variables=None):
+        return [name for name in self.get_text_getters() if variables is None or name in variables]
+
+
+    def get_text_getters(self):
+        return {
+            'system_name' : self.get_system_name,
+            'symbol' : self.get_equity,
+            'period' : self.get_period,
+            'duration' : self.get_duration,
+            'bars' : self.get_bars,
+            'ticks_modeled' : self.get_ticks_modeled,
+            'modelling_quality' : self.get_modeling_quality,
+            'mismatched_charts_errors' : self.get_mismatched_chart_errors,
+            'gross_profit' : self.get_gross_profit,
+            'gross_loss' : self.get_gross_loss,
+            'net_profit' : self.get_net_profit,
+            'absolute_drawdown' : self.get_absolute_drawdown,
+            'maximal_drawdown' : self.get_max_drawdown,
+            'relative_drawdown' : self.get_relative_drawdown,
+            'total_trades' : self.get_total_positions_count,
+            'short_positions' : self.get_short_postions_count,
+            'long_positions' : self.get_long_postions_count,
+            'largest_profit_trade' : self.get_largest_profitable_trade,
+            'largest_loss_trade' : self.get_largest_unprofitable_trade,
+            'average_profit_trade' : self.get_average_profit_per_trade,
+            'average_loss_trade' : self.get_average_loss_per_trade,
+            'max_consecutive_wins' : self.get_max_consecutive_wins,
+            'max_consecutive_losses' : self.get_max_consecutive_losses,
+            'max_consecutive_profit' : self.get_max_consecutive_profit_amt,
+            'max_consecutive_loss' : self.get_max_consecutive_loss_amt,
+            'average_consecutive_wins' : self.get_avg_consecutive_win_count,
+            'average_consecutive_losses' : self.get_avg_consecutive_loss_count,
+            'win_rate' : lambda: self.get_trade_metric('win_rate'),
+            'profit_factor' : lambda: self.get_trade_metric('profit_factor'),
+            'expectancy' : lambda: self.get_trade_metric('expectancy'),
+            'sharpe_ratio' : lambda: self.get_trade_metric('sharpe_ratio', 3),
+            'sortino_ratio' : lambda: self.get_trade_metric('sortino_ratio', 3),
+            'worst_trade_percent' : lambda: self.get_trade_metric('worst_trade_percent'),
+            'summary_check' : self.get_summary_check,
+            'monte_carlo_simulations' : lambda: str(len(self.monte_carlo)),
+            'monte_carlo_drawdown_p50' : lambda: self.get_monte_carlo_stat('max_drawdown_p50'),
+            'monte_carlo_drawdown_p95' : lambda: self.get_monte_carlo_stat('max_drawdown_p95'),
+            'monte_carlo_final_balance_p5' : lambda: self.get_monte_carlo_stat('final_balance_p5'),
+            'monte_carlo_loss_probability' : lambda: self.get_monte_carlo_stat('loss_probability'),
+            'rolling_window' : lambda: str(self.rolling_window) + ' ' + self.rolling_window_unit,
+        }
+
+
+    def build_chart_figures(self, variables=None):
+        return { name: self.build_chart(name) for name in self.chart_registry.get_charts(variables) }
+
+
+    def build_chart(self, chart_name):
+        return getattr(self, self.chart_registry.get_chart_spec(chart_name).builder)()
+
+
+    def build_account_balance_chart(self):
+        return self.generate_line_chart({
+            'data' : self.account_balance_df,
+            'title' : 'Net Account Balance',
+            'y' : 'Balance',
+            'labels' : {"index":"Trade"},
+            'point_budget' : self.line_point_budget,
+        })
+
+
+    def build_monthly_profit_chart(self):
+        return self.build_period_profit_chart('month', 'Total Net Profit by Month')
+
+
+    def build_quarterly_profit_chart(self):
+        return self.build_period_profit_chart('quarter', 'Total Net Profit by Quarter')
+
+
+    def build_yearly_profit_chart(self):
+        return self.build_period_profit_chart('year', 'Total Net Profit by Year')
+
+
+    def build_period_profit_chart(self, period, title):
+        period_df = self.period_rollup.get_period(period)
+        return self.generate_bar_chart({
+            'data' : period_df,
+            'title' : title,
+            'x' : period_df.index,
+            'y' : 'Net Profit',
+            'labels' : {"Net Profit":"Profit in $", "Period":period.capitalize()},
+            'legend' : {'title_text':'Order Type'}
+        })
+
+
+    def build_monthly_trades_chart(self):
+        period_df = self.period_rollup.get_period('month')
+        return self.generate_bar_chart({
+            'data' : period_df,
+            'title' : 'Order Type Count by Month',
+            'x' : period_df.index,
+            'y' : [order_type for order_type in ['buy', 'sell', 'close', 'close at stop'] if order_type in period_df],
+            'labels' : {"value":"Count", "Period":"Month"},
+            'legend' : {'title_text':'Order Type'}
+        })
+
+
+    def build_duration_scatter_chart(self):
+        return self.generate_scatter_plot({
+            'data' : self.trade_bins.get_scatter_sample(self.scatter_point_budget),
+            'x' : 'Duration (hrs)',
+            'y' : 'Profit',
+            'width' : 600,
+            'height' : 600
+        })
+
+
+    def build_duration_heatmap_chart(self):
+        return self.generate_heatmap({
+            'bins' : self.trade_bins,
+            'x' : 'Duration (hrs)',
+            'y' : 'Profit',
+            'nbinsx' : 50,
+            'nbinsy' : 20
+        })
+
+
+    def build_duration_contour_chart(self):
+        return self.generate_2d_histogram_contour({
+            'bins' : self.trade_bins,
+            'nbinsx' : 30,
+            'nbinsy' : 30,
+        })
+
+
+    def build_duration_histogram_chart(self):
+        return self.generate_histogram({
+            'bins' : self.trade_bins,
+            'x' : 'Duration (hrs)',
+            'nbins' : 20,
+        })
+
+
+    def build_density_contour_chart(self):
+        return self.generate_density_contour({
+            'data' : self.trades_duration_dataset,
+            'x' : self.trades_duration_dataset['Duration (hrs)'],
+            'y' : self.trades_duration_dataset['Profit'],
+        })
+
+
+    def build_monte_carlo_bands_chart(self):
+        return self.generate_band_chart({
+            'data' : self.monte_carlo.get_percentile_bands(),
+            'title' : 'Monte Carlo Account Balance (' + str(len(self.monte_carlo)) + ' resamples)',
+            'bands' : [('P5', 'P95'), ('P25', 'P75')],
+            'median' : 'P50',
+            'actual' : 'Historical',
+        })
+
+
+    def build_monte_carlo_drawdown_chart(self):
+        return self.generate_distribution_chart({
+            'values' : self.monte_carlo.max_drawdowns,
+            'title' : 'Monte Carlo Maximal Drawdown',
+            'x' : 'Maximal drawdown in $',
+            'nbins' : 50,
+            'marker' : self.monte_carlo.get_historical_max_drawdown(),
+            'marker_text' : 'Historical',
+        })
+
+
+    def build_rolling_metrics_chart(self):
+        return self.generate_stacked_line_chart({
+            'data' : self.rolling_metrics_df,
+            'title' : 'Rolling Metrics over the last ' + str(self.rolling_window) + ' ' + self.rolling_window_unit,
+            'y' : ['Win Rate', 'Profit Factor', 'Expectancy', 'Drawdown', 'Average Duration (hrs)'],
+            'labels' : {'Win Rate':'Win %', 'Expectancy':'$ per trade', 'Drawdown':'$ below high', 'Average Duration (hrs)':'Hours'},
+            'point_budget' : self.line_point_budget,
+        })
+
+
+    #* Exports the charts that weren't in the report cache and adds them to it, cached images fill in the rest
+    def render_chart_figures(self, chart_figures):
+        chart_images = self.export_chart_figures(chart_figures) if chart_figures else {}
+        if self.chart_keys and chart_images:
+            for name, image in chart_images.items():
+                self.report_cache.put_chart(self.cached_report_key, self.chart_keys[name], image)
+            self.report_cache.evict()
+        return { **self.cached_images, **chart_images }
+
+
+    #* Exports every figure on the warm worker pool, render_workers=0 exports them one by one in process
+    def export_chart_figures(self, chart_figures):
+        def on_chart_rendered(name, current, total):
+            self.report_progress('chart ' + name, current, total)
+
+        if self.render_workers == 0 and self.chart_renderer is None:
+            chart_images = {}
+            for name, figure in chart_figures.items():
+                with self.recorder.stage('export ' + name):
+                    chart_images[name] = self.export_chart_figure(figure)
+                on_chart_rendered(name, len(chart_images), len(chart_figures))
+            return chart_images
+        renderer = self.chart_renderer or get_shared_chart_renderer(self.render_workers)
+        render_start = self.recorder.get_elapsed_seconds()
+        chart_images = renderer.render(chart_figures, on_chart_rendered, self.image_format)
+        chart_images = { name: compress_image(image, self.image_format, self.image_quality) for name, image in chart_images.items() }
+        self.chart_timings = dict(renderer.timings)
+        # Exports ran in the worker pool, so they are recorded afterwards as overlapping stages
+        for name in chart_figures:
+            self.recorder.add_record('export ' + name, self.chart_timings[name], start_seconds=render_start, worker=True)
+        return chart_images
+
+
+    def export_chart_figure(self, figure):
+        figure_bytes = figure.to_image(format=self.image_format, width=700)
+        return compress_image(figure_bytes, self.image_format, self.image_quality)
     
 
     def generate_line_chart(self, chart_params):
         data, title, y, labels = itemgetter('data', 'title', 'y', 'labels')(chart_params)
+        point_budget = chart_params.get('point_budget')
+        if point_budget and len(data) > point_budget:
+            # A 700px chart can't show more points than this, the index keeps each point's trade position
+            data = data.iloc[downsample_line(data[y].to_numpy(), point_budget)]
         line_fig = px.line(
             data, 
             title=title,
             y=y, 
             labels=labels, 
-            color_discrete_sequence=["#00FF00"] 
+            color_discrete_sequence=["#00FF00"],
+            # Past 1000 points plotly switches to WebGL, which the static image export renders very slowly
+            render_mode='svg',
         )
-        line_chart_jpeg = self.convert_chart_figure_to_jpeg(line_fig)
-        return line_chart_jpeg
+        return line_fig
+
+
+    #* One row per column sharing the trade axis, each line is downsampled on its own and skips incomplete windows
+    def generate_stacked_line_chart(self, chart_params):
+        data, title, y, labels = itemgetter('data', 'title', 'y', 'labels')(chart_params)
+        point_budget = chart_params.get('point_budget')
+        stacked_fig = make_subplots(rows=len(y), cols=1, shared_xaxes=True, vertical_spacing=0.03, subplot_titles=y)
+        for row, column in enumerate(y, start=1):
+            values = data[column].to_numpy(dtype=np.float64)
+            # A window without losses has an infinite profit factor, those points are left out of the line
+            shown = np.flatnonzero(np.isfinite(values))
+            if point_budget and len(shown) > point_budget:
+                shown = shown[downsample_line(values[shown], point_budget)]
+            stacked_fig.add_trace(go.Scatter(x=data.index[shown], y=values[shown], mode='lines', line=dict(color='#00FF00', width=1), showlegend=False), row=row, col=1)
+            stacked_fig.update_yaxes(title_text=labels.get(column, column), row=row, col=1)
+        stacked_fig.update_xaxes(title_text='Trade', row=len(y), col=1)
+        stacked_fig.update_layout(title=title, height=220 * len(y))
+        return stacked_fig
 
 
     def generate_bar_chart(self, chart_params):
@@ -193,13 +524,13 @@ class Report_Plotter():
             title=title,
             x=x, 
             y=y, 
-            text_auto=True,
+            # Past this many bars the value labels overlap, and drawing them dominates the export
+            text_auto=len(data) <= MAX_LABELLED_BARS,
             labels=labels, 
         )
         bar_fig.update_layout(barmode='relative')
         bar_fig.update_layout(legend=legend)
-        bar_chart_jpeg = self.convert_chart_figure_to_jpeg(bar_fig)
-        return bar_chart_jpeg
+        return bar_fig
 
 
     def generate_scatter_plot(self, chart_params):
@@ -210,29 +541,34 @@ class Report_Plotter():
             y=y, 
             height=height,
             width=width, 
+            # The sample is already capped, and WebGL is slow in the static image export
+            render_mode='svg',
         )
-        scatter_plot_jpeg = self.convert_chart_figure_to_jpeg(scatter_plot_fig)
-        return scatter_plot_jpeg
+        return scatter_plot_fig
 
     
+    #* Drawn from the shared 2d histogram, so the figure holds nbinsx * nbinsy cells whatever the trade count
     def generate_heatmap(self, chart_params):
-        data, x, y, nbinsx, nbinsy = itemgetter('data', 'x', 'y', 'nbinsx', 'nbinsy')(chart_params)
-        heatmap_fig = px.density_heatmap(
-            data, 
-            x=x, 
-            y=y, 
-            nbinsx=nbinsx, 
-            nbinsy=nbinsy
-        )
-        heatmap_jpeg = self.convert_chart_figure_to_jpeg(heatmap_fig)
-        return heatmap_jpeg
+        bins, x, y, nbinsx, nbinsy = itemgetter('bins', 'x', 'y', 'nbinsx', 'nbinsy')(chart_params)
+        counts, x_edges, y_edges = bins.get_histogram_2d(nbinsx, nbinsy)
+        heatmap_fig = go.Figure(go.Heatmap(
+            x=get_bin_centers(x_edges), 
+            y=get_bin_centers(y_edges), 
+            z=counts.T,
+            colorscale='Plasma',
+            colorbar=dict(title='count'),
+        ))
+        heatmap_fig.update_layout(xaxis_title=x, yaxis_title=y)
+        return heatmap_fig
 
 
     def generate_2d_histogram_contour(self, chart_params):
-        x, y = itemgetter('x', 'y')(chart_params)
-        histogram_contour_fig = go.Figure(go.Histogram2dContour(
-            x=x, 
-            y=y,
+        bins, nbinsx, nbinsy = itemgetter('bins', 'nbinsx', 'nbinsy')(chart_params)
+        counts, x_edges, y_edges = bins.get_histogram_2d(nbinsx, nbinsy)
+        histogram_contour_fig = go.Figure(go.Contour(
+            x=get_bin_centers(x_edges), 
+            y=get_bin_centers(y_edges),
+            z=counts.T,
             colorscale = 'Jet',
             contours = dict(
                 showlabels = True,
@@ -250,8 +586,7 @@ class Report_Plotter():
                 )
             )
         ))
-        histogram_contour_jpeg = self.convert_chart_figure_to_jpeg(histogram_contour_fig)
-        return histogram_contour_jpeg
+        return histogram_contour_fig
 
     
     def generate_density_contour(self, chart_params):
@@ -262,129 +597,155 @@ class Report_Plotter():
             y=y
         )
         density_contour_fig.update_traces(contours_coloring="fill", contours_showlabels = True)
-        density_contour_jpeg = self.convert_chart_figure_to_jpeg(density_contour_fig)
-        return density_contour_jpeg
+        return density_contour_fig
 
 
     def generate_histogram(self, chart_params):
-        data, x, nbins = itemgetter('data', 'x', 'nbins')(chart_params)
-        histogram_fig = px.histogram(
-            data, 
-            x=x, 
-            nbins=nbins
-        )
-        histogram_jpeg = self.convert_chart_figure_to_jpeg(histogram_fig)
-        return histogram_jpeg
+        bins, x, nbins = itemgetter('bins', 'x', 'nbins')(chart_params)
+        counts, edges = bins.get_histogram(nbins)
+        histogram_fig = go.Figure(go.Bar(
+            x=get_bin_centers(edges), 
+            y=counts,
+            width=edges[1] - edges[0],
+        ))
+        histogram_fig.update_layout(bargap=0, xaxis_title=x, yaxis_title='count')
+        return histogram_fig
+
+
+    #* Shaded percentile bands with the median and the actual path drawn on top
+    def generate_band_chart(self, chart_params):
+        data, title, bands, median, actual = itemgetter('data', 'title', 'bands', 'median', 'actual')(chart_params)
+        band_fig = go.Figure()
+        for lower, upper in bands:
+            if lower not in data:
+                continue
+            band_fig.add_trace(go.Scatter(x=data.index, y=data[upper], mode='lines', line=dict(width=0), showlegend=False, hoverinfo='skip'))
+            band_fig.add_trace(go.Scatter(
+                x=data.index, 
+                y=data[lower], 
+                mode='lines', 
+                line=dict(width=0), 
+                fill='tonexty', 
+                fillcolor='rgba(0, 100, 255, 0.2)', 
+                name=lower + '-' + upper,
+            ))
+        if median in data:
+            band_fig.add_trace(go.Scatter(x=data.index, y=data[median], mode='lines', line=dict(color='#0064FF'), name='Median'))
+        band_fig.add_trace(go.Scatter(x=data.index, y=data[actual], mode='lines', line=dict(color='#00FF00'), name=actual))
+        band_fig.update_layout(title=title, xaxis_title='Trade', yaxis_title='Balance')
+        return band_fig
+
+
+    #* Binned with numpy first, so the figure holds nbins bars whatever the number of values
+    def generate_distribution_chart(self, chart_params):
+        values, title, x, nbins, marker, marker_text = itemgetter('values', 'title', 'x', 'nbins', 'marker', 'marker_text')(chart_params)
+        counts, edges = np.histogram(values, bins=nbins)
+        distribution_fig = go.Figure(go.Bar(
+            x=get_bin_centers(edges), 
+            y=counts,
+            width=edges[1] - edges[0],
+        ))
+        distribution_fig.add_vline(x=marker, line_dash='dash', line_color='red', annotation_text=marker_text)
+        distribution_fig.update_layout(title=title, bargap=0, xaxis_title=x, yaxis_title='count')
+        return distribution_fig
 
 
     def get_system_name(self):
-        system_name = self.summary_data_df.loc[self.summary_data_df['Key'] == 'System Name']
-        return system_name.iloc[0]['Value']
+        return self.summary.get_text('System Name')
     
     def get_equity(self):
-        symbol_data = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Symbol']
-        return symbol_data.iloc[0]['Value']
+        return self.summary.get_text('Symbol')
     
     def get_period(self):
-        period_data = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Period']
-        return period_data.iloc[0]['Value']
+        return self.summary.get_text('Period')
 
     def get_duration(self):
-        duration_data = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Duration']
-        return duration_data.iloc[0]['Value']
+        return self.summary.get_text('Duration')
 
     def get_bars(self):
-        bars_data = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Bars in test']
-        return bars_data.iloc[0]['Value']
+        return self.summary.get_text('Bars in test')
     
     def get_ticks_modeled(self):
-        ticks_modeled_data = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Ticks modelled']
-        return ticks_modeled_data.iloc[0]['Value']
+        return self.summary.get_text('Ticks modelled')
     
     def get_modeling_quality(self):
-        modelling_quality_data = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Modelling quality']
-        return modelling_quality_data.iloc[0]['Value']
+        return self.summary.get_text('Modelling quality')
 
     def get_mismatched_chart_errors(self):
-        mismatched_charts_errors = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Mismatched charts errors']
-        return mismatched_charts_errors.iloc[0]['Value']
+        return self.summary.get_text('Mismatched charts errors')
 
     def get_gross_profit(self):
-        gross_profit = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Gross profit']
-        return gross_profit.iloc[0]['Value']
+        return self.summary.get_text('Gross profit')
 
     def get_gross_loss(self):
-        gross_loss = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Gross loss']
-        return gross_loss.iloc[0]['Value']
+        return self.summary.get_text('Gross loss')
 
     def get_net_profit(self):
-        net_profit = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Total net profit']
-        return net_profit.iloc[0]['Value']
+        return self.summary.get_text('Total net profit')
 
     def get_absolute_drawdown(self):
-        absolute_drawdown = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Absolute drawdown']
-        return absolute_drawdown.iloc[0]['Value']
+        return self.summary.get_text('Absolute drawdown')
 
     def get_max_drawdown(self):
-        maximal_drawdown = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Maximal drawdown']
-        return  maximal_drawdown.iloc[0]['Value']
+        return self.summary.get_text('Maximal drawdown')
 
     def get_relative_drawdown(self):
-        relative_drawdown = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Relative drawdown']
-        relative_drawdown_value = relative_drawdown.iloc[0]['Value']
+        relative_drawdown_value = self.summary.get_text('Relative drawdown')
         slice_index = relative_drawdown_value.find('(')
         relative_drawdown_dollar = relative_drawdown_value[slice_index+1:-1]
         relative_drawdown_percent = relative_drawdown_value[:slice_index-1]
         return relative_drawdown_dollar + ' (' + relative_drawdown_percent + ')'
     
     def get_total_positions_count(self):
-        total_trades = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Total trades']
-        return total_trades.iloc[0]['Value']
+        return self.summary.get_text('Total trades')
     
     def get_short_postions_count(self):
-        short_positions = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Short positions (won %)']
-        return short_positions.iloc[0]['Value']
+        return self.summary.get_text('Short positions (won %)')
 
     def get_long_postions_count(self):
-        long_positions = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Long positions (won %)']
-        return long_positions.iloc[0]['Value']
+        return self.summary.get_text('Long positions (won %)')
     
     def get_largest_profitable_trade(self):
-        largest_profit_trade = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Largest profit trade']
-        return largest_profit_trade.iloc[0]['Value']
+        return self.summary.get_text('Largest profit trade')
     
     def get_largest_unprofitable_trade(self):
-        largest_loss_trade = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Largest loss trade']
-        return largest_loss_trade.iloc[0]['Value']
+        return self.summary.get_text('Largest loss trade')
 
     def get_average_profit_per_trade(self):
-        average_profit_trade = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Average profit trade']
-        return  average_profit_trade.iloc[0]['Value']
+        return self.summary.get_text('Average profit trade')
     
     def get_average_loss_per_trade(self):
-        average_loss_trade = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Average loss trade']
-        return average_loss_trade.iloc[0]['Value']
+        return self.summary.get_text('Average loss trade')
     
     def get_max_consecutive_wins(self):
-        max_consecutive_wins = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Maximum consecutive wins (profit in money)']
-        return max_consecutive_wins.iloc[0]['Value']
+        return self.summary.get_text('Maximum consecutive wins (profit in money)')
 
     def get_max_consecutive_losses(self):
-        max_consecutive_losses = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Maximum consecutive losses (loss in money)']
-        return max_consecutive_losses.iloc[0]['Value']
+        return self.summary.get_text('Maximum consecutive losses (loss in money)')
 
     def get_max_consecutive_profit_amt(self):
-        max_consecutive_profit = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Maximal consecutive profit (count of wins)']
-        return max_consecutive_profit.iloc[0]['Value']
+        return self.summary.get_text('Maximal consecutive profit (count of wins)')
     
     def get_max_consecutive_loss_amt(self):
-        max_consecutive_loss = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Maximal consecutive loss (count of losses)']
-        return  max_consecutive_loss.iloc[0]['Value']
+        return self.summary.get_text('Maximal consecutive loss (count of losses)')
 
     def get_avg_consecutive_win_count(self):
-        average_consecutive_wins = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Average consecutive wins']
-        return average_consecutive_wins.iloc[0]['Value']
+        return self.summary.get_text('Average consecutive wins')
 
     def get_avg_consecutive_loss_count(self):
-        average_consecutive_losses = self.summary_data_df.loc[self.summary_data_df['Key'] == 'Average consecutive losses']
-        return average_consecutive_losses.iloc[0]['Value']
\ No newline at end of file
+        return self.summary.get_text('Average consecutive losses')
+
+    def get_trade_metric(self, metric, decimals=2):
+        value = self.trade_metrics.get(metric)
+        return 'n/a' if value is None else format(value, '.' + str(decimals) + 'f')
+
+    def get_summary_check(self):
+        if not self.summary_mismatches:
+            return 'Recomputed stats match the MT4 summary'
+        return 'Differs from the MT4 summary: ' + ', '.join(
+            key + ' (' + format(reported, 'g') + ' vs ' + format(computed, 'g') + ')' for key, reported, computed in self.summary_mismatches
+        )
+
+    def get_monte_carlo_stat(self, stat):
+        value = self.monte_carlo.get_summary().get(stat)
+        return 'n/a' if value is None else format(value, '.2f')
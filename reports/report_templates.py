@@ -0,0 +1,45 @@
+import os
+from pipeline.report_cache import DEFAULT_CACHE_DIR
+
+
+TEMPLATE_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.dirname(TEMPLATE_DIR)
+DEFAULT_TEMPLATE_FILE = os.path.join(TEMPLATE_DIR, 'template.html')
+TEMPLATE_BYTECODE_DIR = os.path.join(DEFAULT_CACHE_DIR, 'templates')
+
+# template directory -> jinja2 environment, template file -> (compiled template, variables it references)
+template_environments = {}
+compiled_templates = {}
+
+
+#* Relative paths are tried from the working directory first, then from the package, so the app runs from anywhere
+def resolve_template_file(template_file):
+    if os.path.isabs(template_file) or os.path.exists(template_file):
+        return os.path.abspath(template_file)
+    return os.path.join(PACKAGE_DIR, template_file)
+
+
+#* One environment per template directory, compiled templates are kept on disk across runs
+def get_template_environment(template_dir):
+    if template_dir not in template_environments:
+        import jinja2
+        try:
+            os.makedirs(TEMPLATE_BYTECODE_DIR, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(TEMPLATE_BYTECODE_DIR)
+        except OSError: # A read only home directory only costs the compile on every start
+            bytecode_cache = None
+        template_environments[template_dir] = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(searchpath=template_dir),
+            bytecode_cache=bytecode_cache,
+        )
+    return template_environments[template_dir]
+
+
+def get_compiled_template(template_file=DEFAULT_TEMPLATE_FILE):
+    from reports.chart_registry import get_template_variables
+    template_file = resolve_template_file(template_file)
+    if template_file not in compiled_templates:
+        template_env = get_template_environment(os.path.dirname(template_file))
+        template_name = os.path.basename(template_file)
+        compiled_templates[template_file] = (template_env.get_template(template_name), get_template_variables(template_env, template_name))
+    return compiled_templates[template_file]
@@ -0,0 +1,111 @@
+import os
+import plotly.graph_objects as go
+from reports.downsampling import DEFAULT_POINT_BUDGET, downsample_line
+from pipeline.run_store import format_parameters, parse_parameters
+from reports.report_templates import TEMPLATE_DIR, get_compiled_template
+from reports.chart_assets import get_data_uri
+
+
+COMPARISON_TEMPLATE_FILE = os.path.join(TEMPLATE_DIR, 'comparison_template.html')
+# (run column, table heading, decimals), None decimals are shown as text
+COMPARISON_COLUMNS = [
+    ('run_id', 'Run', None),
+    ('system_name', 'System', None),
+    ('symbol', 'Symbol', None),
+    ('period', 'Period', None),
+    ('parameters', 'Parameters', None),
+    ('total_trades', 'Trades', 0),
+    ('net_profit', 'Net Profit', 2),
+    ('profit_factor', 'Profit Factor', 2),
+    ('expectancy', 'Expectancy', 2),
+    ('win_rate', 'Win Rate %', 2),
+    ('maximal_drawdown', 'Max Drawdown', 2),
+    ('maximal_drawdown_percent', 'Max Drawdown %', 2),
+    ('sharpe_ratio', 'Sharpe', 3),
+]
+
+
+def format_run_value(value, decimals):
+    if value is None:
+        return 'n/a'
+    if decimals is None:
+        return str(value)
+    return format(value, ',.' + str(decimals) + 'f')
+
+
+#* Charts name a run by its id and the inputs that differ between the compared runs, the table has the rest
+def get_run_labels(runs):
+    run_parameters = [parse_parameters(run['parameters'] or '') for run in runs]
+    shared = set.intersection(*(set(parameters) for parameters in run_parameters)) if runs else set()
+    labels = {}
+    for run, parameters in zip(runs, run_parameters):
+        varying = format_parameters([parameter for parameter in parameters if parameter not in shared])
+        labels[run['run_id']] = ('#' + str(run['run_id']) + ' ' + varying).rstrip()
+    return labels
+
+
+#* Puts stored runs side by side, a stats table plus overlaid balance curves, straight from the run store
+class Run_Comparison():
+    def __init__(self, run_store, run_ids, report_location, template_file=COMPARISON_TEMPLATE_FILE, point_budget=DEFAULT_POINT_BUDGET):
+        self.run_store = run_store
+        self.run_ids = list(run_ids)
+        self.report_location = report_location
+        self.template_file = template_file
+        self.point_budget = point_budget
+        self.runs = []
+        self.run_labels = {}
+
+
+    def generate_report(self):
+        self.runs = self.run_store.get_runs(self.run_ids)
+        if not self.runs:
+            raise ValueError('None of the runs ' + ', '.join(str(run_id) for run_id in self.run_ids) + ' are in ' + self.run_store.store_file)
+        self.run_labels = get_run_labels(self.runs)
+        template = get_compiled_template(self.template_file)[0]
+        output_html = template.render(
+            runs=[self.format_run(run) for run in self.runs],
+            columns=[{ 'name': name, 'title': title, 'text': decimals is None } for name, title, decimals in COMPARISON_COLUMNS],
+            balance_fig_jpeg=self.export_chart_figure(self.build_balance_chart()),
+            drawdown_fig_jpeg=self.export_chart_figure(self.build_drawdown_chart()),
+        )
+        with open(self.report_location, 'w') as f:
+            f.write(output_html)
+        return self.report_location
+
+
+    def format_run(self, run):
+        return { name: format_run_value(run[name], decimals) for name, _, decimals in COMPARISON_COLUMNS }
+
+
+    #* Each run's curve is downsampled on its own, so long runs don't crowd out short ones
+    def build_balance_chart(self):
+        balance_fig = go.Figure()
+        for run in self.runs:
+            balance = self.run_store.get_balance_curve(run['run_id'])
+            trade_numbers = list(range(1, len(balance) + 1))
+            if self.point_budget and len(balance) > self.point_budget:
+                kept = downsample_line(balance, self.point_budget)
+                balance, trade_numbers = balance[kept], [trade_numbers[index] for index in kept]
+            balance_fig.add_trace(go.Scatter(x=trade_numbers, y=balance, mode='lines', name=self.run_labels[run['run_id']]))
+        balance_fig.update_layout(title='Net Account Balance', xaxis_title='Trade', yaxis_title='Balance', legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1))
+        return balance_fig
+
+
+    def build_drawdown_chart(self):
+        labels = ['#' + str(run['run_id']) for run in self.runs]
+        drawdown_fig = go.Figure([
+            go.Bar(x=labels, y=[run['maximal_drawdown_percent'] for run in self.runs], name='Max Drawdown %', offsetgroup=1),
+            go.Bar(x=labels, y=[run['profit_factor'] for run in self.runs], name='Profit Factor', yaxis='y2', offsetgroup=2),
+        ])
+        drawdown_fig.update_layout(
+            title='Drawdown and Profit Factor by Run',
+            barmode='group',
+            yaxis=dict(title='Max Drawdown %'),
+            yaxis2=dict(title='Profit Factor', overlaying='y', side='right'),
+            legend=dict(orientation='h', yanchor='bottom', y=1.02, xanchor='right', x=1),
+        )
+        return drawdown_fig
+
+
+    def export_chart_figure(self, figure):
+        return get_data_uri(figure.to_image(format="jpeg", width=1000), 'jpeg')
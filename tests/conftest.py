@@ -0,0 +1,27 @@
+import os
+import pytest
+from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
+
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+INTERLEAVED_REPORT_FILE = os.path.join(FIXTURE_DIR, 'interleaved_orders.htm')
+
+
+def get_fixture(name):
+    return os.path.join(FIXTURE_DIR, name)
+
+
+#* Ledgers come in close order from the cleaner, the order id layout is how older versions exported them
+@pytest.fixture(params=[False, True], ids=['close_order', 'order_id_layout'])
+def order_id_layout(request):
+    return request.param
+
+
+#* Orders 1-3 of the interleaved report overlap and close 2, 1, 3, cleaned and laid out both ways
+@pytest.fixture
+def interleaved_ledger(tmp_path, order_id_layout):
+    cleaner = Mt4_Report_Cleaner(INTERLEAVED_REPORT_FILE, str(tmp_path))
+    summary_df, trades_df = cleaner.clean_report()
+    if order_id_layout:
+        trades_df = trades_df.sort_values('Order', kind='stable')
+    return cleaner.summary, summary_df, trades_df
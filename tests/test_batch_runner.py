@@ -0,0 +1,54 @@
+import csv
+import os
+import shutil
+from conftest import INTERLEAVED_REPORT_FILE
+import pipeline.batch_runner
+import pipeline.run_store
+from pipeline.batch_runner import BATCH_SUMMARY_FILENAME, Batch_Runner
+from pipeline.run_store import Run_Store, clean_report_frames
+
+
+#* Stands in for a report that takes its worker down, like an out of memory kill or a crash inside kaleido
+def process_or_crash(input_file, *args):
+    if os.path.basename(input_file).startswith('crash'):
+        os._exit(1)
+    return { 'input_file': input_file, 'status': 'ok', 'seconds': 0, 'outputs': '', 'error': '' }
+
+
+def write_reports(tmp_path, names):
+    for name in names:
+        shutil.copy(INTERLEAVED_REPORT_FILE, tmp_path / name)
+    return [str(tmp_path / name) for name in names]
+
+
+#* Only the report that kills its worker fails, the others in flight with it are rerun and the summary is still written
+def test_crashed_worker_fails_only_its_report(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline.batch_runner, 'process_report', process_or_crash)
+    write_reports(tmp_path, ['a.htm', 'b.htm', 'crash.htm', 'c.htm', 'd.htm'])
+    batch_runner = Batch_Runner([str(tmp_path)], str(tmp_path / 'output'), workers=2)
+    batch_runner.run()
+    assert [os.path.basename(result['input_file']) for result in batch_runner.get_failures()] == ['crash.htm']
+    with open(tmp_path / 'output' / BATCH_SUMMARY_FILENAME, newline='') as f:
+        rows = list(csv.DictReader(f))
+    assert [(os.path.basename(row['input_file']), row['status']) for row in rows] == [
+        ('a.htm', 'ok'), ('b.htm', 'ok'), ('c.htm', 'ok'), ('crash.htm', 'failed'), ('d.htm', 'ok'),
+    ]
+    assert 'worker process died' in rows[3]['error']
+
+
+def clean_or_crash(input_file):
+    if os.path.basename(input_file).startswith('crash'):
+        os._exit(1)
+    return clean_report_frames(input_file)
+
+
+def test_crashed_worker_fails_only_its_ingest(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline.run_store, 'clean_report_frames', clean_or_crash)
+    input_files = [INTERLEAVED_REPORT_FILE, write_reports(tmp_path, ['crash.htm'])[0]]
+    errors = {}
+    with Run_Store(str(tmp_path / 'runs.sqlite')) as run_store:
+        run_ids = run_store.ingest_reports(input_files, workers=2, on_ingested=lambda input_file, run_id, error: errors.update({ os.path.basename(input_file): error }))
+        assert len(run_store) == 1
+    assert run_ids[input_files[0]] is not None and run_ids[input_files[1]] is None
+    assert errors['interleaved_orders.htm'] is None
+    assert 'worker process died' in str(errors['crash.htm'])
@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+import pytest
+from reports.binning import Trade_Bins
+
+
+def get_trade_bins(trade_count):
+    rng = np.random.default_rng(1)
+    return Trade_Bins(pd.DataFrame({ 'Duration (hrs)': rng.uniform(0, 100, trade_count), 'Profit': rng.normal(0, 50, trade_count) }))
+
+
+@pytest.mark.parametrize('point_budget', [0, 1, 3, 10, 500])
+def test_scatter_sample_keeps_extremes(point_budget):
+    trade_bins = get_trade_bins(200)
+    sample = trade_bins.get_scatter_sample(point_budget)
+    sampled_profits = sample['Profit']
+    assert len(sampled_profits) <= max(point_budget, 4)
+    assert trade_bins.y.max() in sampled_profits
+    assert trade_bins.y.min() in sampled_profits
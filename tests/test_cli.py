@@ -0,0 +1,34 @@
+import pytest
+import reports.chart_assets
+from cli import build_parser
+
+
+def parse_batch_args(*arguments):
+    return build_parser().parse_args(['batch', 'reports', '-o', 'out', *arguments])
+
+
+@pytest.mark.parametrize('quality', ['0', '101', '-5', 'high'])
+def test_image_quality_out_of_range_is_rejected(monkeypatch, quality):
+    monkeypatch.setattr(reports.chart_assets, 'IMAGE_QUALITY_SUPPORTED', True)
+    with pytest.raises(SystemExit):
+        parse_batch_args('--image-quality', quality)
+
+
+def test_image_quality_in_range(monkeypatch):
+    monkeypatch.setattr(reports.chart_assets, 'IMAGE_QUALITY_SUPPORTED', True)
+    assert parse_batch_args('--image-quality', '100').image_quality == 100
+
+
+#* Without Pillow the quality could never be applied, so asking for one is a usage error rather than a silent no-op
+def test_image_quality_without_pillow_is_rejected(monkeypatch, capsys):
+    monkeypatch.setattr(reports.chart_assets, 'IMAGE_QUALITY_SUPPORTED', False)
+    with pytest.raises(SystemExit):
+        parse_batch_args('--image-quality', '50')
+    assert 'install it with pip install pillow' in capsys.readouterr().err
+
+
+def test_parameter_filter_without_value_is_rejected(capsys):
+    with pytest.raises(SystemExit):
+        build_parser().parse_args(['store', 'top', '--param', 'Lots'])
+    assert 'expected NAME=VALUE' in capsys.readouterr().err
+    assert build_parser().parse_args(['store', 'top', '--param', 'Lots=0.1', '--param', 'Mode=a=b']).param == [('Lots', '0.1'), ('Mode', 'a=b')]
@@ -0,0 +1,37 @@
+import pytest
+from benchmarks.generate_mt4_report import Mt4_Report_Generator
+from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
+from analytics.trade_analytics import Trade_Analytics
+
+
+def clean_generated_report(tmp_path, name, **generator_options):
+    input_file = str(tmp_path / (name + '.htm'))
+    Mt4_Report_Generator(300, seed=5, **generator_options).write_report(input_file)
+    cleaner = Mt4_Report_Cleaner(input_file, str(tmp_path))
+    summary_df, trades_df = cleaner.clean_report()
+    return cleaner.summary, trades_df
+
+
+#* The generator's summary is worked out trade by trade in close order, the recomputed stats have to agree with it
+@pytest.mark.parametrize('generator_options', [
+    {},
+    { 'max_open_positions': 4 },
+    { 'open_orders': 3 },
+    { 'implied_tags': True },
+    { 'max_open_positions': 4, 'open_orders': 3, 'implied_tags': True },
+])
+def test_generated_reports_match_summary(tmp_path, generator_options):
+    summary, trades_df = clean_generated_report(tmp_path, 'report', **generator_options)
+    closed_trades = trades_df[trades_df['Profit'].notna()]
+    assert len(closed_trades) == 300 - generator_options.get('open_orders', 0)
+    if generator_options.get('max_open_positions', 1) > 1:
+        assert not closed_trades['Order'].is_monotonic_increasing
+    trade_analytics = Trade_Analytics(trades_df, summary.get_number('Initial deposit'))
+    trade_analytics.compute()
+    assert trade_analytics.compare_to_summary(summary) == []
+
+
+def test_implied_tags_clean_like_closed_tags(tmp_path):
+    _, tagged_trades = clean_generated_report(tmp_path, 'tagged', max_open_positions=4)
+    _, implied_trades = clean_generated_report(tmp_path, 'implied', max_open_positions=4, implied_tags=True)
+    assert implied_trades.equals(tagged_trades)
@@ -0,0 +1,25 @@
+import pytest
+from conftest import get_fixture
+from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
+from analytics.monte_carlo import BUDGET_ELEMENTS_PER_SECOND, Monte_Carlo_Simulation
+
+
+def test_historical_path_follows_close_order(interleaved_ledger):
+    summary, summary_df, trades_df = interleaved_ledger
+    simulation = Monte_Carlo_Simulation(trades_df, simulations=200, seconds=0, workers=0).run()
+    assert simulation.initial_deposit == pytest.approx(10000)
+    assert simulation.get_historical_max_drawdown() == pytest.approx(20)
+    assert list(simulation.get_percentile_bands()['Historical']) == [9980, 10010, 10050, 10060]
+    assert len(simulation) == 200
+
+
+#* The time budget sets the path count from the trade count alone, and the paths kept are a prefix of the unbudgeted run
+def test_time_budget_is_deterministic(tmp_path):
+    summary_df, trades_df = Mt4_Report_Cleaner(get_fixture('implied_tags.htm'), str(tmp_path)).clean_report()
+    full_run = Monte_Carlo_Simulation(trades_df, simulations=500, seconds=0, workers=0).run()
+    budget = 123 / BUDGET_ELEMENTS_PER_SECOND
+    budgeted_runs = [Monte_Carlo_Simulation(trades_df, simulations=500, seconds=budget, workers=0).run() for _ in range(2)]
+    # 123 cells over 6 trades
+    assert [len(simulation) for simulation in budgeted_runs] == [20, 20]
+    assert (budgeted_runs[0].final_balances == full_run.final_balances[:20]).all()
+    assert (budgeted_runs[1].max_drawdowns == budgeted_runs[0].max_drawdowns).all()
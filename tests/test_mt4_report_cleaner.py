@@ -0,0 +1,56 @@
+import pytest
+from conftest import get_fixture
+from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
+
+
+def clean_with_soup(input_file, output_path):
+    cleaner = Mt4_Report_Cleaner(input_file, output_path)
+    cleaner.open_report_soup()
+    cleaner.build_output_filename()
+    cleaner.build_summary_data_output(cleaner.scrape_summary_data())
+    cleaner.build_trade_data_output(cleaner.scrape_trade_data())
+    return cleaner
+
+
+#* MT4 leaves </td> and </tr> implied, the line break before the next tag must not end up in the cells
+def test_implied_tags_stream(tmp_path):
+    cleaner = Mt4_Report_Cleaner(get_fixture('implied_tags.htm'), str(tmp_path))
+    summary_df, trades_df = cleaner.clean_report()
+    assert len(trades_df) == 13
+    assert cleaner.system_name == 'Synthetic Moving Average'
+    assert cleaner.summary.get_number('Total trades') == 6
+    assert trades_df['Balance'].dropna().iloc[-1] == pytest.approx(10549.72)
+    assert list(trades_df['Type'].astype(str)[:2]) == ['buy', 'close']
+
+
+def test_implied_tags_soup_matches_stream(tmp_path):
+    input_file = get_fixture('implied_tags.htm')
+    cleaner = Mt4_Report_Cleaner(input_file, str(tmp_path))
+    summary_df, trades_df = cleaner.clean_report()
+    soup_cleaner = clean_with_soup(input_file, str(tmp_path))
+    assert soup_cleaner.summary_df.equals(summary_df)
+    assert soup_cleaner.trades_df.equals(trades_df)
+
+
+#* Orders 1-3 overlap and close 2, 1, 3, the ledger must stay in close order rather than order id order
+def test_interleaved_orders_keep_report_order(tmp_path):
+    cleaner = Mt4_Report_Cleaner(get_fixture('interleaved_orders.htm'), str(tmp_path))
+    summary_df, trades_df = cleaner.clean_report()
+    assert list(trades_df.index) == list(range(len(trades_df)))
+    assert trades_df['#'].is_monotonic_increasing
+    closed_trades = trades_df[trades_df['Profit'].notna()]
+    assert list(closed_trades['Order']) == [2, 1, 3, 4]
+    assert list(closed_trades['Balance']) == [9980, 10010, 10050, 10060]
+    assert dict(zip(closed_trades['Order'], closed_trades['Duration (hrs)'])) == { 1: 4, 2: 2, 3: 3, 4: 1 }
+
+
+def test_cached_frames_match_cleaned_frames(tmp_path):
+    from pipeline.report_cache import Report_Cache
+    input_file = get_fixture('interleaved_orders.htm')
+    summary_df, trades_df = Mt4_Report_Cleaner(input_file, str(tmp_path)).clean_report()
+    report_cache = Report_Cache(str(tmp_path / 'cache'))
+    report_key = report_cache.get_report_key(input_file)
+    report_cache.put_frames(report_key, summary_df, trades_df)
+    cached_summary_df, cached_trades_df = report_cache.get_frames(report_key)
+    assert cached_summary_df.equals(summary_df)
+    assert cached_trades_df.equals(trades_df)
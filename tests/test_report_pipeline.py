@@ -0,0 +1,70 @@
+from conftest import INTERLEAVED_REPORT_FILE, get_fixture
+from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
+from pipeline.instrumentation import Stage_Recorder
+from pipeline.report_cache import Report_Cache
+from pipeline.report_pipeline import Report_Pipeline
+
+
+TEXT_TEMPLATE = '{{ system_name }} {{ summary_check }} {{ monte_carlo_simulations }} {{ monte_carlo_drawdown_p95 }} {{ win_rate }}\n'
+CHART_TEMPLATE = TEXT_TEMPLATE + '<img src="{{ account_balance_fig_jpeg }}">\n'
+INPUT_FILE = INTERLEAVED_REPORT_FILE
+
+
+def run_pipeline(tmp_path, report_cache, recorder, template_text=TEXT_TEMPLATE):
+    template_file = tmp_path / 'template.html'
+    template_file.write_text(template_text)
+    pipeline = Report_Pipeline(
+        INPUT_FILE,
+        str(tmp_path),
+        write_data=False,
+        render_workers=0,
+        report_cache=report_cache,
+        recorder=recorder,
+        template_file=str(template_file),
+    )
+    with open(pipeline.run()['report']) as f:
+        return f.read()
+
+
+#* A second run of the same report reads everything from the cache, the Monte Carlo frame isn't rebuilt
+def test_cache_hit_skips_frames(tmp_path):
+    report_cache = Report_Cache(str(tmp_path / 'cache'))
+    first_recorder = Stage_Recorder()
+    first_report = run_pipeline(tmp_path, report_cache, first_recorder)
+    second_recorder = Stage_Recorder()
+    second_report = run_pipeline(tmp_path, report_cache, second_recorder)
+    assert 'generate_monte_carlo' in [record['name'] for record in first_recorder.records]
+    assert 'generate_monte_carlo' not in [record['name'] for record in second_recorder.records]
+    assert second_report == first_report
+    assert second_report.startswith('Interleaved Orders Recomputed stats match the MT4 summary 10000 ')
+
+
+#* Cached frames come back with the parsed summary the run store and the plotter read
+def test_cache_hit_restores_summary(tmp_path):
+    report_cache = Report_Cache(str(tmp_path / 'cache'))
+    summaries = []
+    for _ in range(2):
+        cleaner = Mt4_Report_Cleaner(INPUT_FILE, str(tmp_path))
+        Report_Pipeline(INPUT_FILE, str(tmp_path), report_cache=report_cache).clean_report(cleaner)
+        summaries.append(cleaner.summary)
+    assert summaries[1] is not None
+    assert summaries[1].get_number('Initial deposit') == summaries[0].get_number('Initial deposit') == 10000
+
+
+def get_stage_rows(recorder, stage_name):
+    return [record.get('rows') for record in recorder.records if record['name'] == stage_name]
+
+
+#* Invalidating a report drops its charts and stats with its frames, the next run rebuilds all of them
+def test_invalidate_rebuilds_charts(tmp_path):
+    report_cache = Report_Cache(str(tmp_path / 'cache'))
+    run_pipeline(tmp_path, report_cache, Stage_Recorder(), CHART_TEMPLATE)
+    cached_recorder = Stage_Recorder()
+    run_pipeline(tmp_path, report_cache, cached_recorder, CHART_TEMPLATE)
+    assert get_stage_rows(cached_recorder, 'build_chart_figures') == [0]
+    assert report_cache.invalidate(INPUT_FILE)
+    rebuilt_recorder = Stage_Recorder()
+    run_pipeline(tmp_path, report_cache, rebuilt_recorder, CHART_TEMPLATE)
+    assert get_stage_rows(rebuilt_recorder, 'build_chart_figures') == [1]
+    assert 'generate_monte_carlo' in [record['name'] for record in rebuilt_recorder.records]
+    assert not report_cache.invalidate(get_fixture('implied_tags.htm'))
@@ -0,0 +1,12 @@
+import pytest
+import reports.report_plotter
+from reports.report_plotter import Report_Plotter
+
+
+#* A quality that can't be applied is dropped with a warning, so it doesn't end up in the chart cache keys either
+def test_image_quality_without_pillow_is_ignored(monkeypatch, tmp_path):
+    monkeypatch.setattr(reports.report_plotter, 'IMAGE_QUALITY_SUPPORTED', False)
+    with pytest.warns(UserWarning, match='needs Pillow'):
+        plotter = Report_Plotter(str(tmp_path), report_location=str(tmp_path / 'report.html'), image_quality=50)
+    assert plotter.image_quality is None
+    assert plotter.get_render_options()['image_quality'] is None
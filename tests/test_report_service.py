@@ -0,0 +1,80 @@
+import os
+import signal
+import threading
+import time
+import urllib.error
+import urllib.request
+import pytest
+from conftest import INTERLEAVED_REPORT_FILE
+import pipeline.report_service
+from pipeline.report_service import Report_Http_Server, Report_Service
+
+
+#* One warm worker rendering a text only template, so the pool starts in about a second
+@pytest.fixture
+def service_port(tmp_path):
+    template_file = tmp_path / 'text_template.html'
+    template_file.write_text('{{ system_name }}\n')
+    report_service = Report_Service(workers=1, template_file=str(template_file))
+    report_service.start()
+    http_server = Report_Http_Server(('127.0.0.1', 0), report_service)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    yield report_service, http_server.server_address[1]
+    http_server.shutdown()
+    http_server.server_close()
+    report_service.shutdown()
+
+
+def post_report(port, report_bytes):
+    request = urllib.request.Request('http://127.0.0.1:' + str(port) + '/report?name=upload.htm', data=report_bytes, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=60) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read().decode()
+
+
+def test_unreadable_report_error_has_no_temp_path(service_port):
+    report_service, port = service_port
+    status, body = post_report(port, b'<html>not a report</html>')
+    assert status == 422
+    assert 'upload.htm' in body
+    assert report_service.work_dir not in body
+
+
+#* Once a worker is gone every submit fails, the request is answered 503 and the next one runs on a fresh pool
+def test_crashed_worker_answers_503_then_recovers(service_port):
+    report_service, port = service_port
+    with open(INTERLEAVED_REPORT_FILE, 'rb') as f:
+        report_bytes = f.read()
+    for pid in list(report_service.executor._processes):
+        os.kill(pid, signal.SIGKILL)
+    time.sleep(0.5)
+    status, body = post_report(port, report_bytes)
+    assert status == 503
+    status, body = post_report(port, report_bytes)
+    assert (status, body) == (200, 'Interleaved Orders')
+    assert report_service.get_metrics()['responses_by_status'] == { '503': 1, '200': 1 }
+
+
+#* Stands in for a render stuck in the chart exporter
+def hang_report(input_file, template_file, cache_dir=None):
+    time.sleep(600)
+
+
+#* The timed out request gets its 504 and its slot back, the hung worker is killed and the next request runs on a fresh pool
+def test_timed_out_render_frees_its_slot(service_port, monkeypatch):
+    report_service, port = service_port
+    report_service.request_timeout = 1
+    with open(INTERLEAVED_REPORT_FILE, 'rb') as f:
+        report_bytes = f.read()
+    hung_executor = report_service.executor
+    with monkeypatch.context() as patch:
+        patch.setattr(pipeline.report_service, 'render_report', hang_report)
+        status, body = post_report(port, report_bytes)
+    assert status == 504
+    assert report_service.executor is not hung_executor
+    assert report_service.get_metrics()['active_jobs'] == 0
+    report_service.request_timeout = 60
+    status, body = post_report(port, report_bytes)
+    assert (status, body) == (200, 'Interleaved Orders')
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from analytics.rolling_metrics import Rolling_Metrics
+
+
+def test_windows_follow_close_order(interleaved_ledger):
+    summary, summary_df, trades_df = interleaved_ledger
+    rolling_metrics = Rolling_Metrics(trades_df, window=2).compute()
+    # Closes in order: -20, +30, +40, +10
+    assert list(rolling_metrics['Expectancy'][1:]) == [5, 35, 25]
+    assert list(rolling_metrics['Drawdown'][1:]) == [0, 0, 0]
+    assert rolling_metrics['Time'].is_monotonic_increasing
+
+
+#* Checked against pandas' own rolling windows on a ledger with uneven gaps between closes
+@pytest.mark.parametrize('window, unit', [(25, 'trades'), (10, 'days')])
+def test_matches_pandas_rolling(window, unit):
+    rng = np.random.default_rng(1)
+    trade_count = 2000
+    profits = np.round(rng.normal(1, 50, trade_count), 2)
+    trades_df = pd.DataFrame({
+        '#': np.arange(1, trade_count + 1),
+        'Time': pd.Timestamp('2015-01-02') + pd.to_timedelta(np.cumsum(rng.integers(1, 900, trade_count)), unit='min'),
+        'Profit': profits,
+        'Balance': 10000 + np.cumsum(profits),
+        'Duration (hrs)': rng.uniform(0, 50, trade_count).round(2),
+    })
+    rolling_metrics = Rolling_Metrics(trades_df, window, unit).compute()
+    indexed = trades_df.set_index('Time') if unit == 'days' else trades_df
+    rolling_window = str(window) + 'D' if unit == 'days' else window
+    complete = rolling_metrics['Expectancy'].notna().to_numpy()
+    assert complete.sum() > trade_count / 2
+    expected = {
+        'Expectancy': indexed['Profit'].rolling(rolling_window).mean(),
+        'Win Rate': (indexed['Profit'] > 0).astype(float).rolling(rolling_window).mean() * 100,
+        'Drawdown': indexed['Balance'].rolling(rolling_window).max() - indexed['Balance'],
+        'Average Duration (hrs)': indexed['Duration (hrs)'].rolling(rolling_window).mean(),
+    }
+    for column, values in expected.items():
+        np.testing.assert_allclose(rolling_metrics[column].to_numpy()[complete], values.to_numpy()[complete], atol=1e-9)
@@ -0,0 +1,29 @@
+import pytest
+from conftest import INTERLEAVED_REPORT_FILE, get_fixture
+from cleaners.mt4_report_cleaner import Mt4_Report_Cleaner
+from pipeline.run_store import Run_Store
+
+
+#* Stored curves and metrics follow close order however the ledger handed to the store was laid out
+def test_interleaved_orders_stored_in_close_order(tmp_path, interleaved_ledger):
+    summary, summary_df, trades_df = interleaved_ledger
+    with Run_Store(str(tmp_path / 'runs.sqlite')) as run_store:
+        run_id = run_store.add_run(INTERLEAVED_REPORT_FILE, summary_df, trades_df)
+        assert run_store.get_balance_curve(run_id).tolist() == pytest.approx([9980, 10010, 10050, 10060])
+        stored_trades = run_store.get_trades(run_id)
+        assert stored_trades['Time'].is_monotonic_increasing
+        assert stored_trades['#'].tolist() == list(range(1, len(stored_trades) + 1))
+        run = run_store.get_runs([run_id])[0]
+        assert run['maximal_drawdown'] == pytest.approx(20)
+        assert run['final_balance'] == pytest.approx(10060)
+
+
+#* A run without losing trades has a profit factor of inf, it is listed after every run with a finite one
+def test_infinite_profit_factor_ranks_last(tmp_path):
+    input_files = [INTERLEAVED_REPORT_FILE, get_fixture('implied_tags.htm')]
+    with Run_Store(str(tmp_path / 'runs.sqlite')) as run_store:
+        run_ids = [run_store.add_run(input_file, *Mt4_Report_Cleaner(input_file, str(tmp_path)).clean_report()) for input_file in input_files]
+        with run_store.connection:
+            run_store.connection.execute('UPDATE runs SET profit_factor = ? WHERE run_id = ?', (float('inf'), run_ids[0]))
+        assert [run['run_id'] for run in run_store.get_top_runs('profit_factor')] == [run_ids[1], run_ids[0]]
+        assert [run['run_id'] for run in run_store.get_top_runs('profit_factor', ascending=True)] == [run_ids[1], run_ids[0]]
@@ -0,0 +1,13 @@
+import pytest
+from analytics.trade_analytics import Trade_Analytics
+
+
+#* Orders closed 2, 1, 3: the -20 close comes first, so the balance dips to 9980 before three wins in a row
+def test_interleaved_orders_match_mt4_summary(interleaved_ledger):
+    summary, summary_df, trades_df = interleaved_ledger
+    trade_analytics = Trade_Analytics(trades_df)
+    metrics = trade_analytics.compute()
+    assert metrics['absolute_drawdown'] == pytest.approx(20)
+    assert metrics['max_consecutive_wins'] == 3
+    assert trade_analytics.initial_deposit == pytest.approx(10000)
+    assert trade_analytics.compare_to_summary(summary) == []
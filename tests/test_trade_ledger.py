@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+from cleaners.mt4_report_parser import Mt4_Report_Parse_Error
+from cleaners.trade_ledger import TRADE_HEADER, Trade_Ledger
+
+
+#* Cells left with a newline or spaces by implied end tags read as blank, not as a float parse error
+def test_whitespace_cells_are_nan():
+    ledger = Trade_Ledger(TRADE_HEADER)
+    ledger.append(['1 ', '2019.01.02 10:00', ' buy\n', '1', '0.10', '1.1450', '\n', ' ', '', '\n'])
+    trades_df = ledger.to_frame()
+    assert trades_df['Type'].tolist() == ['buy']
+    assert trades_df['Price'].tolist() == [1.145]
+    assert np.isnan(trades_df[['S / L', 'T / P', 'Profit', 'Balance']].to_numpy()).all()
+
+
+@pytest.mark.parametrize('row', [
+    ['1', '2019.01.02 10:00', 'buy', '1', '0.10', '1.1450', '0', '0', '10.00', '10010.00', '1'],
+    ['1', '2019.01.02 10:00', 'buy'],
+    ['1', '2019.01.02 10:00', 'buy', '1', 'n/a'],
+])
+def test_malformed_rows_raise_parse_error(row):
+    ledger = Trade_Ledger(TRADE_HEADER)
+    with pytest.raises(Mt4_Report_Parse_Error):
+        ledger.append(row)
+    assert len(ledger) == 0
@@ -0,0 +1,28 @@
+import os
+import pipeline.watch_folder
+from pipeline.watch_folder import Folder_Watcher, Watch_Journal
+
+
+#* Stands in for a report that takes its worker down, like an out of memory kill or a crash inside kaleido
+def process_or_crash(input_file, *args, **report_options):
+    if os.path.basename(input_file).startswith('crash'):
+        os._exit(1)
+    return { 'input_file': input_file, 'status': 'ok', 'seconds': 0, 'outputs': '', 'error': '' }
+
+
+#* The reports caught in the broken pool are journalled as failed and the ones after them still run on a fresh pool
+def test_crashed_worker_keeps_watching(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline.watch_folder, 'process_report', process_or_crash)
+    watch_dir = tmp_path / 'reports'
+    watch_dir.mkdir()
+    names = ['a.htm', 'b.htm', 'crash.htm', 'x.htm', 'y.htm', 'z.htm']
+    for name in names:
+        (watch_dir / name).write_text(name)
+    watcher = Folder_Watcher(str(watch_dir), str(tmp_path / 'output'), workers=1, poll_seconds=0.1, settle_seconds=0)
+    watcher.run(until_idle=True)
+    statuses = { os.path.basename(result['input_file']): result['status'] for result in watcher.results }
+    assert sorted(statuses) == names
+    assert statuses['crash.htm'] == 'failed'
+    assert statuses['y.htm'] == statuses['z.htm'] == 'ok'
+    journal = Watch_Journal(watcher.journal.journal_file)
+    assert sorted(entry['status'] for entry in journal.entries.values()) == sorted(statuses.values())